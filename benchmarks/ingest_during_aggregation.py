@@ -0,0 +1,156 @@
+"""Benchmark: event ingestion latency while the nightly aggregation runs.
+
+Seeds a temporary SQLite database with yesterday's events, then measures
+``POST /api/v1/event`` latency in three scenarios:
+
+* ``idle``      — no background job
+* ``inline``    — aggregation awaited on the web event loop (the old scheduler behaviour)
+* ``isolated``  — aggregation on the worker thread via ``app.worker.run_isolated``
+
+Usage:
+
+    python benchmarks/ingest_during_aggregation.py --events 200000 --sites 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from datetime import time as dt_time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _seed(engine, site_ids: list[str], events: int) -> None:
+    from app.models.event import PageviewEvent
+
+    yesterday = date.today() - timedelta(days=1)
+    start = datetime.combine(yesterday, dt_time())
+    paths = [f"/page/{i}" for i in range(500)]
+    browsers = ["Chrome", "Firefox", "Safari", "Edge"]
+    countries = ["US", "DE", "GB", "FR", "IN", None]
+    batch = []
+    async with engine.begin() as conn:
+        for i in range(events):
+            batch.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "site_id": site_ids[i % len(site_ids)],
+                    "visitor_hash": f"v{i % (events // 3 or 1)}",
+                    "url": "https://bench.test/",
+                    "path": paths[i % len(paths)],
+                    "referrer_domain": "google.com" if i % 4 == 0 else None,
+                    "browser": browsers[i % len(browsers)],
+                    "os": "Linux",
+                    "device_type": "desktop" if i % 3 else "mobile",
+                    "country_code": countries[i % len(countries)],
+                    "utm_source": "newsletter" if i % 10 == 0 else None,
+                    "timestamp": start + timedelta(seconds=(i * 86399) // events),
+                }
+            )
+            if len(batch) == 10_000:
+                await conn.execute(PageviewEvent.__table__.insert(), batch)
+                batch.clear()
+        if batch:
+            await conn.execute(PageviewEvent.__table__.insert(), batch)
+
+
+async def _measure(client, site_id: str, until, max_requests: int) -> list[float]:
+    payload = {"s": site_id, "u": "https://bench.test/x", "p": "/x", "r": ""}
+    latencies = []
+    while len(latencies) < max_requests and not until():
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/v1/event", json=payload, headers={"User-Agent": "Mozilla/5.0 Chrome/120.0"}
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 202, response.status_code
+        await asyncio.sleep(0.002)
+    return latencies
+
+
+async def main(args: argparse.Namespace) -> None:
+    from httpx import ASGITransport, AsyncClient
+
+    from app.database import Base, async_session, engine
+    from app.main import create_app
+    from app.rate_limit import limiter
+    from app.services.aggregation import AggregationService
+    from app.services.auth import AuthService
+    from app.services.site import SiteService
+    from app.worker import TimeBudget, run_isolated
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        user = await AuthService.create_user(db, "Bench", "bench@example.com", "benchpass")
+        sites = [
+            await SiteService.create_site(db, user.id, f"Site {i}", f"site{i}.test")
+            for i in range(args.sites)
+        ]
+        await db.commit()
+    site_ids = [site.id for site in sites]
+    print(f"Seeding {args.events:,} events across {args.sites} sites...")
+    await _seed(engine, site_ids, args.events)
+
+    limiter.enabled = False
+    app = create_app()
+
+    async def inline_job():
+        async with async_session() as db:
+            return await AggregationService.aggregate_yesterday(db)
+
+    async def isolated_job(db):
+        return await AggregationService.aggregate_yesterday(db, budget=TimeBudget.from_settings())
+
+    scenarios = {
+        "idle": None,
+        "inline": inline_job,
+        "isolated": lambda: run_isolated(isolated_job),
+    }
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up connections, templates and the UA parser
+        await _measure(client, site_ids[0], lambda: False, 50)
+        print(f"\n{'scenario':<10} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+              f"{'job s':>7}")
+        for name, job in scenarios.items():
+            job_started = time.perf_counter()
+            task = asyncio.ensure_future(job()) if job else None
+            if task is None:
+                latencies = await _measure(client, site_ids[0], lambda: False, args.requests)
+            else:
+                latencies = await _measure(client, site_ids[0], task.done, 1_000_000)
+                await task
+            job_seconds = time.perf_counter() - job_started if task else 0.0
+            print(
+                f"{name:<10} {len(latencies):>8} {statistics.median(latencies):>8.2f} "
+                f"{_percentile(latencies, 99):>8.2f} {max(latencies):>8.2f} {job_seconds:>7.2f}"
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000, help="events to seed")
+    parser.add_argument("--sites", type=int, default=20, help="number of sites")
+    parser.add_argument("--requests", type=int, default=500, help="requests for idle run")
+    cli_args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pagepulse-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["DEBUG"] = "false"
+    sys.path.insert(0, str(SRC))
+    asyncio.run(main(cli_args))
@@ -1,11 +1,18 @@
+from datetime import date
+
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
-from app.dependencies import get_current_user
+from app.cache import response_cache
+from app.database import async_session, get_db
+from app.dependencies import authenticate, get_current_user
+from app.dimensions import DIMENSIONS
+from app.http_cache import Representation, respond
+from app.live import live_publisher
 from app.models.user import User
+from app.realtime import realtime
 from app.services.analytics import AnalyticsService
 from app.services.site import SiteService
 
@@ -14,25 +21,121 @@ ui_router = APIRouter(tags=["dashboard-ui"])
 templates = Jinja2Templates(directory="src/app/templates")
 
 
+def _dashboard_json(request: Request, key: tuple, data: dict, site, public: bool) -> Response:
+    """The dashboard and its site as JSON, serialized once per cache entry."""
+    info = {"id": site.id, "name": site.name, "domain": site.domain}
+    representation = response_cache.attachment(
+        key, data, ("json", site.name, site.domain),
+        lambda: Representation.json({**data, "site": info}),
+    )
+    return respond(request, representation, public)
+
+
 # --- API Endpoint ---
 
 
 @router.get("/sites/{site_id}/analytics")
 async def get_analytics(
+    request: Request,
+    site_id: str,
+    period: str = Query("7d", pattern="^(today|7d|30d|custom)$"),
+    start: str | None = None,
+    end: str | None = None,
+    granularity: str = Query("day", pattern="^(day|hour)$"),
+    filters: str | None = None,
+    compare: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    site = await SiteService.get_site(db, site_id)
+    if site is None or site.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+
+    try:
+        key, data = await AnalyticsService.get_cached_dashboard_entry(
+            db, site_id, period, start, end, granularity, filters, compare
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    return _dashboard_json(request, key, data, site, public=False)
+
+
+@router.get("/sites/{site_id}/breakdowns/{dimension}")
+async def get_breakdown_page(
     site_id: str,
+    dimension: str,
     period: str = Query("7d", pattern="^(today|7d|30d|custom)$"),
     start: str | None = None,
     end: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    after: str | None = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     site = await SiteService.get_site(db, site_id)
     if site is None or site.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown breakdown")
 
-    data = await AnalyticsService.get_full_dashboard(db, site_id, period, start, end)
-    data["site"] = {"id": site.id, "name": site.name, "domain": site.domain}
-    return data
+    start_date, end_date = AnalyticsService._date_range(period, start, end)
+    try:
+        return await AnalyticsService.get_breakdown_page(
+            db, site_id, dimension, start_date, end_date, limit, after
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+
+@router.get("/sites/{site_id}/realtime")
+async def get_realtime(
+    site_id: str,
+    minutes: int = Query(30, ge=1, le=1440),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    site = await SiteService.get_site(db, site_id)
+    if site is None or site.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+
+    return realtime.summary(site_id, minutes)
+
+
+@router.get("/sites/{site_id}/live")
+async def stream_live(request: Request, site_id: str):
+    # A stream stays open for as long as the dashboard does, and a get_db session would
+    # hold its pooled connection until the end. Check access on a session of its own.
+    async with async_session() as db:
+        current_user = await authenticate(request, db)
+        site = await SiteService.get_site(db, site_id)
+    if site is None or site.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+
+    return StreamingResponse(
+        live_publisher.events(site_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/sites/{site_id}/analytics/delta")
+async def get_analytics_delta(
+    site_id: str,
+    cursor: str | None = None,
+    period: str = Query("7d", pattern="^(today|7d|30d|custom)$"),
+    start: str | None = None,
+    end: str | None = None,
+    granularity: str = Query("day", pattern="^(day|hour)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    site = await SiteService.get_site(db, site_id)
+    if site is None or site.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+
+    return await AnalyticsService.get_dashboard_delta(
+        db, site_id, cursor, period, start, end, granularity
+    )
 
 
 # --- Public API Endpoint ---
@@ -40,19 +143,22 @@ async def get_analytics(
 
 @router.get("/public/{site_id}/analytics")
 async def get_public_analytics(
+    request: Request,
     site_id: str,
     period: str = Query("7d", pattern="^(today|7d|30d|custom)$"),
     start: str | None = None,
     end: str | None = None,
+    granularity: str = Query("day", pattern="^(day|hour)$"),
     db: AsyncSession = Depends(get_db),
 ):
     site = await SiteService.get_site(db, site_id)
     if site is None or not site.public:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dashboard not found")
 
-    data = await AnalyticsService.get_full_dashboard(db, site_id, period, start, end)
-    data["site"] = {"id": site.id, "name": site.name, "domain": site.domain}
-    return data
+    key, data = await AnalyticsService.get_public_dashboard_entry(
+        db, site_id, period, start, end, granularity
+    )
+    return _dashboard_json(request, key, data, site, public=True)
 
 
 # --- Dashboard UI Route ---
@@ -65,6 +171,9 @@ async def dashboard_page(
     period: str = "7d",
     start: str | None = None,
     end: str | None = None,
+    granularity: str = "day",
+    filters: str | None = None,
+    compare: bool = False,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -74,7 +183,12 @@ async def dashboard_page(
 
     # Get all user's sites for the site switcher
     user_sites = await SiteService.list_sites(db, current_user.id)
-    analytics = await AnalyticsService.get_full_dashboard(db, site_id, period, start, end)
+    try:
+        analytics = await AnalyticsService.get_cached_dashboard(
+            db, site_id, period, start, end, granularity, filters, compare
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
 
     return templates.TemplateResponse(
         request, "dashboard/index.html",
@@ -84,8 +198,10 @@ async def dashboard_page(
             "sites": user_sites,
             "analytics": analytics,
             "period": period,
+            "granularity": analytics["granularity"],
             "start_date": start or analytics["start_date"],
             "end_date": end or analytics["end_date"],
+            "includes_today": analytics["end_date"] == date.today().isoformat(),
         },
     )
 
@@ -100,21 +216,32 @@ async def public_dashboard_page(
     period: str = "7d",
     start: str | None = None,
     end: str | None = None,
+    granularity: str = "day",
     db: AsyncSession = Depends(get_db),
 ):
     site = await SiteService.get_site(db, site_id)
     if site is None or not site.public:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dashboard not found")
 
-    analytics = await AnalyticsService.get_full_dashboard(db, site_id, period, start, end)
+    key, analytics = await AnalyticsService.get_public_dashboard_entry(
+        db, site_id, period, start, end, granularity
+    )
 
-    return templates.TemplateResponse(
-        request, "dashboard/public.html",
-        {
-            "site": site,
-            "analytics": analytics,
-            "period": period,
-            "start_date": start or analytics["start_date"],
-            "end_date": end or analytics["end_date"],
-        },
+    def render() -> Representation:
+        page = templates.TemplateResponse(
+            request, "dashboard/public.html",
+            {
+                "site": site,
+                "analytics": analytics,
+                "period": period,
+                "granularity": analytics["granularity"],
+                "start_date": start or analytics["start_date"],
+                "end_date": end or analytics["end_date"],
+            },
+        )
+        return Representation.html(page.body)
+
+    representation = response_cache.attachment(
+        key, analytics, ("html", site.name, start, end), render
     )
+    return respond(request, representation, public=True)
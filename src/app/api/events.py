@@ -4,7 +4,10 @@ from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
+from app.geoip import geoip
+from app.live import live_publisher
 from app.rate_limit import limiter
+from app.realtime import realtime
 from app.schemas.event import EventPayload
 from app.services.event import EventService
 from app.services.site import SiteService
@@ -38,10 +41,15 @@ async def ingest_event(
     client_ip = EventService.get_client_ip(
         dict(request.headers), request.client.host if request.client else None
     )
-    visitor_hash = EventService.compute_visitor_hash(site.id, client_ip, ua)
+    visitor_hash = EventService.compute_visitor_hash(
+        site.id, client_ip, ua, site.identity_window
+    )
     ua_info = EventService.parse_user_agent(ua)
     referrer_domain = EventService.extract_referrer_domain(payload.r)
+    # A CDN's country header wins; otherwise the local GeoIP table, if configured
     country = EventService.detect_country_from_headers(dict(request.headers))
+    if country is None:
+        country = geoip.country(client_ip)
 
     # Filter out self-referrals
     referrer = payload.r if payload.r else None
@@ -68,5 +76,7 @@ async def ingest_event(
         utm_term=payload.ut,
         utm_content=payload.ux,
     )
+    realtime.record(site.id, visitor_hash, payload.p or "/")
+    live_publisher.notify(site.id)
 
     return Response(status_code=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,47 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.dependencies import get_current_user
+from app.http_cache import accepts
+from app.models.user import User
+from app.services.export import MEDIA_TYPES, ExportStream
+from app.services.site import SiteService
+
+router = APIRouter(prefix="/api/v1", tags=["export"])
+
+
+@router.get("/sites/{site_id}/export/{table}")
+async def export_table(
+    request: Request,
+    site_id: str,
+    table: str,
+    start: date,
+    end: date,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    after: str | None = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    site = await SiteService.get_site(db, site_id)
+    if site is None or site.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+
+    compress = accepts(request.headers.get("accept-encoding"), "gzip")
+    try:
+        stream = ExportStream(db, table, start, end, format, site_id, after, compress)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+    filename = f"{table}-{start.isoformat()}-{end.isoformat()}.{format}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+        "Vary": "Accept-Encoding",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(stream, media_type=MEDIA_TYPES[format], headers=headers)
@@ -1,5 +1,9 @@
 from fastapi import APIRouter
 
+from app.cache import response_cache
+from app.cluster import cluster
+from app.live import live_publisher
+
 router = APIRouter(tags=["health"])
 
 
@@ -9,4 +13,7 @@ async def health_check():
         "status": "healthy",
         "service": "PagePulse",
         "version": "0.1.0",
+        "cache": response_cache.stats(),
+        "live": live_publisher.stats(),
+        "cluster": cluster.stats(),
     }
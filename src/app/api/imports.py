@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.dependencies import get_current_user
+from app.models.user import User
+from app.services.importer import ImportService
+from app.services.site import SiteService
+
+router = APIRouter(prefix="/api/v1", tags=["imports"])
+
+
+@router.get("/sites/{site_id}/imports")
+async def list_imports(
+    site_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    site = await SiteService.get_site(db, site_id)
+    if site is None or site.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+
+    jobs = await ImportService.list_jobs(db, site_id)
+    return [ImportService.describe(job) for job in jobs]
@@ -7,6 +7,7 @@ from app.database import get_db
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.schemas.site import SiteCreate, SiteResponse, SiteUpdate, SiteWithSnippet
+from app.services.analytics import AnalyticsService
 from app.services.site import SiteService
 
 router = APIRouter(prefix="/api/v1/sites", tags=["sites"])
@@ -38,6 +39,14 @@ async def list_sites(
     return [SiteResponse.model_validate(s) for s in sites]
 
 
+@router.get("/overview")
+async def sites_overview(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await AnalyticsService.get_sites_overview(db, current_user.id)
+
+
 @router.get("/{site_id}", response_model=SiteWithSnippet)
 async def get_site(
     site_id: str,
@@ -65,7 +74,8 @@ async def update_site(
     if site is None or site.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
     site = await SiteService.update_site(
-        db, site, name=data.name, domain=data.domain, public=data.public
+        db, site, name=data.name, domain=data.domain, public=data.public,
+        identity_window=data.identity_window,
     )
     return SiteResponse.model_validate(site)
 
@@ -91,9 +101,9 @@ async def sites_page(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    sites = await SiteService.list_sites(db, current_user.id)
+    overview = await AnalyticsService.get_sites_overview(db, current_user.id)
     return templates.TemplateResponse(
-        request, "sites/index.html", {"user": current_user, "sites": sites}
+        request, "sites/index.html", {"user": current_user, "sites": overview["sites"]}
     )
 
 
@@ -0,0 +1,210 @@
+"""In-process LRU cache for dashboard responses.
+
+Entries are keyed by site, period, resolved date range, granularity, segment filter
+and comparison mode. Ranges that end before today only change when aggregation
+rewrites one of their days, so they are kept for a long TTL and marked stale by
+``invalidate``; ranges that include today get a short TTL. The cache is per process;
+once ``broadcast`` is switched on, invalidations are also queued for ``app.cluster``,
+which replays them in every other process.
+
+An entry past its TTL is no longer returned by ``get`` but is kept for
+``stale_seconds`` more, so ``get_stale`` callers (public dashboards) can serve it
+while a fresh copy is computed in the background.
+
+Values derived from an entry, such as its serialized and compressed response bodies,
+can be kept with it through ``attachment`` and are dropped when it is replaced.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from datetime import date, timedelta
+from typing import Any
+
+from app.config import settings
+
+
+class ResponseCache:
+    """Thread-safe LRU with per-entry TTL and hit/miss counters.
+
+    Aggregation runs on the worker thread, so invalidation can come from outside the
+    web event loop; every operation holds a lock.
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        historical_ttl: float | None = None,
+        live_ttl: float | None = None,
+        stale_seconds: float | None = None,
+    ):
+        self.max_entries = max_entries or settings.analytics_cache_max_entries
+        self.historical_ttl = (
+            historical_ttl
+            if historical_ttl is not None
+            else settings.analytics_cache_historical_ttl_seconds
+        )
+        self.live_ttl = (
+            live_ttl if live_ttl is not None else settings.analytics_cache_live_ttl_seconds
+        )
+        self.stale_seconds = (
+            stale_seconds
+            if stale_seconds is not None
+            else settings.analytics_cache_stale_seconds
+        )
+        # key -> (fresh until, kept until, value, attachments), monotonic clock
+        self._entries: OrderedDict[tuple, tuple[float, float, Any, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Invalidations not yet handed to the other processes; None while not broadcasting
+        self._outbox: list[tuple[str, date | None]] | None = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(
+        site_id: str, period: str, start_date: date, end_date: date, granularity: str = "day",
+        filters: str = "", compare: bool = False,
+    ) -> tuple:
+        return (site_id, period, start_date, end_date, granularity, filters, compare)
+
+    def ttl_for(self, end_date: date) -> float:
+        """Long TTL for ranges that are entirely historical, short when they include today."""
+        return self.historical_ttl if end_date < date.today() else self.live_ttl
+
+    def _lookup(self, key: tuple, now: float) -> tuple[float, float, Any, dict] | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: tuple) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_stale(self, key: tuple) -> tuple[Any, bool] | None:
+        """``(value, fresh)`` even past the TTL, or None once the entry is gone."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            fresh = entry[0] > now
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry[2], fresh
+
+    def set(self, key: tuple, value: Any) -> None:
+        ttl = self.ttl_for(key[3])
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + ttl, now + ttl + self.stale_seconds, value, {})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def attachment(
+        self, key: tuple, value: Any, name: Hashable, factory: Callable[[], Any]
+    ) -> Any:
+        """Something derived from ``value``, built once per cache entry.
+
+        While ``key`` still holds this very ``value``, the result of ``factory`` is
+        kept with the entry under ``name`` and returned on later calls. Otherwise
+        (the entry was replaced, or ``value`` was never cached) it is built each time.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is value and name in entry[3]:
+                return entry[3][name]
+        made = factory()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is value:
+                entry[3][name] = made
+        return made
+
+    @staticmethod
+    def _covers(key: tuple, day: date) -> bool:
+        """Whether an entry reads ``day``, including the previous window of a comparison."""
+        start_date, end_date, compare = key[2], key[3], key[6]
+        if compare:
+            start_date -= end_date - start_date + timedelta(days=1)
+        return start_date <= day <= end_date
+
+    def invalidate(self, site_id: str, day: date | None = None, broadcast: bool = True) -> int:
+        """Mark a site's entries whose range covers ``day`` stale (all if ``day`` is None).
+
+        ``get`` treats them as misses from now on; ``get_stale`` still serves them.
+        Unless ``broadcast`` is False (an invalidation replayed from another process),
+        it is queued for the other processes while broadcasting is on.
+        """
+        with self._lock:
+            if broadcast and self._outbox is not None:
+                self._outbox.append((site_id, day))
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if key[0] == site_id
+                and entry[0] > 0
+                and (day is None or ResponseCache._covers(key, day))
+            ]
+            for key in stale:
+                _, kept_until, value, attachments = self._entries[key]
+                self._entries[key] = (0.0, kept_until, value, attachments)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def start_broadcast(self) -> None:
+        """Queue every later invalidation for ``drain_invalidations``."""
+        with self._lock:
+            if self._outbox is None:
+                self._outbox = []
+
+    def drain_invalidations(self) -> list[tuple[str, date | None]]:
+        """Invalidations queued since the last call, oldest first."""
+        with self._lock:
+            if not self._outbox:
+                return []
+            drained, self._outbox = self._outbox, []
+            return drained
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": (
+                    round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+                ),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
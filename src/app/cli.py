@@ -0,0 +1,207 @@
+"""PagePulse command-line tools.
+
+Usage:
+
+    python -m app.cli export pageview_events --start 2025-01-01 --end 2025-01-31 -o events.csv
+    python -m app.cli export daily_page_stats --start 2025-01-01 --end 2025-12-31 \\
+        --site <site-id> --format ndjson --gzip -o pages.ndjson.gz
+
+    python -m app.cli import history.csv --site <site-id> --table pageview_events \\
+        --map timestamp=Date --map path=Page
+    python -m app.cli import --resume <job-id>
+
+    python -m app.cli ingest-log /var/log/nginx/access.log.1 access.log.2.gz --site <site-id>
+    python -m app.cli ingest-log /var/log/nginx/access.log --site <site-id> --follow
+
+    python -m app.cli geoip-build dbip-country-lite.csv -o geoip.bin
+
+An interrupted export prints the cursor to resume from; pass it back with ``--after``
+and the remaining rows are appended to the output file. An interrupted import is
+resumed from its last committed batch with ``--resume``. With ``--background`` the
+import is queued for the server's scheduler instead of run in the foreground.
+``ingest-log`` loads access logs and aggregates the past days they cover, or with
+``--follow`` tails a live log until interrupted. ``geoip-build`` converts a CSV of
+IP ranges into the table read from ``GEOIP_TABLE_PATH``.
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from app.database import async_session, engine
+from app.geoip import build_table, geoip
+from app.models.site import Site
+from app.services.access_log import LogIngester, follow, load
+from app.services.aggregation import AggregationService
+from app.services.export import EXPORT_TABLES, ExportStream
+from app.services.importer import IMPORT_TARGETS, ImportService
+
+
+async def export(args: argparse.Namespace, session_factory=async_session) -> int:
+    """Stream one table to ``args.output`` (stdout by default). Returns the rows written."""
+    if args.output == "-":
+        out = sys.stdout.buffer
+    else:
+        out = open(args.output, "ab" if args.after else "wb")
+    try:
+        async with session_factory() as db:
+            stream = ExportStream(
+                db, args.table, args.start, args.end, args.format, args.site, args.after,
+                compress=args.gzip,
+            )
+            try:
+                async for chunk in stream:
+                    out.write(chunk)
+            except BaseException:
+                out.flush()
+                if stream.cursor:
+                    print(f"Export interrupted; resume with --after {stream.cursor}",
+                          file=sys.stderr)
+                raise
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"Exported {stream.rows:,} rows (last cursor: {stream.cursor})", file=sys.stderr)
+    return stream.rows
+
+
+def _print_progress(job) -> None:
+    percent = f" ({job.offset / job.size:.1%})" if job.size else ""
+    print(f"\r{job.rows:,} rows imported, {job.skipped:,} skipped{percent}",
+          end="", file=sys.stderr, flush=True)
+
+
+async def import_csv(args: argparse.Namespace, session_factory=async_session):
+    """Create (or resume) an import and run it, unless it is only queued."""
+    async with session_factory() as db:
+        if args.resume:
+            job_id = args.resume
+        else:
+            mapping = dict(item.split("=", 1) for item in args.map)
+            job = await ImportService.create_job(
+                db, args.site, args.table, args.file, mapping, queued=args.background
+            )
+            job_id = job.id
+            if args.background:
+                print(f"Queued import {job_id}", file=sys.stderr)
+                return job
+        try:
+            job = await ImportService.run(db, job_id, progress=_print_progress)
+        except asyncio.CancelledError:
+            async with session_factory() as other:
+                await ImportService.pause(other, job_id)
+            print(f"\nImport paused; resume with --resume {job_id}", file=sys.stderr)
+            raise
+    print(f"\nImport {job_id} {job.status}: {job.rows:,} rows, {job.skipped:,} skipped",
+          file=sys.stderr)
+    return job
+
+
+async def ingest_log(args: argparse.Namespace, session_factory=async_session) -> dict:
+    """Load access logs (then aggregate their past days), or tail one with ``--follow``."""
+    async with session_factory() as db:
+        site = await db.get(Site, args.site)
+        if site is None:
+            raise ValueError(f"Unknown site: {args.site!r}")
+        geoip.load()
+        ingester = LogIngester(site)
+        try:
+            if args.follow:
+                await follow(db, ingester, args.files[0], args.poll, args.from_start)
+            else:
+                for path in args.files:
+                    await load(db, ingester, path)
+                if ingester.first_date is not None:
+                    await AggregationService.aggregate_site(
+                        db, site.id, ingester.first_date, ingester.last_date
+                    )
+        finally:
+            counts = ingester.counts
+            print(f"{counts['lines']:,} lines: {counts['pageviews']:,} pageviews, "
+                  f"{counts['skipped']:,} filtered, {counts['malformed']:,} malformed",
+                  file=sys.stderr)
+    return ingester.counts
+
+
+async def geoip_build(args: argparse.Namespace) -> dict:
+    """Convert a CSV of IP ranges into a GeoIP table file."""
+    counts = build_table(args.source, args.output)
+    print(f"Wrote {counts['ipv4']:,} IPv4 and {counts['ipv6']:,} IPv6 ranges to {args.output} "
+          f"({counts['skipped']:,} rows skipped)", file=sys.stderr)
+    return counts
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        await args.handler(args)
+    finally:
+        await engine.dispose()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="stream a table as CSV or NDJSON")
+    export_parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    export_parser.add_argument("--start", type=date.fromisoformat, required=True,
+                               help="first day (YYYY-MM-DD)")
+    export_parser.add_argument("--end", type=date.fromisoformat, required=True,
+                               help="last day (YYYY-MM-DD)")
+    export_parser.add_argument("--site", help="only this site id (default: every site)")
+    export_parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    export_parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    export_parser.add_argument("--after", help="resume after this cursor (appends)")
+    export_parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    export_parser.set_defaults(handler=export)
+
+    import_parser = commands.add_parser("import", help="bulk-load a CSV file into a table")
+    import_parser.add_argument("file", nargs="?", help="CSV file (.csv or .csv.gz)")
+    import_parser.add_argument("--site", help="site id to import into")
+    import_parser.add_argument("--table", choices=sorted(IMPORT_TARGETS))
+    import_parser.add_argument("--map", action="append", default=[], metavar="FIELD=COLUMN",
+                               help="read FIELD from COLUMN (repeatable)")
+    import_parser.add_argument("--background", action="store_true",
+                               help="queue for the server's scheduler instead of running now")
+    import_parser.add_argument("--resume", metavar="JOB_ID", help="continue an earlier import")
+    import_parser.set_defaults(handler=import_csv)
+
+    log_parser = commands.add_parser("ingest-log", help="load or tail nginx/Apache access logs")
+    log_parser.add_argument("files", nargs="+", help="access logs (common or combined format)")
+    log_parser.add_argument("--site", required=True, help="site id the logs belong to")
+    log_parser.add_argument("--follow", action="store_true", help="tail a live log")
+    log_parser.add_argument("--from-start", action="store_true",
+                            help="with --follow, read the existing lines first")
+    log_parser.add_argument("--poll", type=float, default=1.0,
+                            help="with --follow, seconds between checks for new lines")
+    log_parser.set_defaults(handler=ingest_log)
+
+    geoip_parser = commands.add_parser("geoip-build", help="build the GeoIP range table")
+    geoip_parser.add_argument("source", help="CSV of start,end,country rows")
+    geoip_parser.add_argument("-o", "--output", required=True,
+                              help="table file (point GEOIP_TABLE_PATH at it)")
+    geoip_parser.set_defaults(handler=geoip_build)
+    return parser
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "import" and not args.resume:
+        if not (args.file and args.site and args.table):
+            parser.error("import needs a file, --site and --table (or --resume)")
+        if any("=" not in item for item in args.map):
+            parser.error("--map takes FIELD=COLUMN")
+    if args.command == "ingest-log" and args.follow and len(args.files) != 1:
+        parser.error("--follow tails exactly one file")
+    return args
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except ValueError as exc:
+        sys.exit(f"error: {exc}")
@@ -0,0 +1,237 @@
+"""Sharing per-process state between the processes of a deployment through the database.
+
+Each uvicorn worker (and each instance on the same database) keeps its response cache,
+realtime counters and live publishers in memory. Every ``CLUSTER_SYNC_SECONDS`` each
+process runs ``ClusterSync.sync``, which
+
+* logs the cache invalidations it made to ``cache_invalidations`` and replays the ones
+  other processes logged, so aggregation in the scheduler leader reaches every cache;
+* publishes the realtime buckets that changed to ``realtime_buckets`` and merges the
+  other processes' buckets into its own store, telling the live publisher how many
+  pageviews they added.
+
+An invalidation or a pageview therefore reaches the other processes within about two
+sync intervals. Both tables are read from the last row id seen, so a sync with nothing
+new costs two indexed queries.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.cache import ResponseCache, response_cache
+from app.database import async_session
+from app.hll import HyperLogLog
+from app.live import LivePublisher, live_publisher
+from app.models.cluster import CacheInvalidation, RealtimeBucket
+from app.realtime import MinuteBucket, RealtimeStore, SpaceSaving, realtime
+
+logger = logging.getLogger(__name__)
+
+# Logged invalidations are kept this long, far beyond any sync interval
+INVALIDATION_RETENTION = timedelta(minutes=10)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _default_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ClusterSync:
+    """Exchanges cache invalidations and realtime buckets with the other processes."""
+
+    def __init__(
+        self,
+        holder_id: str | None = None,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
+        cache: ResponseCache | None = None,
+        store: RealtimeStore | None = None,
+        publisher: LivePublisher | None = None,
+    ):
+        self.holder_id = holder_id or _default_holder_id()
+        self._session_factory = session_factory or async_session
+        self.cache = cache or response_cache
+        self.store = store or realtime
+        self.publisher = publisher or live_publisher
+        # Highest row id already read from each table
+        self._invalidation_cursor: int | None = None
+        self._bucket_cursor = 0
+        # Local changes not yet written; kept across a failed sync
+        self._invalidations: list[tuple[str, date | None]] = []
+        self._buckets: dict[tuple[str, int], MinuteBucket] = {}
+        self.invalidations_sent = 0
+        self.invalidations_replayed = 0
+        self.buckets_sent = 0
+        self.buckets_merged = 0
+
+    async def start(self) -> None:
+        """Queue local invalidations from now on, and skip those logged before startup.
+
+        The cache starts empty, so older invalidations have nothing left to mark stale.
+        """
+        self.cache.start_broadcast()
+        async with self._session_factory() as db:
+            latest = await db.scalar(select(func.max(CacheInvalidation.id)))
+        self._invalidation_cursor = latest or 0
+
+    async def sync(self) -> None:
+        """Publish local changes, then apply the other processes' changes."""
+        if self._invalidation_cursor is None:
+            await self.start()
+        self._invalidations += self.cache.drain_invalidations()
+        for site_id, bucket in self.store.changed():
+            self._buckets[(site_id, bucket.minute)] = bucket
+        minute = int(time.time() // 60)
+        self.store.prune(minute)
+        oldest = minute - self.store.window_minutes + 1
+        try:
+            async with self._session_factory() as db:
+                await self._publish_invalidations(db)
+                await self._publish_buckets(db, oldest)
+                await db.commit()
+                self._sent()
+                await self._replay_invalidations(db)
+                await self._merge_buckets(db, oldest)
+        except Exception:
+            logger.exception("Cluster sync failed for %s", self.holder_id)
+
+    async def stop(self) -> None:
+        """Send the last invalidations and withdraw this process's realtime buckets.
+
+        The buckets live on in this process's snapshot file, which the next process to
+        claim it restores and publishes again.
+        """
+        self._invalidations += self.cache.drain_invalidations()
+        try:
+            async with self._session_factory() as db:
+                await self._publish_invalidations(db)
+                await db.execute(
+                    delete(RealtimeBucket).where(RealtimeBucket.holder_id == self.holder_id)
+                )
+                await db.commit()
+            self._sent()
+        except Exception:
+            logger.exception("Failed to withdraw cluster state of %s", self.holder_id)
+
+    async def _publish_invalidations(self, db: AsyncSession) -> None:
+        if not self._invalidations:
+            return
+        now = _utcnow()
+        await db.execute(
+            insert(CacheInvalidation),
+            [
+                {"holder_id": self.holder_id, "site_id": site_id, "day": day, "created_at": now}
+                for site_id, day in self._invalidations
+            ],
+        )
+        await db.execute(
+            delete(CacheInvalidation).where(
+                CacheInvalidation.created_at < now - INVALIDATION_RETENTION
+            )
+        )
+
+    async def _publish_buckets(self, db: AsyncSession, oldest: int) -> None:
+        self._buckets = {key: b for key, b in self._buckets.items() if b.minute >= oldest}
+        buckets = list(self._buckets.items())
+        if buckets:
+            # Each bucket is written as a new row, so readers find it past their cursor
+            conn = await db.connection()
+            await conn.execute(
+                delete(RealtimeBucket.__table__).where(
+                    RealtimeBucket.holder_id == self.holder_id,
+                    RealtimeBucket.site_id == bindparam("b_site_id"),
+                    RealtimeBucket.minute == bindparam("b_minute"),
+                ),
+                [{"b_site_id": site_id, "b_minute": minute} for (site_id, minute), _ in buckets],
+            )
+            await conn.execute(
+                insert(RealtimeBucket.__table__),
+                [
+                    {
+                        "holder_id": self.holder_id,
+                        "site_id": site_id,
+                        "minute": minute,
+                        "pageviews": bucket.pageviews,
+                        "visitors": bucket.sketch().to_bytes(),
+                        "paths": json.dumps(bucket.paths.to_dict()),
+                    }
+                    for (site_id, minute), bucket in buckets
+                ],
+            )
+            await db.execute(delete(RealtimeBucket).where(RealtimeBucket.minute < oldest))
+
+    def _sent(self) -> None:
+        """Forget local changes once they are committed."""
+        self.invalidations_sent += len(self._invalidations)
+        self.buckets_sent += len(self._buckets)
+        self._invalidations = []
+        self._buckets = {}
+
+    async def _replay_invalidations(self, db: AsyncSession) -> None:
+        result = await db.execute(
+            select(CacheInvalidation.id, CacheInvalidation.site_id, CacheInvalidation.day)
+            .where(
+                CacheInvalidation.id > self._invalidation_cursor,
+                CacheInvalidation.holder_id != self.holder_id,
+            )
+            .order_by(CacheInvalidation.id)
+        )
+        for row in result.all():
+            self.cache.invalidate(row.site_id, row.day, broadcast=False)
+            self._invalidation_cursor = row.id
+            self.invalidations_replayed += 1
+
+    async def _merge_buckets(self, db: AsyncSession, oldest: int) -> None:
+        result = await db.execute(
+            select(RealtimeBucket)
+            .where(
+                RealtimeBucket.id > self._bucket_cursor,
+                RealtimeBucket.holder_id != self.holder_id,
+                RealtimeBucket.minute >= oldest,
+            )
+            .order_by(RealtimeBucket.id)
+        )
+        added: dict[str, int] = {}
+        for row in result.scalars():
+            delta = self.store.merge_peer(
+                row.holder_id,
+                row.site_id,
+                row.minute,
+                row.pageviews,
+                HyperLogLog.from_bytes(row.visitors),
+                SpaceSaving.from_dict(json.loads(row.paths)),
+            )
+            if delta > 0:
+                added[row.site_id] = added.get(row.site_id, 0) + delta
+            self._bucket_cursor = row.id
+            self.buckets_merged += 1
+        if self.store.peers:
+            live = await db.scalars(
+                select(RealtimeBucket.holder_id)
+                .where(RealtimeBucket.holder_id != self.holder_id)
+                .distinct()
+            )
+            self.store.forget_peers(set(live))
+        for site_id, pageviews in added.items():
+            self.publisher.notify(site_id, pageviews)
+
+    def stats(self) -> dict:
+        return {
+            "invalidations_sent": self.invalidations_sent,
+            "invalidations_replayed": self.invalidations_replayed,
+            "buckets_sent": self.buckets_sent,
+            "buckets_merged": self.buckets_merged,
+        }
+
+
+cluster = ClusterSync()
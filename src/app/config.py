@@ -13,6 +13,83 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     jwt_access_token_expire_minutes: int = 1440
 
+    # Nightly aggregation runs on a dedicated, lower-priority worker thread. It yields
+    # after every slice of work and defers remaining sites once the budget (active wall
+    # time, not CPU time) is spent. An hourly catch-up run aggregates deferred
+    # site-days from the last few days.
+    aggregation_budget_seconds: float = 600.0
+    aggregation_slice_ms: int = 10
+    aggregation_catch_up_days: int = 7
+    worker_niceness: int = 19
+
+    # Scheduled jobs run only in the leader process: "database" (renewed lease row,
+    # works across hosts), "file" (flock, single host) or "none" (every process).
+    scheduler_leader_backend: str = "database"
+    scheduler_lease_seconds: int = 30
+    scheduler_heartbeat_seconds: int = 10
+    scheduler_lock_file: str = "./pagepulse-scheduler.lock"
+
+    # Processes sharing the database exchange response-cache invalidations and realtime
+    # buckets this often, so any number of workers or instances serve the same data
+    # (0 disables the exchange, for a deployment of one process).
+    cluster_sync_seconds: float = 2.0
+
+    # Dashboard sections run concurrently on separate read connections; a section
+    # that fails or exceeds the timeout is returned empty and listed in "degraded".
+    dashboard_max_concurrency: int = 4
+    dashboard_section_timeout_seconds: float = 5.0
+
+    # Dashboard responses are cached per process. Ranges ending before today keep
+    # their entry until it expires or aggregation (in any process) rewrites one of
+    # their days.
+    analytics_cache_max_entries: int = 1000
+    analytics_cache_historical_ttl_seconds: float = 3600.0
+    analytics_cache_live_ttl_seconds: float = 30.0
+    # Public dashboards keep serving an expired entry for this long while it is
+    # recomputed in the background (stale-while-revalidate).
+    analytics_cache_stale_seconds: float = 86400.0
+
+    # Values kept per dimension in the precomputed 7d/30d leaderboards
+    leaderboard_size: int = 50
+
+    # In-memory realtime counters: minutes kept per site, paths tracked per minute by
+    # the heavy-hitters sketch, and where they are saved across restarts (each worker
+    # process claims its own file: the path, then path.1, path.2, ...).
+    realtime_window_minutes: int = 30
+    realtime_top_paths: int = 50
+    realtime_snapshot_path: str = "./pagepulse-realtime.json"
+    # Live dashboard stream: how often each site's update is published, and how
+    # often an idle stream sends a keep-alive comment.
+    live_interval_seconds: float = 2.0
+    live_heartbeat_seconds: float = 15.0
+
+    # Analytics and share responses carry an ETag and are compressed (brotli when
+    # installed, else gzip) from this size on. Browsers and proxies may reuse public
+    # ones for max-age seconds; private ones are revalidated on every request.
+    http_compression_min_bytes: int = 1024
+    http_public_max_age_seconds: int = 60
+
+    # Where the ingest rate limiter counts requests. "memory://" counts in each process,
+    # so with several workers or instances use a shared store (e.g. redis://host:6379,
+    # which needs the redis package).
+    rate_limit_storage_uri: str = "memory://"
+
+    # Exports read rows through a server-side cursor this many at a time and send
+    # them in chunks of about this size.
+    export_batch_rows: int = 5000
+    export_chunk_bytes: int = 65536
+    # Bulk CSV imports commit this many rows per multi-row insert. Queued imports run
+    # on the worker thread for at most a slice per minute, so aggregation jobs still
+    # get their turn.
+    import_batch_rows: int = 5000
+    import_slice_seconds: float = 45.0
+
+    # Country lookups for events without a CDN country header use this table, built
+    # with `python -m app.cli geoip-build` (unset: no lookups). Recently seen
+    # addresses are cached.
+    geoip_table_path: str = ""
+    geoip_cache_size: int = 65536
+
     host: str = "0.0.0.0"
     port: int = 8000
 
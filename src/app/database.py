@@ -1,13 +1,42 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from datetime import datetime
+
+from sqlalchemy import event, func
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import settings
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-)
+
+def create_engine(database_url: str, echo: bool = False) -> AsyncEngine:
+    """Create an async engine, enabling WAL and a busy timeout for SQLite.
+
+    WAL lets dashboard reads proceed while the aggregation worker writes, and the
+    busy timeout makes short write transactions queue instead of failing.
+    """
+    is_sqlite = "sqlite" in database_url
+    new_engine = create_async_engine(
+        database_url,
+        echo=echo,
+        connect_args={"check_same_thread": False} if is_sqlite else {},
+    )
+    if is_sqlite:
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.close()
+
+    return new_engine
+
+
+engine = create_engine(settings.database_url, echo=settings.debug)
 
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -16,6 +45,18 @@ class Base(DeclarativeBase):
     pass
 
 
+def hour_bucket(db: AsyncSession, column):
+    """SQL expression truncating a timestamp column to the start of its hour."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def as_datetime(value: datetime | str) -> datetime:
+    """Normalize an hour bucket value (SQLite returns text) to a datetime."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
 async def get_db() -> AsyncSession:
     async with async_session() as session:
         try:
@@ -10,6 +10,11 @@ async def get_current_user(
     request: Request,
     db: AsyncSession = Depends(get_db),
 ) -> User:
+    return await authenticate(request, db)
+
+
+async def authenticate(request: Request, db: AsyncSession) -> User:
+    """The user of the request's access token, or a 401."""
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
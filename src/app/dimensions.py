@@ -0,0 +1,125 @@
+"""Registry of breakdown dimensions.
+
+A dimension names the ``PageviewEvent`` fields it groups by, the dashboard section it
+fills and where its daily aggregates live: a dedicated ``Daily*Stats`` table or the
+generic ``DailyBreakdownStats``. Aggregation, rollups and dashboard queries all iterate
+this registry, so a new breakdown is a new entry here.
+"""
+
+from sqlalchemy import func, literal
+
+from app.models.event import PageviewEvent
+from app.models.stats import (
+    UTM_SEPARATOR,
+    DailyBreakdownStats,
+    DailyBrowserStats,
+    DailyCountryStats,
+    DailyDeviceStats,
+    DailyPageStats,
+    DailyReferrerStats,
+    DailyUTMStats,
+)
+
+
+def _join(columns):
+    """A single key expression; multi-field keys treat NULL as "" and join the parts."""
+    if len(columns) == 1:
+        return columns[0]
+    expr = func.coalesce(columns[0], "")
+    for column in columns[1:]:
+        expr = expr + UTM_SEPARATOR + func.coalesce(column, "")
+    return expr
+
+
+class Dimension:
+    def __init__(
+        self,
+        name: str,
+        fields: tuple[str, ...],
+        section: str,
+        model=None,
+        skip_empty: bool = False,
+    ):
+        self.name = name
+        self.fields = fields
+        self.section = section
+        self.model = model
+        self.skip_empty = skip_empty
+
+    # --- Raw events (``source`` is ``PageviewEvent`` or the columns of a CTE over it) ---
+
+    def raw_key(self, source=PageviewEvent):
+        return _join([getattr(source, field) for field in self.fields])
+
+    def raw_filters(self, source=PageviewEvent) -> tuple:
+        column = getattr(source, self.fields[0])
+        if self.skip_empty:
+            return column.isnot(None), column != ""
+        return (column.isnot(None),)
+
+    # --- Daily aggregates ---
+
+    @property
+    def daily_table(self):
+        return self.model if self.model is not None else DailyBreakdownStats
+
+    def daily_key(self):
+        if self.model is None:
+            return DailyBreakdownStats.value
+        return _join([getattr(self.model, field) for field in self.fields])
+
+    def daily_filters(self) -> tuple:
+        if self.model is None:
+            return (DailyBreakdownStats.dimension == self.name,)
+        return ()
+
+    def daily_row(self, site_id: str, day, value: str, **counts):
+        """Build the daily summary row for one key."""
+        if self.model is None:
+            return DailyBreakdownStats(
+                site_id=site_id, date=day, dimension=self.name, value=value, **counts
+            )
+        parts = value.split(UTM_SEPARATOR) if len(self.fields) > 1 else [value]
+        return self.model(site_id=site_id, date=day, **dict(zip(self.fields, parts)), **counts)
+
+    def split(self, value: str) -> dict:
+        """Map a stored key back to its response fields.
+
+        Multi-field keys store a missing part as ""; it is returned as None, as the
+        field is on the raw event.
+        """
+        if len(self.fields) == 1:
+            return {self.fields[0]: value}
+        return {
+            field: part or None for field, part in zip(self.fields, value.split(UTM_SEPARATOR))
+        }
+
+    def join(self, row: dict) -> str:
+        """The stored key of a response row (inverse of ``split``)."""
+        return UTM_SEPARATOR.join(row[field] or "" for field in self.fields)
+
+
+DIMENSIONS: dict[str, Dimension] = {
+    d.name: d
+    for d in [
+        Dimension("path", ("path",), "top_pages", DailyPageStats),
+        Dimension(
+            "referrer_domain", ("referrer_domain",), "top_referrers", DailyReferrerStats,
+            skip_empty=True,
+        ),
+        Dimension("browser", ("browser",), "browsers", DailyBrowserStats),
+        Dimension("device_type", ("device_type",), "devices", DailyDeviceStats),
+        Dimension("country_code", ("country_code",), "countries", DailyCountryStats),
+        Dimension(
+            "utm", ("utm_source", "utm_medium", "utm_campaign"), "utm_campaigns", DailyUTMStats
+        ),
+        Dimension("os", ("os",), "operating_systems"),
+        Dimension("utm_term", ("utm_term",), "utm_terms", skip_empty=True),
+        Dimension("utm_content", ("utm_content",), "utm_contents", skip_empty=True),
+    ]
+}
+
+
+def dimension_label(name: str):
+    """Literal column naming the dimension of each row in a UNION ALL."""
+    return literal(name).label("dimension")
@@ -0,0 +1,71 @@
+"""Bounded concurrent execution of independent read sections, each on its own session.
+
+Used by the dashboard: every widget is a section. Sections run concurrently (at most
+``max_concurrency`` at once per call), each one is cut off after ``timeout`` seconds, and
+a section that fails or times out falls back to its default value instead of failing
+the whole response.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Section = Callable[[AsyncSession], Awaitable[Any]]
+
+
+def supports_concurrent_sessions(engine: AsyncEngine | None) -> bool:
+    """False when every session would share one connection (in-memory SQLite)."""
+    return engine is not None and not isinstance(engine.sync_engine.pool, StaticPool)
+
+
+async def gather_sections(
+    db: AsyncSession,
+    sections: dict[str, Section],
+    defaults: dict[str, Any],
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+) -> tuple[dict[str, Any], dict[str, str]]:
+    """Run ``sections`` and return ``(results, errors)``.
+
+    Each section gets a fresh read session on the same engine as ``db``. ``errors``
+    maps the name of every section that fell back to its default to ``"timeout"`` or
+    ``"error"``. If the engine cannot hand out separate connections, sections run one
+    after another on ``db`` with the same timeout and isolation.
+    """
+    max_concurrency = max_concurrency or settings.dashboard_max_concurrency
+    timeout = timeout if timeout is not None else settings.dashboard_section_timeout_seconds
+    engine = db.bind
+    concurrent = max_concurrency > 1 and supports_concurrent_sessions(engine)
+    session_factory = (
+        async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        if concurrent
+        else None
+    )
+    semaphore = asyncio.Semaphore(max_concurrency if concurrent else 1)
+    errors: dict[str, str] = {}
+
+    async def run(name: str, section: Section) -> Any:
+        async with semaphore:
+            try:
+                if session_factory is None:
+                    return await asyncio.wait_for(section(db), timeout)
+                async with session_factory() as session:
+                    return await asyncio.wait_for(section(session), timeout)
+            except TimeoutError:
+                logger.warning("Dashboard section %s timed out after %.1fs", name, timeout)
+                errors[name] = "timeout"
+            except Exception:
+                logger.exception("Dashboard section %s failed", name)
+                errors[name] = "error"
+            return defaults.get(name)
+
+    values = await asyncio.gather(*(run(name, section) for name, section in sections.items()))
+    return dict(zip(sections, values)), errors
@@ -0,0 +1,201 @@
+"""Local IP → country resolution from a memory-mapped table of sorted IP ranges.
+
+``build_table`` converts a CSV of ranges (``start,end,country``, with the bounds as
+addresses or integers, as in the DB-IP and IP2Location "lite" downloads) into a
+compact binary file: adjacent ranges of one country are merged, and each address
+family is stored as three fixed-width arrays (big-endian range starts, range ends,
+two-letter country codes). Big-endian keys order the same as their byte strings, so
+a lookup is a ``bisect`` over slices of the mapped file; nothing is parsed at
+startup and the table is shared by the page cache across worker processes.
+
+The ingest path goes through ``GeoIPResolver.country``, an LRU cache in front of
+the table, since the same addresses keep coming back.
+"""
+
+import bisect
+import csv
+import ipaddress
+import logging
+import mmap
+import struct
+from functools import lru_cache
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PPGEOIP1"
+# magic, IPv4 range count, IPv6 range count
+_HEADER = struct.Struct(">8sII")
+_WIDTHS = {4: 4, 6: 16}
+
+
+class _Keys:
+    """Fixed-width keys of one array in the mapped file, as a sequence for ``bisect``."""
+
+    __slots__ = ("data", "offset", "width", "count")
+
+    def __init__(self, data, offset: int, width: int, count: int):
+        self.data = data
+        self.offset = offset
+        self.width = width
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        start = self.offset + index * self.width
+        return self.data[start:start + self.width]
+
+
+class GeoIPTable:
+    """A table written by ``build_table``, mapped read-only."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, v4, v6 = _HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a GeoIP range table")
+            offset = _HEADER.size
+            self._families = {}
+            for version, count in ((4, v4), (6, v6)):
+                width = _WIDTHS[version]
+                starts = _Keys(self._map, offset, width, count)
+                ends = _Keys(self._map, offset + count * width, width, count)
+                countries = offset + 2 * count * width
+                self._families[version] = (starts, ends, countries)
+                offset = countries + 2 * count
+            if offset != len(self._map):
+                raise ValueError(f"{path} is truncated or corrupt")
+        except (ValueError, struct.error):
+            self._map.close()
+            raise
+        self.ranges = v4 + v6
+
+    def lookup(self, ip: str) -> str | None:
+        """Country code of an address, or None if it is invalid or in no range."""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        starts, ends, countries = self._families[address.version]
+        key = address.packed
+        index = bisect.bisect_right(starts, key) - 1
+        if index < 0 or ends[index] < key:
+            return None
+        start = countries + 2 * index
+        return self._map[start:start + 2].decode("ascii")
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def _parse_bound(value: str):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        if number < 2**32:
+            return ipaddress.IPv4Address(number)
+        return ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+def build_table(source: str, output: str) -> dict:
+    """Convert a CSV of IP ranges into a table file. Returns range counts per family.
+
+    Rows without a two-letter country (headers, ``-``, ``ZZ``) and malformed rows are
+    skipped. Returns ``{"ipv4": n, "ipv6": n, "skipped": n}``.
+    """
+    ranges: dict[int, list[tuple[int, int, str]]] = {4: [], 6: []}
+    skipped = 0
+    with open(source, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            try:
+                start, end = _parse_bound(row[0]), _parse_bound(row[1])
+                country = row[2].strip().upper()
+            except (IndexError, ValueError):
+                skipped += 1
+                continue
+            if (
+                start.version != end.version
+                or start > end
+                or len(country) != 2
+                or not country.isalpha()
+                or country == "ZZ"
+            ):
+                skipped += 1
+                continue
+            ranges[start.version].append((int(start), int(end), country))
+
+    merged: dict[int, list[list]] = {}
+    for version, family in ranges.items():
+        family.sort()
+        merged[version] = []
+        for start, end, country in family:
+            last = merged[version][-1] if merged[version] else None
+            if last is not None and start <= last[1]:
+                # Overlapping ranges: the earlier one wins the overlap
+                start = last[1] + 1
+                if start > end:
+                    continue
+            if last is not None and start == last[1] + 1 and country == last[2]:
+                last[1] = end
+            else:
+                merged[version].append([start, end, country])
+
+    with open(output, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(merged[4]), len(merged[6])))
+        for version in (4, 6):
+            width = _WIDTHS[version]
+            family = merged[version]
+            f.write(b"".join(start.to_bytes(width, "big") for start, _, _ in family))
+            f.write(b"".join(end.to_bytes(width, "big") for _, end, _ in family))
+            f.write(b"".join(country.encode("ascii") for _, _, country in family))
+    return {"ipv4": len(merged[4]), "ipv6": len(merged[6]), "skipped": skipped}
+
+
+class GeoIPResolver:
+    """The process's GeoIP table (if configured) behind an LRU cache."""
+
+    def __init__(self, cache_size: int | None = None):
+        self.cache_size = cache_size or settings.geoip_cache_size
+        self.table: GeoIPTable | None = None
+        self._cached = None
+
+    def load(self, path: str | None = None) -> bool:
+        """Map the table at ``path`` (default ``GEOIP_TABLE_PATH``), replacing any other.
+
+        An unset path disables resolution; a missing or unreadable file is logged and
+        leaves the resolver disabled rather than failing startup.
+        """
+        path = settings.geoip_table_path if path is None else path
+        self.close()
+        if not path:
+            return False
+        try:
+            self.table = GeoIPTable(path)
+        except (OSError, ValueError):
+            logger.warning("GeoIP table %s could not be loaded", path, exc_info=True)
+            return False
+        self._cached = lru_cache(maxsize=self.cache_size)(self.table.lookup)
+        return True
+
+    def country(self, ip: str | None) -> str | None:
+        """Country code of ``ip``, or None without a table or a matching range."""
+        if self._cached is None or not ip:
+            return None
+        return self._cached(ip)
+
+    def close(self) -> None:
+        if self.table is not None:
+            self._cached = None
+            self.table.close()
+            self.table = None
+
+
+geoip = GeoIPResolver()
@@ -0,0 +1,100 @@
+"""HyperLogLog sketches of visitor hashes, stored next to the daily aggregates.
+
+Each sketch has 2^11 registers, giving a standard error of about 2.3% (1.04 / sqrt(2048))
+on the estimated number of distinct visitors; roughly 95% of estimates fall within 4.6%.
+Sketches merge losslessly, so the uniques for any span of days are estimated by merging
+the daily sketches instead of re-scanning raw events.
+
+Small sketches are serialized sparsely (3 bytes per non-empty register) and switch to
+a dense 2 KB register array once that is smaller.
+"""
+
+import hashlib
+import math
+import struct
+from collections.abc import Iterable
+
+PRECISION = 11
+REGISTERS = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+
+_VERSION = 1
+_SPARSE = 0
+_DENSE = 1
+_HEADER = struct.Struct(">BBB")  # version, precision, encoding
+_SPARSE_ENTRY = struct.Struct(">HB")  # register index, rank
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+def register(value: str) -> tuple[int, int]:
+    """The register index and rank ``value`` sets in a sketch."""
+    # Visitor hashes are already uniform, but rehashing keeps the sketch correct
+    # for any identifier and costs little next to the database round trip.
+    x = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+    remainder = x & ((1 << (64 - PRECISION)) - 1)
+    return x >> (64 - PRECISION), (64 - PRECISION) - remainder.bit_length() + 1
+
+
+class HyperLogLog:
+    """A mergeable distinct-count sketch over visitor hash strings."""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: bytearray | None = None):
+        self.registers = registers if registers is not None else bytearray(REGISTERS)
+
+    @classmethod
+    def from_hashes(cls, hashes: Iterable[str]) -> "HyperLogLog":
+        sketch = cls()
+        for value in hashes:
+            sketch.add(value)
+        return sketch
+
+    def add(self, value: str) -> None:
+        index, rank = register(value)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold ``other`` into this sketch (register-wise max) and return self."""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def cardinality(self) -> int:
+        zeros = self.registers.count(0)
+        if zeros == REGISTERS:
+            return 0
+        estimate = _ALPHA * REGISTERS * REGISTERS / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        entries = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(entries) * _SPARSE_ENTRY.size < REGISTERS:
+            body = b"".join(_SPARSE_ENTRY.pack(i, r) for i, r in entries)
+            return _HEADER.pack(_VERSION, PRECISION, _SPARSE) + body
+        return _HEADER.pack(_VERSION, PRECISION, _DENSE) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        version, precision, encoding = _HEADER.unpack_from(data)
+        if version != _VERSION or precision != PRECISION:
+            raise ValueError(f"Unsupported sketch (version {version}, precision {precision})")
+        body = memoryview(data)[_HEADER.size:]
+        if encoding == _DENSE:
+            return cls(bytearray(body))
+        registers = bytearray(REGISTERS)
+        for index, rank in _SPARSE_ENTRY.iter_unpack(body):
+            registers[index] = rank
+        return cls(registers)
+
+
+def merge_sketches(blobs: Iterable[bytes | None]) -> HyperLogLog:
+    """Merge serialized sketches, skipping rows aggregated before sketches existed."""
+    merged = HyperLogLog()
+    for blob in blobs:
+        if blob:
+            merged.merge(HyperLogLog.from_bytes(blob))
+    return merged
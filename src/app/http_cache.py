@@ -0,0 +1,144 @@
+"""Validators and compression for the analytics and share responses.
+
+A ``Representation`` is a response body serialized once. Its ETag is a hash of the
+body, so it only changes when the data does and is the same in every process and after
+a recomputation. Keys that differ on every computation without the data changing (the
+dashboard's delta ``cursor``, a database-clock watermark) are left out of the hash.
+Compressed variants are built on first use and kept on the representation, which the
+routes store alongside the cached dashboard (``ResponseCache.attachment``): a cache hit
+neither serializes nor compresses again.
+
+``respond`` answers ``If-None-Match`` with 304 and sets ``Cache-Control`` and ``Vary``
+for private (cookie-authenticated) or public routes.
+"""
+
+import gzip
+import hashlib
+import json
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+def _compress(coding: str, body: bytes) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=5)
+    # mtime=0 keeps the bytes (and so the ETag of the variant) reproducible
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Representation:
+    """A serialized body with its ETag and lazily built compressed variants."""
+
+    def __init__(self, body: bytes, media_type: str, version: bytes | None = None):
+        self.body = body
+        self.media_type = media_type
+        digest = hashlib.blake2b(body if version is None else version, digest_size=16)
+        self.etag = digest.hexdigest()
+        self._encoded: dict[str, bytes] = {}
+
+    @classmethod
+    def json(cls, data, volatile: tuple[str, ...] = ("cursor",)) -> "Representation":
+        """``data`` as JSON, its ETag ignoring the top-level ``volatile`` keys."""
+        body = _dumps(data)
+        version = None
+        if isinstance(data, dict) and any(key in data for key in volatile):
+            version = _dumps({k: v for k, v in data.items() if k not in volatile})
+        return cls(body, "application/json", version)
+
+    @classmethod
+    def html(cls, body: bytes) -> "Representation":
+        return cls(body, "text/html; charset=utf-8")
+
+    def encoded(self, coding: str | None) -> bytes:
+        if coding is None:
+            return self.body
+        if coding not in self._encoded:
+            self._encoded[coding] = _compress(coding, self.body)
+        return self._encoded[coding]
+
+
+def _qualities(accept_encoding: str) -> dict[str, float]:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def accepts(accept_encoding: str | None, coding: str) -> bool:
+    """Whether an ``Accept-Encoding`` header allows ``coding``."""
+    if not accept_encoding:
+        return False
+    accepted = _qualities(accept_encoding)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+
+def choose_encoding(accept_encoding: str | None, size: int) -> str | None:
+    """The content coding to use: ``"br"`` or ``"gzip"`` if accepted, else None."""
+    if not accept_encoding or size < settings.http_compression_min_bytes:
+        return None
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepts(accept_encoding, coding):
+            return coding
+    return None
+
+
+def not_modified(if_none_match: str | None, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header lists ``etag`` (in any of its codings)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        candidate = candidate.removeprefix("W/").strip('"')
+        if candidate.split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+def respond(request: Request, representation: Representation, public: bool) -> Response:
+    """A 200 (compressed if worthwhile) or 304 response for ``representation``.
+
+    Compressed variants get their own ETag (``"<hash>-gzip"``), as the bytes differ,
+    but any variant of the same body satisfies ``If-None-Match``.
+    """
+    coding = choose_encoding(
+        request.headers.get("accept-encoding"), len(representation.body)
+    )
+    etag = representation.etag + (f"-{coding}" if coding else "")
+    if public:
+        cache_control = f"public, max-age={settings.http_public_max_age_seconds}"
+        vary = "Accept-Encoding"
+    else:
+        cache_control = "private, no-cache"
+        vary = "Accept-Encoding, Cookie"
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control, "Vary": vary}
+    if not_modified(request.headers.get("if-none-match"), representation.etag):
+        return Response(status_code=304, headers=headers)
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(
+        representation.encoded(coding), media_type=representation.media_type, headers=headers
+    )
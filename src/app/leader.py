@@ -0,0 +1,197 @@
+"""Leader election so scheduled jobs run in exactly one process.
+
+Every uvicorn worker (and every instance sharing the database) starts a scheduler,
+but only the current leader executes jobs. Two backends are available:
+
+* ``DatabaseLease`` — a row in ``scheduler_leases`` that the leader renews on each
+  heartbeat. If the leader dies, the lease expires and another process takes over.
+* ``FileLease`` — an exclusive ``flock`` on a local file, for single-host setups.
+  The OS drops the lock when the holding process exits.
+"""
+
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import async_session
+from app.models.lease import SchedulerLease
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _default_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderElection:
+    """Base class: always the leader. Used when leader election is disabled."""
+
+    def __init__(self, holder_id: str | None = None):
+        self.holder_id = holder_id or _default_holder_id()
+
+    @property
+    def is_leader(self) -> bool:
+        return True
+
+    async def heartbeat(self) -> bool:
+        """Acquire or renew leadership; returns whether this process is the leader."""
+        return self.is_leader
+
+    async def release(self) -> None:
+        pass
+
+
+class DatabaseLease(LeaderElection):
+    def __init__(
+        self,
+        name: str = "scheduler",
+        ttl_seconds: int = 30,
+        holder_id: str | None = None,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
+    ):
+        super().__init__(holder_id)
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._session_factory = session_factory or async_session
+        self._expires_at: datetime | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        # Leadership is only trusted until our own copy of the lease runs out, so a
+        # process whose heartbeats stalled stops running jobs before someone else starts.
+        return self._expires_at is not None and _utcnow() < self._expires_at
+
+    async def heartbeat(self) -> bool:
+        now = _utcnow()
+        expires_at = now + self.ttl
+        try:
+            async with self._session_factory() as db:
+                # Atomic take-over: renew our own lease or claim an expired one
+                result = await db.execute(
+                    update(SchedulerLease)
+                    .where(
+                        SchedulerLease.name == self.name,
+                        or_(
+                            SchedulerLease.holder_id == self.holder_id,
+                            SchedulerLease.expires_at < now,
+                        ),
+                    )
+                    .values(
+                        holder_id=self.holder_id,
+                        expires_at=expires_at,
+                        acquired_at=case(
+                            (SchedulerLease.holder_id == self.holder_id,
+                             SchedulerLease.acquired_at),
+                            else_=now,
+                        ),
+                    )
+                )
+                acquired = result.rowcount == 1
+                if not acquired and await db.get(SchedulerLease, self.name) is None:
+                    db.add(
+                        SchedulerLease(
+                            name=self.name,
+                            holder_id=self.holder_id,
+                            acquired_at=now,
+                            expires_at=expires_at,
+                        )
+                    )
+                    acquired = True
+                await db.commit()
+        except IntegrityError:
+            # Another process inserted the lease row first
+            acquired = False
+        except Exception:
+            logger.exception("Lease heartbeat failed for %s", self.name)
+            acquired = False
+
+        was_leader = self.is_leader
+        self._expires_at = expires_at if acquired else None
+        if acquired and not was_leader:
+            logger.info("Acquired %s lease as %s", self.name, self.holder_id)
+        elif was_leader and not acquired:
+            logger.warning("Lost %s lease held by %s", self.name, self.holder_id)
+        return acquired
+
+    async def release(self) -> None:
+        if self._expires_at is None:
+            return
+        self._expires_at = None
+        try:
+            async with self._session_factory() as db:
+                await db.execute(
+                    update(SchedulerLease)
+                    .where(
+                        SchedulerLease.name == self.name,
+                        SchedulerLease.holder_id == self.holder_id,
+                    )
+                    .values(expires_at=_utcnow())
+                )
+                await db.commit()
+            logger.info("Released %s lease", self.name)
+        except Exception:
+            logger.exception("Failed to release %s lease", self.name)
+
+
+class FileLease(LeaderElection):
+    def __init__(self, path: str, holder_id: str | None = None):
+        super().__init__(holder_id)
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    async def heartbeat(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            raise RuntimeError("File leases require fcntl (POSIX only)")
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, self.holder_id.encode("utf-8"))
+        self._fd = fd
+        logger.info("Acquired scheduler file lock %s as %s", self.path, self.holder_id)
+        return True
+
+    async def release(self) -> None:
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+        logger.info("Released scheduler file lock %s", self.path)
+
+
+def create_leader_election() -> LeaderElection:
+    """Build the leader election backend selected by ``SCHEDULER_LEADER_BACKEND``."""
+    backend = settings.scheduler_leader_backend
+    if backend == "database":
+        return DatabaseLease(ttl_seconds=settings.scheduler_lease_seconds)
+    if backend == "file":
+        return FileLease(settings.scheduler_lock_file)
+    if backend == "none":
+        return LeaderElection()
+    raise ValueError(f"Unknown scheduler leader backend: {backend!r}")
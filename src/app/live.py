@@ -0,0 +1,165 @@
+"""Server-Sent Events fan-out of live dashboard updates.
+
+The ingest path calls ``notify`` after recording a pageview in the realtime counters.
+While a site has subscribers, one publisher task per site wakes every
+``LIVE_INTERVAL_SECONDS``; if pageviews arrived since the last tick it computes a
+single update from the realtime counters (new pageviews, active visitors and the top
+pages that changed) and hands the same message to every subscriber's queue. The cost
+per tick is therefore independent of how many dashboards are open.
+
+Publishers are per process and serve the streams connected to it. The counters they
+read include other processes' buckets, and ``app.cluster`` notifies them of the
+pageviews those processes received, so every stream sees the whole site's traffic.
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+
+from app.config import settings
+from app.realtime import RealtimeStore, realtime
+
+logger = logging.getLogger(__name__)
+
+# Visitors seen within this many minutes count as active
+ACTIVE_MINUTES = 5
+# Top pages are tracked over the realtime window
+TOP_PAGES = 10
+# Messages buffered per subscriber; a slow client drops its oldest update
+QUEUE_SIZE = 16
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class LivePublisher:
+    """One publisher task per subscribed site, fanning out to per-client queues."""
+
+    def __init__(self, store: RealtimeStore | None = None, interval: float | None = None):
+        self.store = store or realtime
+        self.interval = interval if interval is not None else settings.live_interval_seconds
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        # Pageviews received since the last published update, per subscribed site
+        self._pending: dict[str, int] = {}
+        self._top_pages: dict[str, dict[str, int]] = {}
+        self.published = 0
+
+    def notify(self, site_id: str, pageviews: int = 1) -> None:
+        """Called by the ingest path after each recorded pageview."""
+        if site_id in self._subscribers:
+            self._pending[site_id] = self._pending.get(site_id, 0) + pageviews
+
+    def subscribe(self, site_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        subscribers = self._subscribers.setdefault(site_id, set())
+        subscribers.add(queue)
+        if site_id not in self._tasks:
+            self._top_pages[site_id] = self._current_top_pages(site_id)
+            self._tasks[site_id] = asyncio.get_running_loop().create_task(self._run(site_id))
+        return queue
+
+    def unsubscribe(self, site_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(site_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[site_id]
+            self._pending.pop(site_id, None)
+            self._top_pages.pop(site_id, None)
+            task = self._tasks.pop(site_id, None)
+            if task is not None:
+                task.cancel()
+
+    def subscriber_count(self, site_id: str | None = None) -> int:
+        if site_id is not None:
+            return len(self._subscribers.get(site_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def snapshot(self, site_id: str) -> dict:
+        """Full current state, sent to a client when it connects."""
+        summary = self.store.summary(site_id, self.store.window_minutes, TOP_PAGES)
+        return {
+            "minutes": summary["minutes"],
+            "pageviews": summary["pageviews"],
+            "active_visitors": self._active_visitors(site_id),
+            "top_pages": summary["top_paths"],
+        }
+
+    def update(self, site_id: str) -> dict | None:
+        """The incremental update for pageviews received since the last one, if any."""
+        new_pageviews = self._pending.pop(site_id, 0)
+        if not new_pageviews:
+            return None
+        previous = self._top_pages.get(site_id, {})
+        current = self._current_top_pages(site_id)
+        self._top_pages[site_id] = current
+        return {
+            "pageviews": new_pageviews,
+            "active_visitors": self._active_visitors(site_id),
+            "top_pages": [
+                {"path": path, "pageviews": count}
+                for path, count in current.items()
+                if previous.get(path) != count
+            ],
+            "removed_pages": [path for path in previous if path not in current],
+        }
+
+    def _current_top_pages(self, site_id: str) -> dict[str, int]:
+        summary = self.store.summary(site_id, self.store.window_minutes, TOP_PAGES)
+        return {row["path"]: row["pageviews"] for row in summary["top_paths"]}
+
+    def _active_visitors(self, site_id: str) -> int:
+        return self.store.summary(site_id, ACTIVE_MINUTES, 0)["visitors"]
+
+    def _broadcast(self, site_id: str, message: dict) -> None:
+        for queue in self._subscribers.get(site_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+        self.published += 1
+
+    async def _run(self, site_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                message = self.update(site_id)
+            except Exception:
+                logger.exception("Live update failed for site %s", site_id)
+                continue
+            if message is not None:
+                self._broadcast(site_id, message)
+
+    async def events(self, site_id: str, heartbeat: float | None = None) -> AsyncIterator[str]:
+        """SSE stream for one client: a snapshot, then updates and keep-alive comments.
+
+        The subscription is released when the stream is closed, which Starlette does
+        when the client disconnects.
+        """
+        heartbeat = heartbeat if heartbeat is not None else settings.live_heartbeat_seconds
+        queue = self.subscribe(site_id)
+        try:
+            yield f"retry: {int(self.interval * 1000) * 2}\n\n"
+            yield format_event("snapshot", self.snapshot(site_id))
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event("update", message)
+        finally:
+            self.unsubscribe(site_id, queue)
+
+    def stats(self) -> dict:
+        return {
+            "sites": len(self._subscribers),
+            "subscribers": self.subscriber_count(),
+            "published": self.published,
+        }
+
+
+live_publisher = LivePublisher()
@@ -13,14 +13,19 @@ from app.api.auth import ui_router as auth_ui_router
 from app.api.dashboard import router as dashboard_router
 from app.api.dashboard import ui_router as dashboard_ui_router
 from app.api.events import router as events_router
+from app.api.export import router as export_router
+from app.api.imports import router as imports_router
 from app.api.sites import router as sites_router
 from app.api.sites import ui_router as sites_ui_router
 from app.api.tracking import router as tracking_router
+from app.cluster import cluster
 from app.config import settings
 from app.database import Base, engine
 from app.dependencies import get_current_user, get_optional_user
+from app.geoip import geoip
 from app.models.user import User
 from app.rate_limit import limiter
+from app.realtime import realtime
 from app.scheduler import start_scheduler, stop_scheduler
 
 
@@ -28,9 +33,17 @@ from app.scheduler import start_scheduler, stop_scheduler
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    realtime.restore()
+    geoip.load()
+    if settings.cluster_sync_seconds > 0:
+        await cluster.start()
     start_scheduler()
     yield
-    stop_scheduler()
+    await stop_scheduler()
+    if settings.cluster_sync_seconds > 0:
+        await cluster.stop()
+    realtime.snapshot()
+    geoip.close()
 
 
 templates = Jinja2Templates(directory="src/app/templates")
@@ -64,6 +77,8 @@ def create_app() -> FastAPI:
     app.include_router(events_router)
     app.include_router(dashboard_router)
     app.include_router(dashboard_ui_router)
+    app.include_router(export_router)
+    app.include_router(imports_router)
 
     @app.get("/", response_class=HTMLResponse)
     async def landing(request: Request, user: User | None = Depends(get_optional_user)):
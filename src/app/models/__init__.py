@@ -1,12 +1,25 @@
+from app.models.cluster import CacheInvalidation, RealtimeBucket
 from app.models.event import PageviewEvent
+from app.models.import_job import ImportJob
+from app.models.lease import SchedulerLease
 from app.models.site import Site
 from app.models.stats import (
+    BreakdownRanking,
+    BreakdownRankingBuild,
+    DailyBreakdownStats,
     DailyBrowserStats,
     DailyCountryStats,
     DailyDeviceStats,
     DailyPageStats,
     DailyReferrerStats,
+    DailySegmentIndex,
+    DailySiteStats,
     DailyUTMStats,
+    HourlyPageStats,
+    HourlySiteStats,
+    LeaderboardEntry,
+    RolledUpHour,
+    RollupStats,
 )
 from app.models.user import User
 
@@ -14,10 +27,24 @@ __all__ = [
     "User",
     "Site",
     "PageviewEvent",
+    "DailySiteStats",
     "DailyPageStats",
     "DailyReferrerStats",
     "DailyBrowserStats",
     "DailyDeviceStats",
     "DailyCountryStats",
     "DailyUTMStats",
+    "DailyBreakdownStats",
+    "DailySegmentIndex",
+    "HourlySiteStats",
+    "HourlyPageStats",
+    "RolledUpHour",
+    "RollupStats",
+    "LeaderboardEntry",
+    "BreakdownRanking",
+    "BreakdownRankingBuild",
+    "SchedulerLease",
+    "CacheInvalidation",
+    "RealtimeBucket",
+    "ImportJob",
 ]
@@ -0,0 +1,47 @@
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Index, Integer, LargeBinary, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class CacheInvalidation(Base):
+    """A response-cache invalidation made by one process, replayed by the others.
+
+    ``day`` is None when every entry of the site was invalidated. Rows are read in ``id``
+    order and deleted after a few minutes.
+    """
+
+    __tablename__ = "cache_invalidations"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    holder_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    site_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+class RealtimeBucket(Base):
+    """One process's realtime counters for a site and minute, read by the others.
+
+    A process republishes a bucket whenever it changed, as a new row (so readers can
+    follow ``id``), and deletes its rows when it shuts down. ``visitors`` is the
+    serialized HyperLogLog sketch, ``paths`` the JSON Space-Saving sketch.
+    """
+
+    __tablename__ = "realtime_buckets"
+    __table_args__ = (
+        UniqueConstraint("holder_id", "site_id", "minute", name="uq_realtime_bucket"),
+        Index("ix_realtime_buckets_minute", "minute"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    holder_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    site_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    minute: Mapped[int] = mapped_column(Integer, nullable=False)
+    pageviews: Mapped[int] = mapped_column(Integer, nullable=False)
+    visitors: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    paths: Mapped[str] = mapped_column(Text, nullable=False)
@@ -0,0 +1,46 @@
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+# queued: waiting for the scheduler; running; paused: stopped from the CLI;
+# failed; done
+IMPORT_STATUSES = ("queued", "running", "paused", "failed", "done")
+
+
+class ImportJob(Base):
+    """A bulk CSV import into one table for one site (``app.services.importer``).
+
+    ``offset`` is the byte position in the file up to which rows are committed. It is
+    written in the same transaction as each batch, so a stopped import resumes exactly
+    where it left off. ``mapping`` is the JSON map of table fields to CSV columns.
+    """
+
+    __tablename__ = "import_jobs"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    target: Mapped[str] = mapped_column(String(64), nullable=False)
+    path: Mapped[str] = mapped_column(String(1024), nullable=False)
+    mapping: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")
+    offset: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    first_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+    last_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
+    )
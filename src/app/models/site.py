@@ -6,6 +6,9 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
 
+# How long a visitor keeps the same anonymous hash (the salt rotation period)
+IDENTITY_WINDOWS = ("day", "week", "month")
+
 
 class Site(Base):
     __tablename__ = "sites"
@@ -19,6 +22,9 @@ class Site(Base):
     domain: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     public: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    identity_window: Mapped[str] = mapped_column(
+        String(8), default="day", server_default="day", nullable=False
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), nullable=False
     )
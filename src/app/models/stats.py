@@ -1,12 +1,43 @@
 import uuid
-from datetime import date
+from datetime import date, datetime
 
-from sqlalchemy import Date, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import (
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    desc,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
 
 
+class DailySiteStats(Base):
+    __tablename__ = "daily_site_stats"
+    __table_args__ = (
+        UniqueConstraint("site_id", "date", name="uq_daily_site"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Visitors with a single pageview that day
+    bounces: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+
 class DailyPageStats(Base):
     __tablename__ = "daily_page_stats"
     __table_args__ = (
@@ -23,6 +54,7 @@ class DailyPageStats(Base):
     path: Mapped[str] = mapped_column(String(2048), nullable=False)
     pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
 
 
 class DailyReferrerStats(Base):
@@ -41,6 +73,7 @@ class DailyReferrerStats(Base):
     referrer_domain: Mapped[str] = mapped_column(String(255), nullable=False)
     pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
 
 
 class DailyBrowserStats(Base):
@@ -59,6 +92,7 @@ class DailyBrowserStats(Base):
     browser: Mapped[str] = mapped_column(String(64), nullable=False)
     pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
 
 
 class DailyDeviceStats(Base):
@@ -77,6 +111,7 @@ class DailyDeviceStats(Base):
     device_type: Mapped[str] = mapped_column(String(16), nullable=False)
     pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
 
 
 class DailyCountryStats(Base):
@@ -95,6 +130,7 @@ class DailyCountryStats(Base):
     country_code: Mapped[str] = mapped_column(String(2), nullable=False)
     pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
 
 
 class DailyUTMStats(Base):
@@ -118,3 +154,210 @@ class DailyUTMStats(Base):
     utm_campaign: Mapped[str] = mapped_column(String(255), nullable=False, default="")
     pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+
+class DailyBreakdownStats(Base):
+    """Daily stats for registry dimensions without a dedicated table (``app.dimensions``).
+
+    ``value`` holds the dimension's key, joined with ``UTM_SEPARATOR`` when it spans
+    several fields.
+    """
+
+    __tablename__ = "daily_breakdown_stats"
+    __table_args__ = (
+        UniqueConstraint("site_id", "date", "dimension", "value", name="uq_daily_breakdown"),
+        Index("ix_daily_breakdown_lookup", "site_id", "dimension", "date"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    dimension: Mapped[str] = mapped_column(String(32), nullable=False)
+    value: Mapped[str] = mapped_column(String(2048), nullable=False)
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+
+class HourlySiteStats(Base):
+    __tablename__ = "hourly_site_stats"
+    __table_args__ = (
+        UniqueConstraint("site_id", "hour", name="uq_hourly_site"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    hour: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class HourlyPageStats(Base):
+    __tablename__ = "hourly_page_stats"
+    __table_args__ = (
+        UniqueConstraint("site_id", "hour", "path", name="uq_hourly_page"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    hour: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    path: Mapped[str] = mapped_column(String(2048), nullable=False)
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class RolledUpHour(Base):
+    """An hour whose events have been rolled up into the hourly tables for every site.
+
+    A site without an ``HourlySiteStats`` row for a marked hour had no pageviews in
+    it; unmarked hours (the current one, or one a skipped run missed) are counted
+    from raw events instead.
+    """
+
+    __tablename__ = "rolled_up_hours"
+
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+
+class RollupStats(Base):
+    """Week, month and year rollups of the daily tables, for every dimension.
+
+    ``dimension`` is ``"site"`` for site totals (``value`` is empty) or the name of a
+    breakdown such as ``"path"`` or ``"utm"``. UTM values join source, medium and
+    campaign with ``UTM_SEPARATOR``. ``visitors_hll`` is the merged HyperLogLog sketch
+    of the period's visitor hashes (see ``app.hll``). ``bounces`` is only filled for
+    ``"site"`` rows.
+    """
+
+    __tablename__ = "rollup_stats"
+    __table_args__ = (
+        UniqueConstraint(
+            "site_id", "granularity", "period_start", "dimension", "value",
+            name="uq_rollup",
+        ),
+        Index("ix_rollup_lookup", "site_id", "dimension", "granularity", "period_start"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    granularity: Mapped[str] = mapped_column(String(8), nullable=False)
+    period_start: Mapped[date] = mapped_column(Date, nullable=False)
+    dimension: Mapped[str] = mapped_column(String(32), nullable=False)
+    value: Mapped[str] = mapped_column(String(2048), nullable=False, default="")
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    bounces: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+
+class LeaderboardEntry(Base):
+    """Precomputed top values per dimension for a site's rolling 7d and 30d windows.
+
+    Rows cover the aggregated days of the window (``start_date`` to ``end_date``,
+    normally up to yesterday) and are ranked by pageviews from 1. A ``"site"`` row at
+    rank 0 marks the leaderboard as built; its ``value`` lists the aggregated date
+    runs it was built from.
+    """
+
+    __tablename__ = "leaderboard_entries"
+
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True
+    )
+    window: Mapped[str] = mapped_column(String(8), primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(32), primary_key=True)
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    value: Mapped[str] = mapped_column(String(2048), nullable=False, default="")
+    start_date: Mapped[date] = mapped_column(Date, nullable=False)
+    end_date: Mapped[date] = mapped_column(Date, nullable=False)
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+
+class BreakdownRanking(Base):
+    """Pageviews per value of one dimension over the aggregated days of a date range.
+
+    Built on the first page request for a range (see ``QueryPlanner.breakdown_page``)
+    so later pages seek the ``(pageviews DESC, value)`` index instead of regrouping
+    the aggregate tables. Its ``BreakdownRankingBuild`` records what it was built from.
+    """
+
+    __tablename__ = "breakdown_rankings"
+    __table_args__ = (
+        Index(
+            "ix_breakdown_rankings_order",
+            "site_id", "start_date", "end_date", "dimension", desc("pageviews"), "value",
+        ),
+    )
+
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True
+    )
+    start_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    end_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(32), primary_key=True)
+    value: Mapped[str] = mapped_column(String(2048), primary_key=True)
+    pageviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class BreakdownRankingBuild(Base):
+    """The aggregated days one ``BreakdownRanking`` was built from.
+
+    ``coverage`` is the plan's aggregated date runs (``QueryPlan.coverage``) and
+    ``pageviews`` their total; a ranking that no longer matches both is rebuilt.
+    """
+
+    __tablename__ = "breakdown_ranking_builds"
+
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True
+    )
+    start_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    end_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(32), primary_key=True)
+    coverage: Mapped[str] = mapped_column(Text, nullable=False)
+    pageviews: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class DailySegmentIndex(Base):
+    """Per-day segment index of a site's events (see ``app.segments.DayIndex``).
+
+    Events are numbered by (timestamp, id) within the day; ``data`` holds the
+    compressed per-value bitmaps of the low-cardinality fields. ``events`` is the
+    day's event count when it was built: an index no longer matching it is ignored.
+    """
+
+    __tablename__ = "daily_segment_index"
+    __table_args__ = (
+        UniqueConstraint("site_id", "date", name="uq_daily_segment_index"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    site_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    events: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+UTM_SEPARATOR = "\x1f"
@@ -0,0 +1,21 @@
+"""Calendar periods shared by the ingest path (visitor-hash windows) and the rollups.
+
+Weeks are ISO weeks, starting on Monday.
+"""
+
+from calendar import monthrange
+from datetime import date, timedelta
+
+
+def period_bounds(granularity: str, day: date) -> tuple[date, date]:
+    """First and last day (inclusive) of the period of ``granularity`` containing ``day``."""
+    if granularity == "day":
+        return day, day
+    if granularity == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if granularity == "month":
+        return day.replace(day=1), day.replace(day=monthrange(day.year, day.month)[1])
+    if granularity == "year":
+        return date(day.year, 1, 1), date(day.year, 12, 31)
+    raise ValueError(f"Unknown granularity: {granularity!r}")
@@ -0,0 +1,403 @@
+"""In-memory realtime counters fed by the ingest path.
+
+Each site has a ring buffer of one-minute buckets covering the last
+``REALTIME_WINDOW_MINUTES``. A bucket holds the minute's pageviews, a HyperLogLog sketch
+of its visitor hashes and a Space-Saving sketch of its paths, so "the last N minutes"
+is answered by merging at most N buckets without touching the database.
+
+A bucket keeps its visitor registers in a small dict until they outgrow the 2 KiB dense
+sketch, so the many quiet sites of an instance cost a few hundred bytes per minute. Sites
+with no activity inside the window are dropped as soon as a new minute starts.
+
+The ingest path records into the counters of its own process. ``app.cluster`` hands the
+buckets that changed to the other processes and brings theirs back as peer buckets, which
+summaries merge with the local ones (sketches of the same minute merge losslessly).
+
+Each process claims its own snapshot file (``REALTIME_SNAPSHOT_PATH``, then ``.1``,
+``.2``, ...), reads it back on startup and writes it on shutdown, dropping minutes that
+have left the window. Snapshots hold local buckets only.
+"""
+
+import base64
+import itertools
+import json
+import logging
+import os
+import time
+
+from app.config import settings
+from app.hll import HyperLogLog, register
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_VERSION = 1
+
+# A dict entry costs roughly 100 bytes, so past this many registers the dense sketch
+# is the smaller of the two.
+_SPARSE_LIMIT = 16
+
+
+def _current_minute() -> int:
+    return int(time.time() // 60)
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters sketch (Metwally et al.) with ``capacity`` counters.
+
+    Counts are overestimates by at most the stored ``error``; any item with a true
+    count above ``total / capacity`` is guaranteed to be tracked.
+    """
+
+    __slots__ = ("capacity", "counters")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # item -> [count, error]
+        self.counters: dict[str, list[int]] = {}
+
+    def offer(self, item: str, count: int = 1) -> None:
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        # Replace the smallest counter; the newcomer inherits its count as error
+        victim = min(self.counters, key=lambda key: self.counters[key][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[item] = [floor + count, floor]
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Fold ``other`` in (counts and errors add) and keep the top ``capacity``."""
+        for item, (count, error) in other.counters.items():
+            counter = self.counters.setdefault(item, [0, 0])
+            counter[0] += count
+            counter[1] += error
+        if len(self.counters) > self.capacity:
+            kept = sorted(self.counters.items(), key=lambda kv: -kv[1][0])[: self.capacity]
+            self.counters = dict(kept)
+        return self
+
+    def top(self, n: int) -> list[tuple[str, int]]:
+        ranked = sorted(self.counters.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(item, count) for item, (count, _) in ranked[:n]]
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        sketch = cls(data["capacity"])
+        sketch.counters = {item: list(counter) for item, counter in data["counters"].items()}
+        return sketch
+
+
+class MinuteBucket:
+    __slots__ = ("minute", "pageviews", "visitors", "paths")
+
+    def __init__(self, minute: int, capacity: int):
+        self.minute = minute
+        self.pageviews = 0
+        # Sparse registers (index -> rank) until _SPARSE_LIMIT, then a dense sketch
+        self.visitors: dict[int, int] | HyperLogLog = {}
+        self.paths = SpaceSaving(capacity)
+
+    def add_visitor(self, visitor_hash: str) -> None:
+        if isinstance(self.visitors, HyperLogLog):
+            self.visitors.add(visitor_hash)
+            return
+        index, rank = register(visitor_hash)
+        if rank > self.visitors.get(index, 0):
+            self.visitors[index] = rank
+            if len(self.visitors) > _SPARSE_LIMIT:
+                self.visitors = self.sketch()
+
+    def merge_visitors(self, sketch: HyperLogLog) -> None:
+        """Fold this minute's visitors into ``sketch``."""
+        if isinstance(self.visitors, HyperLogLog):
+            sketch.merge(self.visitors)
+            return
+        registers = sketch.registers
+        for index, rank in self.visitors.items():
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def sketch(self) -> HyperLogLog:
+        """This minute's visitors as a dense sketch."""
+        sketch = HyperLogLog()
+        self.merge_visitors(sketch)
+        return sketch
+
+    def set_visitors(self, sketch: HyperLogLog) -> None:
+        """Adopt ``sketch``, going back to sparse registers if it has few of them."""
+        entries = {i: r for i, r in enumerate(sketch.registers) if r}
+        self.visitors = entries if len(entries) <= _SPARSE_LIMIT else sketch
+
+
+class SiteCounters:
+    """Ring buffer of minute buckets for one site."""
+
+    def __init__(self, window_minutes: int, capacity: int):
+        self.window_minutes = window_minutes
+        self.capacity = capacity
+        self.buckets: list[MinuteBucket | None] = [None] * window_minutes
+        self.last_minute: int | None = None
+
+    def bucket(self, minute: int) -> MinuteBucket:
+        """The bucket for ``minute``, replacing whatever expired minute held its slot."""
+        slot = minute % self.window_minutes
+        bucket = self.buckets[slot]
+        if bucket is None or bucket.minute != minute:
+            bucket = self.buckets[slot] = MinuteBucket(minute, self.capacity)
+        if self.last_minute is None or minute > self.last_minute:
+            self.last_minute = minute
+        return bucket
+
+    def record(self, minute: int, visitor_hash: str, path: str) -> None:
+        bucket = self.bucket(minute)
+        bucket.pageviews += 1
+        bucket.add_visitor(visitor_hash)
+        bucket.paths.offer(path)
+
+    def recent(self, minute: int, minutes: int) -> list[MinuteBucket]:
+        """Live buckets among the last ``minutes`` minutes, oldest first."""
+        oldest = minute - min(minutes, self.window_minutes) + 1
+        live = [b for b in self.buckets if b is not None and oldest <= b.minute <= minute]
+        return sorted(live, key=lambda b: b.minute)
+
+    def is_idle(self, minute: int) -> bool:
+        return self.last_minute is None or self.last_minute <= minute - self.window_minutes
+
+
+class RealtimeStore:
+    """Per-site realtime counters for this process."""
+
+    def __init__(self, window_minutes: int | None = None, top_capacity: int | None = None):
+        self.window_minutes = window_minutes or settings.realtime_window_minutes
+        self.top_capacity = top_capacity or settings.realtime_top_paths
+        self.sites: dict[str, SiteCounters] = {}
+        # Other processes' buckets: site -> (holder, minute) -> bucket
+        self.peers: dict[str, dict[tuple[str, int], MinuteBucket]] = {}
+        # Local (site, minute) buckets changed since ``changed`` was last called
+        self._dirty: set[tuple[str, int]] = set()
+        self._pruned_minute = 0
+        # Snapshot file claimed by this process, and the open lock file holding it
+        self._slot: str | None = None
+        self._slot_lock = None
+
+    def record(self, site_id: str, visitor_hash: str, path: str, minute: int | None = None):
+        minute = _current_minute() if minute is None else minute
+        if minute > self._pruned_minute:
+            self.prune(minute)
+        counters = self.sites.get(site_id)
+        if counters is None:
+            counters = self.sites[site_id] = SiteCounters(self.window_minutes, self.top_capacity)
+        counters.record(minute, visitor_hash, path)
+        self._dirty.add((site_id, minute))
+
+    def summary(
+        self, site_id: str, minutes: int = 30, top: int = 10, minute: int | None = None
+    ) -> dict:
+        """Pageviews, approximate visitors, top paths and a per-minute series."""
+        minute = _current_minute() if minute is None else minute
+        minutes = max(1, min(minutes, self.window_minutes))
+        counters = self.sites.get(site_id)
+        buckets = counters.recent(minute, minutes) if counters is not None else []
+        oldest = minute - minutes + 1
+        buckets += [
+            b for b in self.peers.get(site_id, {}).values() if oldest <= b.minute <= minute
+        ]
+
+        visitors = HyperLogLog()
+        paths = SpaceSaving(self.top_capacity)
+        by_minute: dict[int, int] = {}
+        for bucket in buckets:
+            bucket.merge_visitors(visitors)
+            paths.merge(bucket.paths)
+            by_minute[bucket.minute] = by_minute.get(bucket.minute, 0) + bucket.pageviews
+        return {
+            "minutes": minutes,
+            "pageviews": sum(by_minute.values()),
+            "visitors": visitors.cardinality(),
+            "top_paths": [{"path": p, "pageviews": c} for p, c in paths.top(top)],
+            "per_minute": [
+                {"minute": m * 60, "pageviews": by_minute.get(m, 0)}
+                for m in range(minute - minutes + 1, minute + 1)
+            ],
+        }
+
+    def prune(self, minute: int | None = None) -> None:
+        """Forget sites without activity inside the window, and expired peer buckets."""
+        minute = _current_minute() if minute is None else minute
+        self._pruned_minute = max(self._pruned_minute, minute)
+        expired = minute - self.window_minutes
+        for site_id in [s for s, c in self.sites.items() if c.is_idle(minute)]:
+            del self.sites[site_id]
+        self._dirty = {(s, m) for s, m in self._dirty if m > expired}
+        for site_id, buckets in list(self.peers.items()):
+            for key in [k for k, b in buckets.items() if b.minute <= expired]:
+                del buckets[key]
+            if not buckets:
+                del self.peers[site_id]
+
+    # --- Sharing between processes (see app.cluster) ---
+
+    def changed(self) -> list[tuple[str, MinuteBucket]]:
+        """Local buckets changed since the last call, as ``(site_id, bucket)``."""
+        dirty, self._dirty = self._dirty, set()
+        changed = []
+        for site_id, minute in sorted(dirty):
+            counters = self.sites.get(site_id)
+            bucket = counters.buckets[minute % self.window_minutes] if counters else None
+            if bucket is not None and bucket.minute == minute:
+                changed.append((site_id, bucket))
+        return changed
+
+    def merge_peer(
+        self,
+        holder_id: str,
+        site_id: str,
+        minute: int,
+        pageviews: int,
+        visitors: HyperLogLog,
+        paths: SpaceSaving,
+    ) -> int:
+        """Adopt another process's latest copy of a bucket.
+
+        Returns how many pageviews it added since the copy it replaces.
+        """
+        if minute <= _current_minute() - self.window_minutes:
+            return 0
+        buckets = self.peers.setdefault(site_id, {})
+        previous = buckets.get((holder_id, minute))
+        bucket = MinuteBucket(minute, self.top_capacity)
+        bucket.pageviews = pageviews
+        bucket.set_visitors(visitors)
+        bucket.paths = paths
+        buckets[(holder_id, minute)] = bucket
+        return pageviews - (previous.pageviews if previous is not None else 0)
+
+    def forget_peers(self, live_holders: set[str]) -> None:
+        """Drop the buckets of processes that withdrew theirs (shut down cleanly)."""
+        for site_id, buckets in list(self.peers.items()):
+            for key in [k for k in buckets if k[0] not in live_holders]:
+                del buckets[key]
+            if not buckets:
+                del self.peers[site_id]
+
+    # --- Snapshots ---
+
+    def _claim_slot(self) -> str:
+        """The snapshot file of this process: the first of ``path``, ``path.1``, ...
+        whose lock no other live process holds.
+
+        Every worker restores and later overwrites a file of its own, so workers
+        neither clobber each other's counters nor restore the same minutes twice.
+        """
+        if self._slot is not None:
+            return self._slot
+        base = settings.realtime_snapshot_path
+        self._slot = base
+        if fcntl is None:
+            return base
+        for index in itertools.count():
+            candidate = base if index == 0 else f"{base}.{index}"
+            try:
+                lock = open(f"{candidate}.lock", "a")
+            except OSError:
+                logger.warning("Could not lock realtime snapshot %s", candidate, exc_info=True)
+                return base
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                continue
+            self._slot, self._slot_lock = candidate, lock
+            return candidate
+
+    def release_slot(self) -> None:
+        """Give up the snapshot file claimed by ``restore``/``snapshot``."""
+        if self._slot_lock is not None:
+            self._slot_lock.close()
+        self._slot = self._slot_lock = None
+
+    def snapshot(self, path: str | None = None) -> int:
+        """Write live buckets to ``path`` (atomically). Returns the number of sites saved.
+
+        Without ``path`` the process's own snapshot file is written and then released.
+        """
+        if path is None:
+            try:
+                return self.snapshot(self._claim_slot())
+            finally:
+                self.release_slot()
+        minute = _current_minute()
+        self.prune(minute)
+        data = {
+            "version": _SNAPSHOT_VERSION,
+            "sites": {
+                site_id: [
+                    {
+                        "minute": b.minute,
+                        "pageviews": b.pageviews,
+                        "visitors": base64.b64encode(b.sketch().to_bytes()).decode("ascii"),
+                        "paths": b.paths.to_dict(),
+                    }
+                    for b in counters.recent(minute, self.window_minutes)
+                ]
+                for site_id, counters in self.sites.items()
+            },
+        }
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Could not write realtime snapshot %s", path, exc_info=True)
+            return 0
+        return len(data["sites"])
+
+    def restore(self, path: str | None = None) -> int:
+        """Load a snapshot written by ``snapshot``. Returns the number of sites restored.
+
+        Without ``path`` this claims the process's own snapshot file and loads that.
+        """
+        path = path or self._claim_slot()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable realtime snapshot %s", path, exc_info=True)
+            return 0
+        if data.get("version") != _SNAPSHOT_VERSION:
+            return 0
+
+        oldest = _current_minute() - self.window_minutes + 1
+        restored = 0
+        for site_id, buckets in data["sites"].items():
+            live = [b for b in buckets if b["minute"] >= oldest]
+            if not live:
+                continue
+            counters = self.sites.setdefault(
+                site_id, SiteCounters(self.window_minutes, self.top_capacity)
+            )
+            for b in live:
+                bucket = counters.bucket(b["minute"])
+                bucket.pageviews = b["pageviews"]
+                bucket.set_visitors(HyperLogLog.from_bytes(base64.b64decode(b["visitors"])))
+                bucket.paths = SpaceSaving.from_dict(b["paths"])
+                self._dirty.add((site_id, b["minute"]))
+            restored += 1
+        return restored
+
+
+realtime = RealtimeStore()
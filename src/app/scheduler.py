@@ -1,42 +1,203 @@
-"""Background scheduler for nightly aggregation jobs."""
+"""Background scheduler for nightly aggregation jobs.
 
+Every process runs a scheduler, but jobs wrapped in ``leader_only`` execute only in
+the process currently holding the leader lease (see ``app.leader``). The cluster sync
+job runs in every process (see ``app.cluster``).
+"""
+
+import functools
 import logging
+from datetime import date, datetime, timedelta, timezone
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cluster import cluster
+from app.config import settings
 from app.database import async_session
+from app.leader import LeaderElection, create_leader_election
 from app.services.aggregation import AggregationService
+from app.services.analytics import AnalyticsService
+from app.services.importer import ImportService
+from app.services.planner import QueryPlanner
+from app.services.rollup import RollupService
+from app.worker import TimeBudget, run_isolated, shutdown_worker
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
+leader: LeaderElection = create_leader_election()
+
+
+def leader_only(job):
+    """Skip a scheduled job unless this process is the scheduler leader."""
+
+    @functools.wraps(job)
+    async def wrapper(*args, **kwargs):
+        if not leader.is_leader:
+            logger.debug("Skipping %s: not the scheduler leader", job.__name__)
+            return None
+        return await job(*args, **kwargs)
+
+    return wrapper
+
+
+async def leader_heartbeat():
+    """Acquire or renew the leader lease."""
+    await leader.heartbeat()
+
+
+async def cluster_sync():
+    """Exchange cache invalidations and realtime buckets with the other processes."""
+    await cluster.sync()
+
+
+async def _aggregate_yesterday_job(db: AsyncSession) -> dict:
+    # Runs on the worker thread; the budget counts its active wall time, not CPU time
+    stats = await AggregationService.aggregate_yesterday(db, budget=TimeBudget.from_settings())
+    # Roll up any week/month/year that yesterday completed
+    yesterday = date.today() - timedelta(days=1)
+    stats["rollups"] = (await RollupService.cascade(db, yesterday, yesterday))["rows"]
+    await QueryPlanner.purge_rankings(db)
+    stats["warmed"] = await AnalyticsService.warm_public_dashboards(db)
+    return stats
+
+
+async def _aggregate_last_hour_job(db: AsyncSession) -> dict:
+    stats = await AggregationService.aggregate_last_hour(db)
+    stats["warmed"] = await AnalyticsService.warm_public_dashboards(db)
+    return stats
 
 
+@leader_only
 async def nightly_aggregation():
-    """Nightly job: aggregate yesterday's raw events into daily summary tables."""
+    """Nightly job: aggregate yesterday's raw events into daily summary tables.
+
+    Any week, month or year that ended yesterday is then rolled up from the daily rows,
+    and the default periods of public dashboards are recomputed into the cache.
+
+    The work runs on the isolated worker thread with its own engine, keeping the
+    web event loop free to serve ingestion and dashboards.
+    """
     logger.info("Starting nightly aggregation job...")
     try:
-        async with async_session() as db:
-            stats = await AggregationService.aggregate_yesterday(db)
+        stats = await run_isolated(_aggregate_yesterday_job)
+        logger.info(
+            "Nightly aggregation complete: %d sites (%d deferred), %d page stats, "
+            "%d referrer stats, %d browser stats, %d device stats, "
+            "%d country stats, %d utm stats, %d rollup rows, %d dashboards warmed",
+            stats["sites_processed"],
+            stats["sites_deferred"],
+            stats["pages"],
+            stats["referrers"],
+            stats["browsers"],
+            stats["devices"],
+            stats["countries"],
+            stats["utms"],
+            stats["rollups"],
+            stats["warmed"],
+        )
+    except Exception:
+        logger.exception("Error during nightly aggregation")
+
+
+@leader_only
+async def hourly_aggregation():
+    """Hourly job: roll up the previous hour's raw events into the hourly tables.
+
+    Recent hours an earlier run missed are rolled up as well.
+
+    Public dashboards are then warmed again, since the rollup marked today stale.
+    """
+    try:
+        stats = await run_isolated(_aggregate_last_hour_job)
+        logger.info(
+            "Hourly aggregation complete: %d hours rolled up, %d sites, %d hour rows, "
+            "%d hourly page rows, %d dashboards warmed",
+            stats["hours_rolled_up"],
+            stats["sites_processed"],
+            stats["hours"],
+            stats["hourly_pages"],
+            stats["warmed"],
+        )
+    except Exception:
+        logger.exception("Error during hourly aggregation")
+
+
+async def _catch_up_job(db: AsyncSession) -> dict:
+    return await AggregationService.catch_up(db, budget=TimeBudget.from_settings())
+
+
+@leader_only
+async def aggregation_catch_up():
+    """Hourly job: aggregate site-days a budget-limited run deferred.
+
+    Sites left over when the nightly run spends its budget have raw events but no
+    daily rows; they are aggregated here, oldest day first, within a fresh budget.
+    """
+    try:
+        stats = await run_isolated(_catch_up_job)
+        if stats["site_days"]:
             logger.info(
-                "Nightly aggregation complete: %d sites, %d page stats, "
-                "%d referrer stats, %d browser stats, %d device stats, "
-                "%d country stats, %d utm stats",
-                stats["sites_processed"],
-                stats["pages"],
-                stats["referrers"],
-                stats["browsers"],
-                stats["devices"],
-                stats["countries"],
-                stats["utms"],
+                "Aggregation catch-up: %d site-days aggregated, %d remaining, "
+                "%d rollup rows",
+                stats["site_days"],
+                stats["remaining"],
+                stats["rollups"],
             )
     except Exception:
-        logger.exception("Error during nightly aggregation")
+        logger.exception("Error during aggregation catch-up")
+
+
+@leader_only
+async def run_imports():
+    """Every minute: give queued bulk imports a slice of the worker thread.
+
+    Imports commit their progress with every batch, so one cut off by the slice (or by
+    a restart) continues from there on the next run.
+    """
+    async with async_session() as db:
+        if not await ImportService.pending(db):
+            return
+    try:
+        stats = await run_isolated(ImportService.run_pending, settings.import_slice_seconds)
+        logger.info(
+            "Import slice complete: %d jobs run, %d finished, %d failed",
+            stats["jobs"], stats["done"], stats["failed"],
+        )
+    except Exception:
+        logger.exception("Error while running imports")
 
 
 def start_scheduler():
-    """Start the background scheduler with nightly aggregation at 00:15 UTC."""
+    """Start the background scheduler.
+
+    Hourly rollups run at :05, catch-up of deferred site-days at :35, nightly
+    aggregation at 00:15 UTC and queued imports every minute. Every process also
+    syncs with the others every ``CLUSTER_SYNC_SECONDS``.
+    """
+    scheduler.add_job(
+        leader_heartbeat,
+        IntervalTrigger(seconds=settings.scheduler_heartbeat_seconds),
+        id="leader_heartbeat",
+        name="Scheduler leader heartbeat",
+        next_run_time=datetime.now(timezone.utc),
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True,
+    )
+    if settings.cluster_sync_seconds > 0:
+        scheduler.add_job(
+            cluster_sync,
+            IntervalTrigger(seconds=settings.cluster_sync_seconds),
+            id="cluster_sync",
+            name="Cluster sync of cache invalidations and realtime counters",
+            coalesce=True,
+            max_instances=1,
+            replace_existing=True,
+        )
     scheduler.add_job(
         nightly_aggregation,
         CronTrigger(hour=0, minute=15, timezone="UTC"),
@@ -44,12 +205,41 @@ def start_scheduler():
         name="Nightly event aggregation",
         replace_existing=True,
     )
+    scheduler.add_job(
+        hourly_aggregation,
+        CronTrigger(minute=5, timezone="UTC"),
+        id="hourly_aggregation",
+        name="Hourly event aggregation",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        aggregation_catch_up,
+        CronTrigger(minute=35, timezone="UTC"),
+        id="aggregation_catch_up",
+        name="Catch-up of deferred aggregation",
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        run_imports,
+        IntervalTrigger(minutes=1),
+        id="run_imports",
+        name="Queued bulk imports",
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True,
+    )
     scheduler.start()
-    logger.info("Background scheduler started — nightly aggregation at 00:15 UTC")
+    logger.info(
+        "Background scheduler started — hourly rollups at :05, nightly aggregation at 00:15 UTC"
+    )
 
 
-def stop_scheduler():
-    """Gracefully stop the scheduler."""
+async def stop_scheduler():
+    """Gracefully stop the scheduler and hand the leader lease to another process."""
     if scheduler.running:
         scheduler.shutdown(wait=False)
         logger.info("Background scheduler stopped")
+    shutdown_worker()
+    await leader.release()
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Literal
 
 from pydantic import BaseModel, Field
 
@@ -12,6 +13,7 @@ class SiteUpdate(BaseModel):
     name: str | None = Field(None, min_length=1, max_length=255)
     domain: str | None = Field(None, min_length=1, max_length=255)
     public: bool | None = None
+    identity_window: Literal["day", "week", "month"] | None = None
 
 
 class SiteResponse(BaseModel):
@@ -19,6 +21,7 @@ class SiteResponse(BaseModel):
     name: str
     domain: str
     public: bool
+    identity_window: str
     created_at: datetime
     updated_at: datetime
 
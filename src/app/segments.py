@@ -0,0 +1,241 @@
+"""Segment filters and the per-day bitmap index that serves them.
+
+A filter is a disjunction of conjunctions over event fields, written as
+``country_code==DE;device_type==mobile,referrer_domain==google.com``: ``;`` joins
+conditions that must all hold, ``,`` separates alternatives, ``|`` lists accepted
+values of one field and ``!=`` negates a condition. Every dashboard section can be
+computed for the events matching it.
+
+Aggregated days are filtered through a ``DayIndex`` built by the nightly job. It numbers
+the day's events by (timestamp, id) and keeps, for each low-cardinality field
+(``BITMAP_FIELDS``), one bitmap per value: a Python int with bit *i* set for event *i*.
+Conditions on those fields are a handful of integer ORs and ANDs; the resulting
+positions are handed to SQL as a mask, and the conditions on the other fields (path,
+referrer, UTM) are evaluated there, on the rows the mask lets through.
+"""
+
+import base64
+import json
+import zlib
+from collections.abc import Iterable, Iterator
+
+from sqlalchemy import LargeBinary, and_, func, literal, not_, or_, true
+
+from app.models.event import PageviewEvent
+
+# Fields a filter may use
+FILTER_FIELDS = (
+    "path",
+    "referrer_domain",
+    "country_code",
+    "browser",
+    "os",
+    "device_type",
+    "utm_source",
+    "utm_medium",
+    "utm_campaign",
+    "utm_term",
+    "utm_content",
+)
+# Fields indexed with one bitmap per value; the rest are matched in SQL
+BITMAP_FIELDS = ("country_code", "browser", "os", "device_type")
+
+_VERSION = 2
+
+
+class Condition:
+    """``field`` is (or with ``negate``, is not) one of ``values``."""
+
+    __slots__ = ("field", "values", "negate")
+
+    def __init__(self, field: str, values: frozenset[str], negate: bool = False):
+        self.field = field
+        self.values = values
+        self.negate = negate
+
+    def __repr__(self) -> str:
+        op = "!=" if self.negate else "=="
+        return f"{self.field}{op}{'|'.join(sorted(self.values))}"
+
+    def where(self, source=PageviewEvent):
+        """SQL condition on the rows of ``source``; NULL never equals a value."""
+        column = getattr(source, self.field)
+        matches = column.in_(sorted(self.values))
+        if self.negate:
+            matches = or_(not_(matches), column.is_(None))
+        return matches
+
+
+class SegmentFilter:
+    """A parsed filter: ``groups`` are alternatives, each a list of ``Condition``s."""
+
+    def __init__(self, groups: list[list[Condition]]):
+        self.groups = groups
+
+    @classmethod
+    def parse(cls, text: str) -> "SegmentFilter":
+        """Parse the query-string syntax described in the module docstring.
+
+        Raises ``ValueError`` for unknown fields or malformed conditions.
+        """
+        groups = []
+        for group_text in text.split(","):
+            group = []
+            for condition_text in group_text.split(";"):
+                condition_text = condition_text.strip()
+                if not condition_text:
+                    continue
+                negate = "!=" in condition_text
+                field, sep, values = condition_text.partition("!=" if negate else "==")
+                field = field.strip()
+                if not sep or field not in FILTER_FIELDS:
+                    raise ValueError(f"Invalid filter condition: {condition_text!r}")
+                accepted = frozenset(v.strip() for v in values.split("|") if v.strip())
+                if not accepted:
+                    raise ValueError(f"Filter condition without values: {condition_text!r}")
+                group.append(Condition(field, accepted, negate))
+            if group:
+                groups.append(group)
+        if not groups:
+            raise ValueError("Empty filter")
+        return cls(groups)
+
+    def __str__(self) -> str:
+        return ",".join(";".join(repr(c) for c in group) for group in self.groups)
+
+    def where(self, source=PageviewEvent):
+        """SQL condition selecting the matching rows of ``source``."""
+        return or_(
+            *(and_(*(condition.where(source) for condition in group)) for group in self.groups)
+        )
+
+
+# --- Bitmaps ---
+
+
+def bitmap_positions(bits: int) -> Iterator[int]:
+    """Positions of the set bits, ascending."""
+    text = format(bits, "b")[::-1]
+    position = text.find("1")
+    while position != -1:
+        yield position
+        position = text.find("1", position + 1)
+
+
+def bitmap_from_positions(positions: Iterable[int]) -> int:
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def encode_bitmap(bits: int) -> str:
+    raw = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return base64.b64encode(raw).decode("ascii")
+
+
+def decode_bitmap(text: str) -> int:
+    return int.from_bytes(base64.b64decode(text), "little")
+
+
+# --- Per-day index ---
+
+
+class DayIndex:
+    """Per-value bitmaps of ``BITMAP_FIELDS`` over the events of one site-day."""
+
+    def __init__(self, size: int, bitmaps: dict[str, dict[str, int]]):
+        self.size = size
+        # field -> value -> bitmap of the positions holding it (NULLs are not indexed)
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def build(cls, rows: Iterable) -> "DayIndex":
+        """Index rows (ordered, with the ``BITMAP_FIELDS`` attributes) by their position."""
+        positions: dict[str, dict[str, list[int]]] = {field: {} for field in BITMAP_FIELDS}
+        size = 0
+        for size, row in enumerate(rows, start=1):
+            for field in BITMAP_FIELDS:
+                value = getattr(row, field)
+                if value is not None:
+                    positions[field].setdefault(value, []).append(size - 1)
+        bitmaps = {
+            field: {value: bitmap_from_positions(members) for value, members in values.items()}
+            for field, values in positions.items()
+        }
+        return cls(size, bitmaps)
+
+    def to_bytes(self) -> bytes:
+        data = {
+            "version": _VERSION,
+            "size": self.size,
+            "bitmaps": {
+                field: {value: encode_bitmap(bits) for value, bits in bitmaps.items()}
+                for field, bitmaps in self.bitmaps.items()
+            },
+        }
+        return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "DayIndex":
+        data = json.loads(zlib.decompress(blob))
+        if data.get("version") != _VERSION:
+            raise ValueError(f"Unsupported segment index version: {data.get('version')}")
+        bitmaps = {
+            field: {value: decode_bitmap(bits) for value, bits in field_bitmaps.items()}
+            for field, field_bitmaps in data["bitmaps"].items()
+        }
+        return cls(data["size"], bitmaps)
+
+    def _condition_bitmap(self, condition: Condition) -> int:
+        bitmaps = self.bitmaps[condition.field]
+        bits = 0
+        for value in condition.values:
+            bits |= bitmaps.get(value, 0)
+        if condition.negate:
+            bits ^= (1 << self.size) - 1
+        return bits
+
+    def match(self, conditions: Iterable[Condition]) -> int:
+        """Bitmap of the events meeting all of ``conditions`` (on ``BITMAP_FIELDS``)."""
+        bits = (1 << self.size) - 1
+        for condition in conditions:
+            bits &= self._condition_bitmap(condition)
+            if not bits:
+                break
+        return bits
+
+    def _mask(self, bits: int, position):
+        """SQL condition: the event at ``position`` is set in ``bits``."""
+        if bits == (1 << self.size) - 1:
+            return true()
+        # One byte per event: substr() on a blob is a constant-time slice
+        mask = format(bits, f"0{self.size}b")[::-1].encode("ascii")
+        return func.substr(literal(mask, LargeBinary), position + 1, 1) == literal(
+            b"1", LargeBinary
+        )
+
+    def where(self, segment: SegmentFilter, source, position):
+        """SQL condition selecting the day's rows of ``source`` that match ``segment``.
+
+        ``position`` numbers the rows like ``build`` did. Each group's bitmap
+        conditions become a mask over positions and its other conditions stay in SQL.
+        Returns None when no event of the day can match.
+        """
+        clauses = []
+        masked = 0  # groups settled by bitmaps alone share one mask
+        for group in segment.groups:
+            bits = self.match(c for c in group if c.field in BITMAP_FIELDS)
+            if not bits:
+                continue
+            rest = [c.where(source) for c in group if c.field not in BITMAP_FIELDS]
+            if rest:
+                clauses.append(and_(self._mask(bits, position), *rest))
+            else:
+                masked |= bits
+        if masked:
+            clauses.append(self._mask(masked, position))
+        return or_(*clauses) if clauses else None
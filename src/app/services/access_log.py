@@ -0,0 +1,269 @@
+"""Pageviews from web server access logs, for sites that cannot run the tracking script.
+
+Lines in the nginx/Apache common or combined format are matched by one precompiled
+regex. Only successful (2xx or 304) GETs of pages count: requests for assets (by
+extension), errors, redirects and bots are dropped. Visitor hashes, browser/OS/device
+and referrer domains come from the same ``EventService`` helpers as the beacon, and
+countries from the GeoIP table when one is configured. A log repeats the same few
+user agents, referrers, visitors and timestamps over and over, so each helper is
+memoized in a bounded cache, and timestamps are sliced rather than parsed with
+``strptime``. Pageviews are bulk-inserted ``IMPORT_BATCH_ROWS`` at a time.
+
+The common format has no referrer or user agent, so its visitors are told apart by IP
+alone. ``follow`` tails a live log, reopening it after rotation.
+"""
+
+import asyncio
+import gzip
+import os
+import re
+import uuid
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.geoip import geoip
+from app.models.event import PageviewEvent
+from app.models.site import Site
+from app.services.event import EventService
+
+LINE = re.compile(
+    r'(?P<ip>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<target>\S+)[^"]*" (?P<status>\d{3}) \S+'
+    r'(?: "(?P<referrer>(?:[^"\\]|\\.)*)" "(?P<user_agent>(?:[^"\\]|\\.)*)")?'
+)
+ASSET_EXTENSIONS = frozenset(
+    {
+        "avif", "bmp", "css", "eot", "gif", "ico", "jpeg", "jpg", "js", "json", "map",
+        "mjs", "mp3", "mp4", "ogg", "otf", "png", "svg", "ttf", "txt", "wasm", "webm",
+        "webmanifest", "webp", "woff", "woff2", "xml", "zip",
+    }
+)
+BOT_MARKERS = ("bot", "crawl", "spider", "slurp", "curl/", "wget/", "python-", "headless")
+_MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+_UTM_FIELDS = ("utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content")
+# Entries per enrichment cache; a full cache is emptied and refilled
+_CACHE_SIZE = 50_000
+_MISSING = object()
+
+
+def parse_log_time(text: str) -> datetime:
+    """``10/Oct/2024:13:55:36 -0700`` as naive UTC."""
+    moment = datetime(
+        int(text[7:11]), _MONTHS[text[3:6]], int(text[0:2]),
+        int(text[12:14]), int(text[15:17]), int(text[18:20]),
+    )
+    offset = timedelta(hours=int(text[22:24]), minutes=int(text[24:26]))
+    return moment - offset if text[21] == "+" else moment + offset
+
+
+def _remember(cache: dict, key, value):
+    if len(cache) >= _CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
+    return value
+
+
+class LogIngester:
+    """Turns one site's access-log lines into pageview rows and inserts them in batches.
+
+    ``counts`` tracks lines read, pageviews kept, lines skipped by the filters and
+    lines that did not parse. ``first_date`` and ``last_date`` span the pageviews.
+    """
+
+    def __init__(self, site: Site):
+        self.site = site
+        self.batch: list[dict] = []
+        self.counts = {"lines": 0, "pageviews": 0, "skipped": 0, "malformed": 0}
+        self.first_date: date | None = None
+        self.last_date: date | None = None
+        self._times: dict[str, datetime] = {}
+        self._agents: dict[str, dict | None] = {}
+        self._referrers: dict[str, str | None] = {}
+        self._visitors: dict[tuple, str] = {}
+
+    def _agent(self, user_agent: str) -> dict | None:
+        """Parsed user agent, or None for a bot."""
+        lowered = user_agent.lower()
+        if any(marker in lowered for marker in BOT_MARKERS):
+            return None
+        return EventService.parse_user_agent(user_agent)
+
+    def parse(self, line: str) -> dict | None:
+        """The pageview row for a line, or None if it is filtered out or malformed."""
+        match = LINE.match(line)
+        if match is None:
+            self.counts["malformed"] += 1
+            return None
+        ip, time_text, method, target, status, referrer, user_agent = match.groups()
+        code = int(status)
+        if method != "GET" or not (200 <= code < 300 or code == 304):
+            self.counts["skipped"] += 1
+            return None
+        if target.startswith(("http://", "https://")):
+            parts = urlsplit(target)
+            target = parts.path + (f"?{parts.query}" if parts.query else "")
+        path, _, query = target.partition("?")
+        _, dot, extension = path.rpartition("/")[2].rpartition(".")
+        if dot and extension.lower() in ASSET_EXTENSIONS:
+            self.counts["skipped"] += 1
+            return None
+        user_agent = user_agent if user_agent not in (None, "-") else ""
+        agent = self._agents.get(user_agent, _MISSING)
+        if agent is _MISSING:
+            agent = _remember(self._agents, user_agent, self._agent(user_agent))
+        if agent is None:
+            self.counts["skipped"] += 1
+            return None
+        timestamp = self._times.get(time_text)
+        if timestamp is None:
+            try:
+                timestamp = _remember(self._times, time_text, parse_log_time(time_text))
+            except (KeyError, ValueError, IndexError):
+                self.counts["malformed"] += 1
+                return None
+
+        day = timestamp.date()
+        visitor = (ip, user_agent, day)
+        visitor_hash = self._visitors.get(visitor)
+        if visitor_hash is None:
+            visitor_hash = _remember(
+                self._visitors,
+                visitor,
+                EventService.compute_visitor_hash(
+                    self.site.id, ip, user_agent, self.site.identity_window, day
+                ),
+            )
+        referrer = referrer if referrer not in (None, "-", "") else None
+        referrer_domain = None
+        if referrer:
+            referrer_domain = self._referrers.get(referrer, _MISSING)
+            if referrer_domain is _MISSING:
+                referrer_domain = _remember(
+                    self._referrers, referrer, EventService.extract_referrer_domain(referrer)
+                )
+            # Self-referrals are internal navigation, as with the beacon
+            if referrer_domain == self.site.domain:
+                referrer, referrer_domain = None, None
+        utm = dict.fromkeys(_UTM_FIELDS)
+        if "utm_" in query:
+            for field, values in parse_qs(query).items():
+                if field in utm:
+                    utm[field] = values[0][:255] or None
+
+        if self.first_date is None or day < self.first_date:
+            self.first_date = day
+        if self.last_date is None or day > self.last_date:
+            self.last_date = day
+        return {
+            "id": str(uuid.uuid4()),
+            "site_id": self.site.id,
+            "visitor_hash": visitor_hash,
+            "url": f"https://{self.site.domain}{target}"[:2048],
+            "path": path[:2048] or "/",
+            "referrer": referrer[:2048] if referrer else None,
+            "referrer_domain": referrer_domain,
+            "browser": agent["browser"],
+            "os": agent["os"],
+            "device_type": agent["device_type"],
+            "screen_width": None,
+            "country_code": geoip.country(ip),
+            **utm,
+            "timestamp": timestamp,
+        }
+
+    def feed(self, line: str) -> bool:
+        """Queue a line's pageview, if any; True once a batch is ready to flush."""
+        self.counts["lines"] += 1
+        row = self.parse(line)
+        if row is not None:
+            self.batch.append(row)
+        return len(self.batch) >= settings.import_batch_rows
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Insert the queued pageviews in one multi-row insert and commit."""
+        rows, self.batch = self.batch, []
+        if rows:
+            await db.execute(insert(PageviewEvent.__table__), rows)
+            await db.commit()
+            self.counts["pageviews"] += len(rows)
+        return len(rows)
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+async def load(db: AsyncSession, ingester: LogIngester, path: str) -> None:
+    """Ingest a whole log file (plain or gzipped)."""
+    with _open(path) as log:
+        for line in log:
+            if ingester.feed(line):
+                await ingester.flush(db)
+                await asyncio.sleep(0)
+    await ingester.flush(db)
+
+
+async def follow(
+    db: AsyncSession,
+    ingester: LogIngester,
+    path: str,
+    poll_seconds: float = 1.0,
+    from_start: bool = False,
+    stop: asyncio.Event | None = None,
+) -> None:
+    """Tail a live log until ``stop`` is set, flushing whenever it catches up.
+
+    Starts at the end of the file unless ``from_start``. A rotated (replaced) or
+    truncated file is reopened from its beginning. A partial last line is kept until
+    its newline arrives.
+    """
+    log = _open(path)
+    if not from_start:
+        log.seek(0, os.SEEK_END)
+    partial = ""
+    try:
+        while stop is None or not stop.is_set():
+            line = log.readline()
+            if line:
+                if not line.endswith("\n"):
+                    partial += line
+                    continue
+                if ingester.feed(partial + line):
+                    await ingester.flush(db)
+                partial = ""
+                continue
+            await ingester.flush(db)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(log.fileno())
+            if current is not None and (
+                current.st_ino != opened.st_ino or current.st_size < log.tell()
+            ):
+                log.close()
+                log = _open(path)
+                partial = ""
+                continue
+            if stop is None:
+                await asyncio.sleep(poll_seconds)
+            else:
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_seconds)
+                except TimeoutError:
+                    pass
+    finally:
+        log.close()
+        await ingester.flush(db)
@@ -1,31 +1,94 @@
 """Background aggregation service — rolls up raw PageviewEvents into daily summary tables."""
 
 import logging
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta, timezone
+from types import SimpleNamespace
 
-from sqlalchemy import delete, func, select
+from sqlalchemy import and_, delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import response_cache
+from app.config import settings
+from app.database import as_datetime, hour_bucket
+from app.dimensions import DIMENSIONS
+from app.hll import HyperLogLog
 from app.models.event import PageviewEvent
+from app.models.site import Site
 from app.models.stats import (
-    DailyBrowserStats,
-    DailyCountryStats,
-    DailyDeviceStats,
-    DailyPageStats,
-    DailyReferrerStats,
-    DailyUTMStats,
+    DailySiteStats,
+    HourlyPageStats,
+    HourlySiteStats,
+    RolledUpHour,
 )
+from app.services.leaderboard import LeaderboardService
+from app.services.planner import QueryPlanner
+from app.services.rollup import RollupService
+from app.services.segments import SegmentService
+from app.worker import TimeBudget
 
 logger = logging.getLogger(__name__)
 
+# Stats key reported for each dimension's daily rows; other registry dimensions are
+# counted together under "breakdowns".
+_STAT_KEYS = {
+    "path": "pages",
+    "referrer_domain": "referrers",
+    "browser": "browsers",
+    "device_type": "devices",
+    "country_code": "countries",
+    "utm": "utms",
+}
+
+
+def _current_hour() -> datetime:
+    """Start of the current UTC hour, naive like stored timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def _fold_visitors(rows, keys: list[str]) -> list[SimpleNamespace]:
+    """Collapse (key..., visitor_hash, pageviews) rows into one row per key.
+
+    Each folded row has the key attributes plus ``pageviews``, exact ``unique_visitors``
+    for the day and a serialized HyperLogLog sketch in ``visitors_hll``.
+    """
+    folded: dict[tuple, list] = {}
+    for row in rows:
+        key = tuple(getattr(row, k) for k in keys)
+        entry = folded.get(key)
+        if entry is None:
+            entry = folded[key] = [0, 0, HyperLogLog()]
+        entry[0] += row.pageviews
+        entry[1] += 1
+        entry[2].add(row.visitor_hash)
+    return [
+        SimpleNamespace(
+            **dict(zip(keys, key)),
+            pageviews=pageviews,
+            unique_visitors=visitors,
+            visitors_hll=sketch.to_bytes(),
+        )
+        for key, (pageviews, visitors, sketch) in folded.items()
+    ]
+
 
 class AggregationService:
     """Aggregates raw pageview events into daily summary tables for fast queries."""
 
     @staticmethod
-    async def aggregate_day(db: AsyncSession, target_date: date) -> dict:
+    async def aggregate_day(
+        db: AsyncSession,
+        target_date: date,
+        budget: TimeBudget | None = None,
+        refresh_leaderboards: bool = True,
+    ) -> dict:
         """Aggregate all events for a specific date into daily stats tables.
 
+        Each site is committed on its own so the SQLite write lock is only held briefly.
+        When a ``budget`` is given, the job yields between queries and stops once the
+        budget is spent; sites left over are reported as ``sites_deferred`` and picked
+        up later by ``catch_up``. If the day falls inside the rolling 30-day window,
+        the leaderboards of the sites aggregated (and of quiet sites) are rebuilt.
+
         Returns a dict with counts of rows inserted per table.
         """
         stats = {
@@ -35,31 +98,67 @@ class AggregationService:
             "devices": 0,
             "countries": 0,
             "utms": 0,
+            "breakdowns": 0,
+            "segment_events": 0,
+            "hours": 0,
+            "hourly_pages": 0,
+            "leaderboards": 0,
             "sites_processed": 0,
+            "sites_deferred": 0,
         }
 
         # Find all sites that have events on target_date
         site_ids_result = await db.execute(
-            select(PageviewEvent.site_id.distinct()).where(
+            select(PageviewEvent.site_id).distinct().where(
                 func.date(PageviewEvent.timestamp) == target_date.isoformat()
             )
         )
         site_ids = [row[0] for row in site_ids_result.all()]
+        quiet_ids = await AggregationService._mark_quiet_sites(db, target_date, site_ids)
 
-        for site_id in site_ids:
-            counts = await AggregationService._aggregate_site_day(db, site_id, target_date)
+        for index, site_id in enumerate(site_ids):
+            counts = await AggregationService._aggregate_site_day(
+                db, site_id, target_date, budget
+            )
+            indexed = await SegmentService.build_day(db, site_id, target_date)
+            day_start = datetime.combine(target_date, time())
+            hourly = await AggregationService._aggregate_site_hours(
+                db, site_id, day_start, day_start + timedelta(days=1)
+            )
+            await db.commit()
+            response_cache.invalidate(site_id, target_date)
             stats["pages"] += counts["pages"]
             stats["referrers"] += counts["referrers"]
             stats["browsers"] += counts["browsers"]
             stats["devices"] += counts["devices"]
             stats["countries"] += counts["countries"]
             stats["utms"] += counts["utms"]
+            stats["breakdowns"] += counts["breakdowns"]
+            stats["segment_events"] += indexed
+            stats["hours"] += hourly["hours"]
+            stats["hourly_pages"] += hourly["hourly_pages"]
             stats["sites_processed"] += 1
+            if budget is not None and not await budget.checkpoint():
+                stats["sites_deferred"] = len(site_ids) - index - 1
+                if stats["sites_deferred"]:
+                    logger.warning(
+                        "Aggregation time budget spent after %.1fs; deferring %d sites for %s",
+                        budget.used,
+                        stats["sites_deferred"],
+                        target_date.isoformat(),
+                    )
+                break
 
         await db.commit()
+        if not stats["sites_deferred"]:
+            day_start = datetime.combine(target_date, time())
+            await AggregationService._mark_hours(db, day_start, day_start + timedelta(days=1))
+        if refresh_leaderboards and LeaderboardService.covers(target_date):
+            refreshed = site_ids[: stats["sites_processed"]] + quiet_ids
+            stats["leaderboards"] = await LeaderboardService.refresh_sites(db, refreshed)
         logger.info(
             "Aggregated %d sites for %s: %d pages, %d referrers, %d browsers, "
-            "%d devices, %d countries, %d utms",
+            "%d devices, %d countries, %d utms, %d other breakdowns",
             stats["sites_processed"],
             target_date.isoformat(),
             stats["pages"],
@@ -68,189 +167,373 @@ class AggregationService:
             stats["devices"],
             stats["countries"],
             stats["utms"],
+            stats["breakdowns"],
         )
         return stats
 
     @staticmethod
-    async def _aggregate_site_day(db: AsyncSession, site_id: str, target_date: date) -> dict:
-        """Aggregate events for a single site on a single day."""
+    async def _mark_quiet_sites(
+        db: AsyncSession, target_date: date, active: list[str]
+    ) -> list[str]:
+        """Record an empty day for sites without events, so the day counts as aggregated.
+
+        Query planning treats a day with a ``DailySiteStats`` row as served by the
+        summary tables; without these rows quiet days would fall back to raw events.
+        Sites that already have a row for the day (imported daily stats, or an earlier
+        marker) keep it, so a backfill never wipes totals the other daily tables agree
+        with.
+        """
+        quiet = select(Site.id).where(Site.id.notin_(active)) if active else select(Site.id)
+        quiet_ids = list((await db.execute(quiet)).scalars().all())
+        if not quiet_ids:
+            return quiet_ids
+        marked = set(
+            (
+                await db.execute(
+                    select(DailySiteStats.site_id).where(
+                        DailySiteStats.site_id.in_(quiet_ids), DailySiteStats.date == target_date
+                    )
+                )
+            ).scalars().all()
+        )
+        unmarked = [site_id for site_id in quiet_ids if site_id not in marked]
+        if unmarked:
+            empty_sketch = HyperLogLog().to_bytes()
+            db.add_all(
+                DailySiteStats(
+                    site_id=site_id,
+                    date=target_date,
+                    pageviews=0,
+                    unique_visitors=0,
+                    visitors_hll=empty_sketch,
+                )
+                for site_id in unmarked
+            )
+            await db.commit()
+            for site_id in unmarked:
+                response_cache.invalidate(site_id, target_date)
+        return quiet_ids
+
+    @staticmethod
+    async def _aggregate_site_day(
+        db: AsyncSession, site_id: str, target_date: date, budget: TimeBudget | None = None
+    ) -> dict:
+        """Aggregate events for a single site on a single day.
+
+        All grouped reads run before any write, so the site's write transaction only
+        spans the delete and insert of its summary rows.
+        """
         date_filter = func.date(PageviewEvent.timestamp) == target_date.isoformat()
         site_filter = PageviewEvent.site_id == site_id
 
-        # Clear existing aggregates for this site+date (idempotent)
-        for model in [
-            DailyPageStats,
-            DailyReferrerStats,
-            DailyBrowserStats,
-            DailyDeviceStats,
-            DailyCountryStats,
-            DailyUTMStats,
-        ]:
-            await db.execute(
-                delete(model).where(model.site_id == site_id, model.date == target_date)
+        async def fetch(*columns, where=()):
+            # One row per (key, visitor); pageviews, uniques and the visitor sketch
+            # are folded from these in Python.
+            result = await db.execute(
+                select(*columns, PageviewEvent.visitor_hash, func.count().label("pageviews"))
+                .where(site_filter, date_filter, *where)
+                .group_by(*columns, PageviewEvent.visitor_hash)
             )
+            rows = _fold_visitors(result.all(), [c.key for c in columns])
+            if budget is not None:
+                await budget.checkpoint()
+            return rows
 
-        counts = {}
+        # Read phase
+        totals = await fetch()
+        bounces, _ = await QueryPlanner.raw_bounces(db, site_filter, date_filter)
+        breakdowns = {}
+        for dimension in DIMENSIONS.values():
+            key = dimension.raw_key().label("value")
+            breakdowns[dimension] = await fetch(key, where=dimension.raw_filters())
 
-        # Pages
-        result = await db.execute(
-            select(
-                PageviewEvent.path,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
+        # Write phase: clear existing aggregates for this site+date (idempotent)
+        tables = [DailySiteStats] + list({d.daily_table: None for d in DIMENSIONS.values()})
+        for model in tables:
+            await db.execute(
+                delete(model).where(model.site_id == site_id, model.date == target_date)
             )
-            .where(site_filter, date_filter)
-            .group_by(PageviewEvent.path)
-        )
-        rows = result.all()
-        for row in rows:
+
+        if totals:
             db.add(
-                DailyPageStats(
+                DailySiteStats(
                     site_id=site_id,
                     date=target_date,
-                    path=row.path,
+                    pageviews=totals[0].pageviews,
+                    unique_visitors=totals[0].unique_visitors,
+                    bounces=bounces,
+                    visitors_hll=totals[0].visitors_hll,
+                )
+            )
+        counts = dict.fromkeys([*_STAT_KEYS.values(), "breakdowns"], 0)
+        for dimension, rows in breakdowns.items():
+            db.add_all(
+                dimension.daily_row(
+                    site_id,
+                    target_date,
+                    row.value,
                     pageviews=row.pageviews,
                     unique_visitors=row.unique_visitors,
+                    visitors_hll=row.visitors_hll,
                 )
+                for row in rows
             )
-        counts["pages"] = len(rows)
+            counts[_STAT_KEYS.get(dimension.name, "breakdowns")] += len(rows)
 
-        # Referrers
-        result = await db.execute(
-            select(
-                PageviewEvent.referrer_domain,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            )
-            .where(
-                site_filter,
-                date_filter,
-                PageviewEvent.referrer_domain.isnot(None),
-                PageviewEvent.referrer_domain != "",
+        await db.flush()
+        return counts
+
+    @staticmethod
+    async def aggregate_hours(db: AsyncSession, start: datetime, end: datetime) -> dict:
+        """Roll up events in ``[start, end)`` into the hourly tables.
+
+        ``start`` and ``end`` must fall on hour boundaries. Idempotent, like ``aggregate_day``.
+        """
+        stats = {"hours": 0, "hourly_pages": 0, "sites_processed": 0}
+        site_ids_result = await db.execute(
+            select(PageviewEvent.site_id).distinct().where(
+                PageviewEvent.timestamp >= start, PageviewEvent.timestamp < end
             )
-            .group_by(PageviewEvent.referrer_domain)
         )
-        rows = result.all()
-        for row in rows:
-            db.add(
-                DailyReferrerStats(
-                    site_id=site_id,
-                    date=target_date,
-                    referrer_domain=row.referrer_domain,
-                    pageviews=row.pageviews,
-                    unique_visitors=row.unique_visitors,
+        for site_id in site_ids_result.scalars().all():
+            counts = await AggregationService._aggregate_site_hours(db, site_id, start, end)
+            await db.commit()
+            response_cache.invalidate(site_id, start.date())
+            stats["hours"] += counts["hours"]
+            stats["hourly_pages"] += counts["hourly_pages"]
+            stats["sites_processed"] += 1
+        await AggregationService._mark_hours(db, start, end)
+        return stats
+
+    @staticmethod
+    async def _mark_hours(db: AsyncSession, start: datetime, end: datetime) -> None:
+        """Record the finished hours of ``[start, end)`` as rolled up for every site."""
+        end = min(end, _current_hour())
+        marked = set(
+            (
+                await db.execute(
+                    select(RolledUpHour.hour).where(
+                        RolledUpHour.hour >= start, RolledUpHour.hour < end
+                    )
                 )
+            ).scalars().all()
+        )
+        hour = start
+        while hour < end:
+            if hour not in marked:
+                db.add(RolledUpHour(hour=hour))
+            hour += timedelta(hours=1)
+        await db.commit()
+
+    @staticmethod
+    async def _aggregate_site_hours(
+        db: AsyncSession, site_id: str, start: datetime, end: datetime
+    ) -> dict:
+        """Aggregate one site's events into per-hour site and page rows."""
+        bucket = hour_bucket(db, PageviewEvent.timestamp).label("hour")
+        filters = (
+            PageviewEvent.site_id == site_id,
+            PageviewEvent.timestamp >= start,
+            PageviewEvent.timestamp < end,
+        )
+        visitors = func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors")
+
+        site_rows = (
+            await db.execute(
+                select(bucket, func.count().label("pageviews"), visitors)
+                .where(*filters)
+                .group_by(bucket)
+            )
+        ).all()
+        page_rows = (
+            await db.execute(
+                select(bucket, PageviewEvent.path, func.count().label("pageviews"), visitors)
+                .where(*filters)
+                .group_by(bucket, PageviewEvent.path)
             )
-        counts["referrers"] = len(rows)
+        ).all()
 
-        # Browsers
-        result = await db.execute(
-            select(
-                PageviewEvent.browser,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
+        for model in [HourlySiteStats, HourlyPageStats]:
+            await db.execute(
+                delete(model).where(
+                    model.site_id == site_id, model.hour >= start, model.hour < end
+                )
+            )
+        db.add_all(
+            HourlySiteStats(
+                site_id=site_id,
+                hour=as_datetime(row.hour),
+                pageviews=row.pageviews,
+                unique_visitors=row.unique_visitors,
             )
-            .where(site_filter, date_filter, PageviewEvent.browser.isnot(None))
-            .group_by(PageviewEvent.browser)
+            for row in site_rows
         )
-        rows = result.all()
-        for row in rows:
-            db.add(
-                DailyBrowserStats(
-                    site_id=site_id,
-                    date=target_date,
-                    browser=row.browser,
-                    pageviews=row.pageviews,
-                    unique_visitors=row.unique_visitors,
-                )
+        db.add_all(
+            HourlyPageStats(
+                site_id=site_id,
+                hour=as_datetime(row.hour),
+                path=row.path,
+                pageviews=row.pageviews,
+                unique_visitors=row.unique_visitors,
             )
-        counts["browsers"] = len(rows)
+            for row in page_rows
+        )
+        await db.flush()
+        return {"hours": len(site_rows), "hourly_pages": len(page_rows)}
 
-        # Devices
-        result = await db.execute(
-            select(
-                PageviewEvent.device_type,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            )
-            .where(site_filter, date_filter, PageviewEvent.device_type.isnot(None))
-            .group_by(PageviewEvent.device_type)
+    @staticmethod
+    async def aggregate_last_hour(db: AsyncSession) -> dict:
+        """Roll up the most recent complete hour (typical hourly job).
+
+        Earlier hours of the last ``AGGREGATION_CATCH_UP_DAYS`` days that no run marked
+        as rolled up (a restart, failover or misfire skipped them) are caught up too.
+        """
+        end = _current_hour()
+        start = end - timedelta(days=settings.aggregation_catch_up_days)
+        marked = set(
+            (
+                await db.execute(
+                    select(RolledUpHour.hour).where(
+                        RolledUpHour.hour >= start, RolledUpHour.hour < end
+                    )
+                )
+            ).scalars().all()
         )
-        rows = result.all()
-        for row in rows:
-            db.add(
-                DailyDeviceStats(
-                    site_id=site_id,
-                    date=target_date,
-                    device_type=row.device_type,
-                    pageviews=row.pageviews,
-                    unique_visitors=row.unique_visitors,
+        stats = {"hours": 0, "hourly_pages": 0, "sites_processed": 0, "hours_rolled_up": 0}
+        hour = start
+        while hour < end:
+            if hour not in marked:
+                counts = await AggregationService.aggregate_hours(
+                    db, hour, hour + timedelta(hours=1)
                 )
-            )
-        counts["devices"] = len(rows)
+                for key in ("hours", "hourly_pages", "sites_processed"):
+                    stats[key] += counts[key]
+                stats["hours_rolled_up"] += 1
+            hour += timedelta(hours=1)
+        return stats
+
+    @staticmethod
+    async def aggregate_yesterday(db: AsyncSession, budget: TimeBudget | None = None) -> dict:
+        """Convenience method to aggregate yesterday's data (typical nightly job)."""
+        yesterday = date.today() - timedelta(days=1)
+        return await AggregationService.aggregate_day(db, yesterday, budget)
+
+    @staticmethod
+    async def aggregate_site(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date
+    ) -> dict:
+        """Aggregate one site's days with events in a range, then its rollups.
 
-        # Countries
+        Unlike ``backfill`` this leaves other sites' summary rows alone, and days
+        without events keep whatever rows they have (imported daily stats, say).
+        Today's daily rows are left to the nightly job, but its finished hours are
+        rolled up again, so events added for them show in the hourly chart.
+        """
+        today = date.today()
+        end_date = min(end_date, today)
         result = await db.execute(
-            select(
-                PageviewEvent.country_code,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
+            select(func.date(PageviewEvent.timestamp)).distinct().where(
+                PageviewEvent.site_id == site_id,
+                func.date(PageviewEvent.timestamp).between(
+                    start_date.isoformat(), end_date.isoformat()
+                ),
             )
-            .where(site_filter, date_filter, PageviewEvent.country_code.isnot(None))
-            .group_by(PageviewEvent.country_code)
         )
-        rows = result.all()
-        for row in rows:
-            db.add(
-                DailyCountryStats(
-                    site_id=site_id,
-                    date=target_date,
-                    country_code=row.country_code,
-                    pageviews=row.pageviews,
-                    unique_visitors=row.unique_visitors,
-                )
+        days = sorted(date.fromisoformat(str(day)) for day in result.scalars().all())
+        if today in days:
+            days.remove(today)
+            today_start = datetime.combine(today, time())
+            await AggregationService._aggregate_site_hours(
+                db, site_id, today_start, _current_hour()
             )
-        counts["countries"] = len(rows)
+            await db.commit()
+            response_cache.invalidate(site_id, today)
+        for day in days:
+            await AggregationService._rebuild_site_day(db, site_id, day)
+        stats = {"days_processed": len(days), "rollups": 0, "leaderboards": 0}
+        if days:
+            stats["rollups"] = (await RollupService.cascade(db, days[0], days[-1]))["rows"]
+            if any(LeaderboardService.covers(day) for day in days):
+                stats["leaderboards"] = await LeaderboardService.refresh_site(db, site_id)
+        return stats
 
-        # UTMs
-        result = await db.execute(
+    @staticmethod
+    async def _rebuild_site_day(
+        db: AsyncSession, site_id: str, day: date, budget: TimeBudget | None = None
+    ) -> None:
+        """Aggregate one site-day into the daily, segment and hourly tables and commit."""
+        await AggregationService._aggregate_site_day(db, site_id, day, budget)
+        await SegmentService.build_day(db, site_id, day)
+        day_start = datetime.combine(day, time())
+        await AggregationService._aggregate_site_hours(
+            db, site_id, day_start, day_start + timedelta(days=1)
+        )
+        await db.commit()
+        response_cache.invalidate(site_id, day)
+
+    @staticmethod
+    async def pending_site_days(
+        db: AsyncSession, start_date: date, end_date: date
+    ) -> list[tuple[str, date]]:
+        """Site-days in a range with raw events but no ``DailySiteStats`` row.
+
+        These are the sites an aggregation run deferred once its budget was spent (or
+        days it never reached), oldest first.
+        """
+        start = datetime.combine(start_date, time())
+        end = datetime.combine(end_date + timedelta(days=1), time())
+        active = (
             select(
-                PageviewEvent.utm_source,
-                PageviewEvent.utm_medium,
-                PageviewEvent.utm_campaign,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            )
-            .where(site_filter, date_filter, PageviewEvent.utm_source.isnot(None))
-            .group_by(
-                PageviewEvent.utm_source,
-                PageviewEvent.utm_medium,
-                PageviewEvent.utm_campaign,
+                PageviewEvent.site_id.label("site_id"),
+                func.date(PageviewEvent.timestamp).label("day"),
             )
+            .where(PageviewEvent.timestamp >= start, PageviewEvent.timestamp < end)
+            .distinct()
+            .subquery()
         )
-        rows = result.all()
-        for row in rows:
-            db.add(
-                DailyUTMStats(
-                    site_id=site_id,
-                    date=target_date,
-                    utm_source=row.utm_source or "",
-                    utm_medium=row.utm_medium or "",
-                    utm_campaign=row.utm_campaign or "",
-                    pageviews=row.pageviews,
-                    unique_visitors=row.unique_visitors,
-                )
+        result = await db.execute(
+            select(active.c.site_id, active.c.day)
+            .outerjoin(
+                DailySiteStats,
+                and_(
+                    DailySiteStats.site_id == active.c.site_id,
+                    DailySiteStats.date == active.c.day,
+                ),
             )
-        counts["utms"] = len(rows)
-
-        await db.flush()
-        return counts
+            .where(DailySiteStats.site_id.is_(None))
+            .order_by(active.c.day, active.c.site_id)
+        )
+        return [(site_id, date.fromisoformat(str(day))) for site_id, day in result.all()]
 
     @staticmethod
-    async def aggregate_yesterday(db: AsyncSession) -> dict:
-        """Convenience method to aggregate yesterday's data (typical nightly job)."""
+    async def catch_up(db: AsyncSession, budget: TimeBudget | None = None) -> dict:
+        """Aggregate deferred site-days from the last ``AGGREGATION_CATCH_UP_DAYS`` days.
+
+        Stops once the budget is spent; what is left is picked up by the next run.
+        Rollups and leaderboards are rebuilt for the site-days aggregated.
+        """
         yesterday = date.today() - timedelta(days=1)
-        return await AggregationService.aggregate_day(db, yesterday)
+        since = yesterday - timedelta(days=settings.aggregation_catch_up_days - 1)
+        pending = await AggregationService.pending_site_days(db, since, yesterday)
+        done: list[tuple[str, date]] = []
+        for site_id, day in pending:
+            await AggregationService._rebuild_site_day(db, site_id, day, budget)
+            done.append((site_id, day))
+            if budget is not None and not await budget.checkpoint():
+                break
+        stats = {
+            "site_days": len(done),
+            "remaining": len(pending) - len(done),
+            "rollups": 0,
+            "leaderboards": 0,
+        }
+        if done:
+            days = sorted({day for _, day in done})
+            stats["rollups"] = (await RollupService.cascade(db, days[0], days[-1]))["rows"]
+            refreshed = sorted({site_id for site_id, day in done if LeaderboardService.covers(day)})
+            if refreshed:
+                stats["leaderboards"] = await LeaderboardService.refresh_sites(db, refreshed)
+        return stats
 
     @staticmethod
     async def backfill(db: AsyncSession, start_date: date, end_date: date) -> dict:
@@ -262,18 +545,34 @@ class AggregationService:
             "devices": 0,
             "countries": 0,
             "utms": 0,
+            "breakdowns": 0,
+            "hours": 0,
+            "hourly_pages": 0,
             "sites_processed": 0,
             "days_processed": 0,
         }
+
         current = start_date
         while current <= end_date:
-            stats = await AggregationService.aggregate_day(db, current)
+            stats = await AggregationService.aggregate_day(
+                db, current, refresh_leaderboards=False
+            )
             agg_keys = [
                 "pages", "referrers", "browsers", "devices",
-                "countries", "utms", "sites_processed",
+                "countries", "utms", "breakdowns", "hours", "hourly_pages", "sites_processed",
             ]
             for key in agg_keys:
                 total[key] += stats[key]
             total["days_processed"] += 1
             current += timedelta(days=1)
+        rollups = await RollupService.cascade(db, start_date, end_date)
+        total["rollups"] = rollups["rows"]
+        # Rebuilt once for the whole range rather than after every day
+        total["leaderboards"] = 0
+        if any(
+            LeaderboardService.covers(start_date + timedelta(days=offset))
+            for offset in range((end_date - start_date).days + 1)
+        ):
+            site_ids = (await db.execute(select(Site.id))).scalars().all()
+            total["leaderboards"] = await LeaderboardService.refresh_sites(db, list(site_ids))
         return total
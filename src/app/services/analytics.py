@@ -1,13 +1,103 @@
-from datetime import date, timedelta
+import asyncio
+import base64
+import binascii
+import json
+import logging
+from datetime import date, datetime, time, timedelta
 
-from sqlalchemy import func, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.cache import response_cache
+from app.database import as_datetime, hour_bucket
+from app.dimensions import DIMENSIONS
+from app.fanout import gather_sections
+from app.hll import HyperLogLog
 from app.models.event import PageviewEvent
+from app.models.site import Site
+from app.models.stats import DailySiteStats, HourlySiteStats, RolledUpHour
+from app.segments import SegmentFilter
+from app.services.leaderboard import LeaderboardService
+from app.services.planner import QueryPlan, QueryPlanner, _merge_counts, _runs, previous_range
+from app.services.rollup import RollupService, _merge_visitors
+from app.services.segments import SegmentService
+from app.services.site import SiteService
+from app.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Concurrent cache misses for the same dashboard share one computation
+dashboard_flights = SingleFlight()
+# Background stale-while-revalidate refreshes (referenced so they are not collected)
+_revalidations: set[asyncio.Task] = set()
+
+# Delta cursors trail the database clock, so events still being committed with an
+# earlier timestamp are picked up by the next poll instead of being skipped
+CURSOR_LAG = timedelta(seconds=2)
+
+
+def _pack(state) -> str:
+    """Opaque URL-safe token for cursor state."""
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip("=")
+
+
+def _unpack(token: str):
+    padded = token + "=" * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+def _encode_cursor(watermark: datetime, start_date: date, end_date: date, granularity: str):
+    return _pack(
+        {
+            "t": watermark.isoformat(),
+            "s": start_date.isoformat(),
+            "e": end_date.isoformat(),
+            "g": granularity,
+        }
+    )
+
+
+def _decode_cursor(cursor: str) -> dict | None:
+    try:
+        state = _unpack(cursor)
+        return {
+            "watermark": datetime.fromisoformat(state["t"]),
+            "start_date": date.fromisoformat(state["s"]),
+            "end_date": date.fromisoformat(state["e"]),
+            "granularity": state["g"],
+        }
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+
+
+def _with_change(entry: dict, metrics=("pageviews", "unique_visitors")) -> dict:
+    """Add ``delta`` and ``percent`` against ``entry["previous"]`` for each metric.
+
+    ``percent`` is None when the previous value is zero.
+    """
+    previous = entry["previous"]
+    entry["delta"] = {metric: round(entry[metric] - previous[metric], 1) for metric in metrics}
+    entry["percent"] = {
+        metric: round((entry[metric] - previous[metric]) / previous[metric] * 100, 1)
+        if previous[metric]
+        else None
+        for metric in metrics
+    }
+    return entry
+
+
+async def _watermark(db: AsyncSession) -> datetime:
+    """The database clock minus ``CURSOR_LAG``, comparable with event timestamps."""
+    now = as_datetime(await db.scalar(select(func.now())))
+    return now.replace(tzinfo=None) - CURSOR_LAG
 
 
 class AnalyticsService:
-    """Queries analytics data from both raw events (today) and daily aggregates (historical)."""
+    """Queries analytics data from both raw events (today) and daily aggregates (historical).
+
+    Each range is split by ``QueryPlanner``: days already aggregated are read from the
+    daily and rollup tables, the rest from raw events, and the two are merged.
+    """
 
     @staticmethod
     def _date_range(period: str, start: str | None = None, end: str | None = None):
@@ -29,65 +119,31 @@ class AnalyticsService:
         return today - timedelta(days=6), today
 
     @staticmethod
-    async def get_summary(db: AsyncSession, site_id: str, start_date: date, end_date: date) -> dict:
+    async def get_summary(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date,
+        plan: QueryPlan | None = None,
+    ) -> dict:
         """Total pageviews and unique visitors for the period."""
-        result = await db.execute(
-            select(
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            )
-        )
-        row = result.one()
-        return {
-            "pageviews": row.pageviews or 0,
-            "unique_visitors": row.unique_visitors or 0,
-        }
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.totals(db, plan)
 
     @staticmethod
     async def get_bounce_rate(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date
+        db: AsyncSession, site_id: str, start_date: date, end_date: date,
+        plan: QueryPlan | None = None,
     ) -> float:
         """Bounce rate: % of visitors with only 1 pageview in the period."""
-        result = await db.execute(
-            select(
-                PageviewEvent.visitor_hash,
-                func.count().label("pv_count"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(PageviewEvent.visitor_hash)
-        )
-        rows = result.all()
-        if not rows:
-            return 0.0
-        bounces = sum(1 for r in rows if r.pv_count == 1)
-        return round(bounces / len(rows) * 100, 1)
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.bounce_rate(db, plan)
 
     @staticmethod
     async def get_visitors_over_time(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date
+        db: AsyncSession, site_id: str, start_date: date, end_date: date,
+        plan: QueryPlan | None = None,
     ) -> list[dict]:
         """Pageviews and unique visitors per day."""
-        result = await db.execute(
-            select(
-                func.date(PageviewEvent.timestamp).label("day"),
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by("day").order_by("day")
-        )
-        data_map = {
-            str(r.day): {"pageviews": r.pageviews, "unique_visitors": r.unique_visitors}
-            for r in result.all()
-        }
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        data_map = await QueryPlanner.daily_series(db, plan)
 
         # Fill in missing days with zeros
         days = []
@@ -100,200 +156,742 @@ class AnalyticsService:
         return days
 
     @staticmethod
-    async def get_top_pages(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10
+    async def get_visitors_over_time_hourly(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date
     ) -> list[dict]:
+        """Pageviews and unique visitors per hour, read from the hourly rollups.
+
+        Hours that have no rollup row for the site and that no hourly run marked as
+        rolled up (normally just the current hour, or one a skipped run missed) are
+        counted from raw events.
+        """
+        start = datetime.combine(start_date, time())
+        end = datetime.combine(end_date + timedelta(days=1), time())
+
+        marked = set(
+            (
+                await db.execute(
+                    select(RolledUpHour.hour).where(
+                        RolledUpHour.hour >= start, RolledUpHour.hour < end
+                    )
+                )
+            ).scalars().all()
+        )
         result = await db.execute(
             select(
-                PageviewEvent.path,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
+                HourlySiteStats.hour,
+                HourlySiteStats.pageviews,
+                HourlySiteStats.unique_visitors,
             ).where(
-                PageviewEvent.site_id == site_id,
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(PageviewEvent.path)
-            .order_by(func.count().desc())
-            .limit(limit)
+                HourlySiteStats.site_id == site_id,
+                HourlySiteStats.hour >= start,
+                HourlySiteStats.hour < end,
+            )
         )
-        return [
-            {"path": r.path, "pageviews": r.pageviews, "unique_visitors": r.unique_visitors}
+        data_map = {
+            as_datetime(r.hour): {"pageviews": r.pageviews, "unique_visitors": r.unique_visitors}
             for r in result.all()
-        ]
+        }
+
+        # Contiguous runs of hours neither marked nor rolled up for this site
+        spans: list[list[datetime]] = []
+        current = start
+        while current < end:
+            following = current + timedelta(hours=1)
+            if current not in marked and current not in data_map:
+                if spans and spans[-1][1] == current:
+                    spans[-1][1] = following
+                else:
+                    spans.append([current, following])
+            current = following
+        if spans:
+            bucket = hour_bucket(db, PageviewEvent.timestamp).label("hour")
+            result = await db.execute(
+                select(
+                    bucket,
+                    func.count().label("pageviews"),
+                    func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
+                ).where(
+                    PageviewEvent.site_id == site_id,
+                    or_(
+                        *(
+                            and_(PageviewEvent.timestamp >= low, PageviewEvent.timestamp < high)
+                            for low, high in spans
+                        )
+                    ),
+                ).group_by(bucket)
+            )
+            for r in result.all():
+                data_map[as_datetime(r.hour)] = {
+                    "pageviews": r.pageviews, "unique_visitors": r.unique_visitors,
+                }
+
+        # Fill in missing hours with zeros
+        hours = []
+        current = start
+        while current < end:
+            entry = data_map.get(current, {"pageviews": 0, "unique_visitors": 0})
+            hours.append({"date": current.date().isoformat(), "hour": current.isoformat(), **entry})
+            current += timedelta(hours=1)
+        return hours
 
     @staticmethod
-    async def get_top_referrers(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10
+    async def get_breakdowns(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date,
+        dimensions: list[str] | None = None, limit: int = 10,
+        plan: QueryPlan | None = None,
+    ) -> dict[str, list[dict]]:
+        """Top values of several dimensions (default: all registered) in one pass.
+
+        7d and 30d ranges are read from the precomputed leaderboards when they are
+        current.
+        """
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        dimensions = list(dimensions or DIMENSIONS)
+        board = await LeaderboardService.breakdowns(db, plan, dimensions, limit)
+        if board is not None:
+            return board
+        return await QueryPlanner.breakdowns(db, plan, dimensions, limit)
+
+    @staticmethod
+    async def get_compared_visitors_over_time(
+        db: AsyncSession, site_id: str, current: QueryPlan, previous: QueryPlan,
+        granularity: str = "day",
     ) -> list[dict]:
-        result = await db.execute(
-            select(
-                PageviewEvent.referrer_domain,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                PageviewEvent.referrer_domain.isnot(None),
-                PageviewEvent.referrer_domain != "",
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(PageviewEvent.referrer_domain)
-            .order_by(func.count().desc())
-            .limit(limit)
-        )
+        """The current series, each bucket with the aligned bucket of ``previous``.
+
+        Both windows are read as one range, so this costs the same queries as the
+        current window alone.
+        """
+        if granularity == "hour":
+            series = await AnalyticsService.get_visitors_over_time_hourly(
+                db, site_id, previous.start_date, current.end_date
+            )
+        else:
+            series = await AnalyticsService.get_visitors_over_time(
+                db, site_id, previous.start_date, current.end_date,
+                QueryPlan.joined(previous, current),
+            )
+        half = len(series) // 2
         return [
-            {
-                "referrer_domain": r.referrer_domain,
-                "pageviews": r.pageviews,
-                "unique_visitors": r.unique_visitors,
-            }
-            for r in result.all()
+            {**entry, "previous": earlier}
+            for earlier, entry in zip(series[:half], series[half:], strict=True)
         ]
 
+    @staticmethod
+    async def get_breakdown_page(
+        db: AsyncSession, site_id: str, dimension: str, start_date: date, end_date: date,
+        limit: int = 50, after: str | None = None,
+    ) -> dict:
+        """A page of one breakdown beyond the dashboard's top 10.
+
+        ``after`` is the ``next`` token of the previous page; ``next`` is None on the
+        last page. Raises ``ValueError`` for a malformed token.
+        """
+        position = None
+        if after:
+            try:
+                pageviews, value = _unpack(after)
+                position = (int(pageviews), str(value))
+            except (binascii.Error, ValueError, TypeError) as exc:
+                raise ValueError("Invalid pagination token") from exc
+        plan = await QueryPlanner.plan(db, site_id, start_date, end_date)
+        page = await QueryPlanner.breakdown_page(db, plan, dimension, limit + 1, position)
+        more = len(page) > limit
+        page = page[:limit]
+        return {
+            "dimension": dimension,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "rows": [row for _, row in page],
+            "next": _pack([page[-1][1]["pageviews"], page[-1][0]]) if more else None,
+        }
+
+    @staticmethod
+    async def get_top_pages(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10,
+        plan: QueryPlan | None = None,
+    ) -> list[dict]:
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.breakdown(db, plan, "path", limit)
+
+    @staticmethod
+    async def get_top_referrers(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10,
+        plan: QueryPlan | None = None,
+    ) -> list[dict]:
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.breakdown(db, plan, "referrer_domain", limit)
+
     @staticmethod
     async def get_browsers(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10
+        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10,
+        plan: QueryPlan | None = None,
     ) -> list[dict]:
-        result = await db.execute(
-            select(
-                PageviewEvent.browser,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                PageviewEvent.browser.isnot(None),
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(PageviewEvent.browser)
-            .order_by(func.count().desc())
-            .limit(limit)
-        )
-        return [
-            {"browser": r.browser, "pageviews": r.pageviews, "unique_visitors": r.unique_visitors}
-            for r in result.all()
-        ]
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.breakdown(db, plan, "browser", limit)
 
     @staticmethod
     async def get_devices(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10
+        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10,
+        plan: QueryPlan | None = None,
     ) -> list[dict]:
-        result = await db.execute(
-            select(
-                PageviewEvent.device_type,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                PageviewEvent.device_type.isnot(None),
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(PageviewEvent.device_type)
-            .order_by(func.count().desc())
-            .limit(limit)
-        )
-        return [
-            {
-                "device_type": r.device_type,
-                "pageviews": r.pageviews,
-                "unique_visitors": r.unique_visitors,
-            }
-            for r in result.all()
-        ]
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.breakdown(db, plan, "device_type", limit)
 
     @staticmethod
     async def get_countries(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10
+        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10,
+        plan: QueryPlan | None = None,
     ) -> list[dict]:
-        result = await db.execute(
-            select(
-                PageviewEvent.country_code,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                PageviewEvent.country_code.isnot(None),
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(PageviewEvent.country_code)
-            .order_by(func.count().desc())
-            .limit(limit)
-        )
-        return [
-            {
-                "country_code": r.country_code,
-                "pageviews": r.pageviews,
-                "unique_visitors": r.unique_visitors,
-            }
-            for r in result.all()
-        ]
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.breakdown(db, plan, "country_code", limit)
 
     @staticmethod
     async def get_utm_campaigns(
-        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10
+        db: AsyncSession, site_id: str, start_date: date, end_date: date, limit: int = 10,
+        plan: QueryPlan | None = None,
     ) -> list[dict]:
-        result = await db.execute(
-            select(
-                PageviewEvent.utm_source,
-                PageviewEvent.utm_medium,
-                PageviewEvent.utm_campaign,
-                func.count().label("pageviews"),
-                func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
-            ).where(
-                PageviewEvent.site_id == site_id,
-                PageviewEvent.utm_source.isnot(None),
-                func.date(PageviewEvent.timestamp) >= start_date,
-                func.date(PageviewEvent.timestamp) <= end_date,
-            ).group_by(
-                PageviewEvent.utm_source,
-                PageviewEvent.utm_medium,
-                PageviewEvent.utm_campaign,
-            )
-            .order_by(func.count().desc())
-            .limit(limit)
-        )
-        return [
-            {
-                "utm_source": r.utm_source,
-                "utm_medium": r.utm_medium,
-                "utm_campaign": r.utm_campaign or "",
-                "pageviews": r.pageviews,
-                "unique_visitors": r.unique_visitors,
-            }
-            for r in result.all()
-        ]
+        plan = plan or await QueryPlanner.plan(db, site_id, start_date, end_date)
+        return await QueryPlanner.breakdown(db, plan, "utm", limit)
 
     @staticmethod
     async def get_full_dashboard(
         db: AsyncSession, site_id: str, period: str = "7d",
-        start: str | None = None, end: str | None = None,
+        start: str | None = None, end: str | None = None, granularity: str = "day",
+        filters: str | None = None, compare: bool = False,
     ) -> dict:
-        """Get all dashboard data in one call."""
+        """Get all dashboard data in one call.
+
+        ``granularity`` selects daily or hourly buckets for ``visitors_over_time``.
+        Every breakdown widget comes from a single ``get_breakdowns`` section. Sections
+        run concurrently via ``gather_sections``; any that failed or timed out are
+        returned empty and named in ``degraded``. With ``filters`` (see
+        ``app.segments``), every section covers only the matching events.
+
+        With ``compare``, the summary, every chart bucket and every breakdown row also
+        carry the ``previous`` window of the same length, with ``delta`` and
+        ``percent`` changes on the summary and rows. Each section reads both windows
+        in the same queries.
+        """
         start_date, end_date = AnalyticsService._date_range(period, start, end)
+        if filters:
+            return await AnalyticsService.get_segment_dashboard(
+                db, site_id, period, start_date, end_date, granularity,
+                SegmentFilter.parse(filters), compare,
+            )
+        watermark = await _watermark(db)
+        plan = await QueryPlanner.plan(db, site_id, start_date, end_date)
+        previous = None
+        if compare:
+            previous = await QueryPlanner.plan(
+                db, site_id, *previous_range(start_date, end_date)
+            )
+        args = (site_id, start_date, end_date)
 
-        summary = await AnalyticsService.get_summary(db, site_id, start_date, end_date)
-        bounce_rate = await AnalyticsService.get_bounce_rate(db, site_id, start_date, end_date)
-        visitors_over_time = await AnalyticsService.get_visitors_over_time(
-            db, site_id, start_date, end_date
-        )
-        top_pages = await AnalyticsService.get_top_pages(db, site_id, start_date, end_date)
-        top_referrers = await AnalyticsService.get_top_referrers(db, site_id, start_date, end_date)
-        browsers = await AnalyticsService.get_browsers(db, site_id, start_date, end_date)
-        devices = await AnalyticsService.get_devices(db, site_id, start_date, end_date)
-        countries = await AnalyticsService.get_countries(db, site_id, start_date, end_date)
-        utm_campaigns = await AnalyticsService.get_utm_campaigns(db, site_id, start_date, end_date)
+        if previous is not None:
+            async def summary(session):
+                return await QueryPlanner.compared_totals(session, plan, previous)
 
-        return {
+            async def visitors_over_time(session):
+                return await AnalyticsService.get_compared_visitors_over_time(
+                    session, site_id, plan, previous, granularity
+                )
+
+            async def breakdowns(session):
+                return await QueryPlanner.compared_breakdowns(session, plan, previous)
+
+            sections = {
+                "summary": summary,
+                "visitors_over_time": visitors_over_time,
+                "breakdowns": breakdowns,
+            }
+        else:
+            if granularity == "hour":
+                async def visitors_over_time(session):
+                    return await AnalyticsService.get_visitors_over_time_hourly(session, *args)
+            else:
+                async def visitors_over_time(session):
+                    return await AnalyticsService.get_visitors_over_time(session, *args, plan)
+
+            async def breakdowns(session):
+                return await AnalyticsService.get_breakdowns(session, *args, plan=plan)
+
+            sections = {
+                "summary": lambda session: AnalyticsService.get_summary(
+                    session, *args, plan=plan
+                ),
+                "bounce_rate": lambda session: AnalyticsService.get_bounce_rate(
+                    session, *args, plan=plan
+                ),
+                "visitors_over_time": visitors_over_time,
+                "breakdowns": breakdowns,
+            }
+        empty = {"pageviews": 0, "unique_visitors": 0, "bounce_rate": 0.0}
+        defaults = {
+            "summary": (
+                {"current": empty, "previous": empty}
+                if previous is not None
+                else {"pageviews": 0, "unique_visitors": 0}
+            ),
+            "bounce_rate": 0.0,
+            "visitors_over_time": [],
+            "breakdowns": {name: [] for name in DIMENSIONS},
+        }
+        results, errors = await gather_sections(db, sections, defaults)
+        failed = errors.pop("breakdowns", None)
+        if failed:
+            # Report the widgets that came back empty, not the internal section name
+            errors.update({d.section: failed for d in DIMENSIONS.values()})
+
+        if previous is not None:
+            summary = _with_change(
+                {**results["summary"]["current"], "previous": results["summary"]["previous"]},
+                ("pageviews", "unique_visitors", "bounce_rate"),
+            )
+            for rows in results["breakdowns"].values():
+                for row in rows:
+                    _with_change(row)
+        else:
+            summary = {**results["summary"], "bounce_rate": results["bounce_rate"]}
+        data = {
             "period": period,
             "start_date": start_date.isoformat(),
             "end_date": end_date.isoformat(),
-            "summary": {
-                **summary,
-                "bounce_rate": bounce_rate,
+            "granularity": granularity,
+            "summary": summary,
+            "visitors_over_time": results["visitors_over_time"],
+            **{
+                d.section: results["breakdowns"][name] for name, d in DIMENSIONS.items()
             },
-            "visitors_over_time": visitors_over_time,
-            "top_pages": top_pages,
-            "top_referrers": top_referrers,
-            "browsers": browsers,
-            "devices": devices,
-            "countries": countries,
-            "utm_campaigns": utm_campaigns,
+            "sources": plan.describe(),
+            "degraded": errors,
+            "cursor": _encode_cursor(watermark, start_date, end_date, granularity),
+        }
+        if previous is not None:
+            data["compare"] = {
+                "start_date": previous.start_date.isoformat(),
+                "end_date": previous.end_date.isoformat(),
+            }
+            data["sources"]["previous"] = previous.describe()
+        return data
+
+    @staticmethod
+    async def get_segment_dashboard(
+        db: AsyncSession, site_id: str, period: str, start_date: date, end_date: date,
+        granularity: str, segment: SegmentFilter, compare: bool = False,
+    ) -> dict:
+        """The full dashboard restricted to the events matching ``segment``.
+
+        ``compare`` runs the segment pass a second time over the previous window.
+        """
+        data = await SegmentService.dashboard(
+            db, site_id, start_date, end_date, segment, granularity
+        )
+        summary = {**data["summary"], "bounce_rate": data["bounce_rate"]}
+        sections = {d.section: data["breakdowns"][name] for name, d in DIMENSIONS.items()}
+        series = data["visitors_over_time"]
+        response = {}
+        if compare:
+            previous_start, previous_end = previous_range(start_date, end_date)
+            before = await SegmentService.dashboard(
+                db, site_id, previous_start, previous_end, segment, granularity, limit=None
+            )
+            earlier_summary = {**before["summary"], "bounce_rate": before["bounce_rate"]}
+            summary = _with_change(
+                {**summary, "previous": earlier_summary},
+                ("pageviews", "unique_visitors", "bounce_rate"),
+            )
+            series = [
+                {**entry, "previous": earlier}
+                for earlier, entry in zip(before["visitors_over_time"], series, strict=True)
+            ]
+            for name, d in DIMENSIONS.items():
+                earlier = {d.join(row): row for row in before["breakdowns"][name]}
+                for row in sections[d.section]:
+                    counts = earlier.get(d.join(row), {"pageviews": 0, "unique_visitors": 0})
+                    row["previous"] = {
+                        "pageviews": counts["pageviews"],
+                        "unique_visitors": counts["unique_visitors"],
+                    }
+                    _with_change(row)
+            response["compare"] = {
+                "start_date": previous_start.isoformat(), "end_date": previous_end.isoformat()
+            }
+        return {
+            "period": period,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "granularity": granularity,
+            "filters": str(segment),
+            "summary": summary,
+            "visitors_over_time": series,
+            **sections,
+            "sources": data["sources"],
+            "degraded": {},
+            **response,
+        }
+
+    @staticmethod
+    async def get_dashboard_delta(
+        db: AsyncSession, site_id: str, cursor: str | None, period: str = "7d",
+        start: str | None = None, end: str | None = None, granularity: str = "day",
+    ) -> dict:
+        """What changed in a dashboard since ``cursor`` (from an earlier response).
+
+        Only events received after the cursor are inspected: the chart buckets they
+        fall in are recomputed, and so are the breakdown rows for the values they
+        carry, each with its full counts over the range. Clients replace those buckets
+        and rows, then re-sort and trim their lists. Sections without changes are
+        omitted. Without a usable cursor for this range (none, malformed, or the
+        period has rolled over to a new day) the full dashboard is returned with
+        ``"full": true``.
+        """
+        start_date, end_date = AnalyticsService._date_range(period, start, end)
+        state = _decode_cursor(cursor) if cursor else None
+        if state is None or (state["start_date"], state["end_date"], state["granularity"]) != (
+            start_date, end_date, granularity
+        ):
+            data = await AnalyticsService.get_cached_dashboard(
+                db, site_id, period, start, end, granularity
+            )
+            return {**data, "full": True}
+
+        until = await _watermark(db)
+        response = {
+            "period": period,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "granularity": granularity,
+            "full": False,
+            "changed": False,
+            "cursor": _encode_cursor(
+                max(until, state["watermark"]), start_date, end_date, granularity
+            ),
         }
+        if until <= state["watermark"]:
+            return response
+
+        plan = await QueryPlanner.plan(db, site_id, start_date, end_date)
+        dimensions = list(DIMENSIONS)
+        touched = await QueryPlanner.changes(
+            db, plan, state["watermark"], until, dimensions, granularity
+        )
+        if not touched["bucket"]:
+            return response
+
+        summary = await QueryPlanner.totals(db, plan)
+        response["changed"] = True
+        response["summary"] = {**summary, "bounce_rate": await QueryPlanner.bounce_rate(db, plan)}
+
+        if granularity == "hour":
+            hours = {as_datetime(bucket) for bucket in touched["bucket"]}
+            series = await AnalyticsService.get_visitors_over_time_hourly(
+                db, site_id, min(hours).date(), max(hours).date()
+            )
+            response["visitors_over_time"] = [
+                entry for entry in series if datetime.fromisoformat(entry["hour"]) in hours
+            ]
+        else:
+            days = sorted(touched["bucket"])
+            sub_plan = await QueryPlanner.plan(
+                db, site_id, date.fromisoformat(days[0]), date.fromisoformat(days[-1])
+            )
+            series = await QueryPlanner.daily_series(db, sub_plan)
+            response["visitors_over_time"] = [
+                {"date": day, **series.get(day, {"pageviews": 0, "unique_visitors": 0})}
+                for day in days
+            ]
+
+        only = {dimension: touched[dimension] for dimension in dimensions if touched[dimension]}
+        raw = await QueryPlanner.raw_breakdowns(db, plan, list(only), only=only)
+        aggregated = await RollupService.read_breakdowns(
+            db, site_id, list(only), plan.segments, plan.identity_window, 0, include=only
+        )
+        rows = QueryPlanner.merge_breakdowns(
+            plan, list(only), aggregated, raw, max(map(len, only.values()), default=0)
+        )
+        for dimension, changed in rows.items():
+            response[DIMENSIONS[dimension].section] = changed
+        return response
+
+    @staticmethod
+    async def _compute_cached(
+        db: AsyncSession, key: tuple, site_id: str, period: str,
+        start: str | None, end: str | None, granularity: str, filters: str | None = None,
+        compare: bool = False,
+    ) -> dict:
+        """Compute a dashboard once per key across concurrent callers and cache it.
+
+        The shared computation runs on a session of its own: the first caller's
+        request-scoped ``db`` may be committed or closed while others still wait on it.
+        """
+        session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+
+        async def compute():
+            async with session_factory() as session:
+                result = await AnalyticsService.get_full_dashboard(
+                    session, site_id, period, start, end, granularity, filters, compare
+                )
+            if not result["degraded"]:
+                response_cache.set(key, result)
+            return result
+
+        return await dashboard_flights.do(key, compute)
+
+    @staticmethod
+    async def get_cached_dashboard(
+        db: AsyncSession, site_id: str, period: str = "7d",
+        start: str | None = None, end: str | None = None, granularity: str = "day",
+        filters: str | None = None, compare: bool = False,
+    ) -> dict:
+        """``get_full_dashboard`` through the process-wide response cache.
+
+        On a miss, concurrent requests for the same key share one computation (run on
+        a session of its own). Degraded responses are not cached. Returns a
+        shallow copy, so callers can add keys without touching the cached entry.
+        Raises ``ValueError`` for malformed ``filters``.
+        """
+        _, data = await AnalyticsService.get_cached_dashboard_entry(
+            db, site_id, period, start, end, granularity, filters, compare
+        )
+        return dict(data)
+
+    @staticmethod
+    async def get_cached_dashboard_entry(
+        db: AsyncSession, site_id: str, period: str = "7d",
+        start: str | None = None, end: str | None = None, granularity: str = "day",
+        filters: str | None = None, compare: bool = False,
+    ) -> tuple[tuple, dict]:
+        """``(cache key, dashboard)`` as cached, for callers that attach derived values.
+
+        The dashboard is the cached object itself and must not be modified.
+        """
+        start_date, end_date = AnalyticsService._date_range(period, start, end)
+        filters = str(SegmentFilter.parse(filters)) if filters else None
+        key = response_cache.key(
+            site_id, period, start_date, end_date, granularity, filters or "", compare
+        )
+        data = response_cache.get(key)
+        if data is None:
+            data = await AnalyticsService._compute_cached(
+                db, key, site_id, period, start, end, granularity, filters, compare
+            )
+        return key, data
+
+    @staticmethod
+    async def get_public_dashboard(
+        db: AsyncSession, site_id: str, period: str = "7d",
+        start: str | None = None, end: str | None = None, granularity: str = "day",
+    ) -> dict:
+        """Cached dashboard for public pages, served stale-while-revalidate.
+
+        A cached entry past its TTL (or invalidated by aggregation) is returned as is
+        and recomputed in the background on a session of its own; only a cold key
+        is computed inline.
+        """
+        _, data = await AnalyticsService.get_public_dashboard_entry(
+            db, site_id, period, start, end, granularity
+        )
+        return dict(data)
+
+    @staticmethod
+    async def get_public_dashboard_entry(
+        db: AsyncSession, site_id: str, period: str = "7d",
+        start: str | None = None, end: str | None = None, granularity: str = "day",
+    ) -> tuple[tuple, dict]:
+        """``get_public_dashboard`` as ``(cache key, cached dashboard)``."""
+        start_date, end_date = AnalyticsService._date_range(period, start, end)
+        key = response_cache.key(site_id, period, start_date, end_date, granularity)
+        cached = response_cache.get_stale(key)
+        if cached is None:
+            data = await AnalyticsService._compute_cached(
+                db, key, site_id, period, start, end, granularity
+            )
+            return key, data
+
+        data, fresh = cached
+        if not fresh:
+            session_factory = async_sessionmaker(
+                db.bind, class_=AsyncSession, expire_on_commit=False
+            )
+
+            async def revalidate():
+                try:
+                    async with session_factory() as session:
+                        await AnalyticsService._compute_cached(
+                            session, key, site_id, period, start, end, granularity
+                        )
+                except Exception:
+                    logger.exception("Background refresh of dashboard %s failed", site_id)
+
+            task = asyncio.create_task(revalidate())
+            _revalidations.add(task)
+            task.add_done_callback(_revalidations.discard)
+        return key, data
+
+    @staticmethod
+    async def get_sites_overview(db: AsyncSession, user_id: str, days: int = 30) -> dict:
+        """Today, last 7 days and a ``days``-point pageview sparkline for every site of a user.
+
+        All sites are read together whatever their number. Like ``QueryPlanner.plan``,
+        each site's days with a ``DailySiteStats`` row come from the daily summary and
+        its other days (normally just today) from raw events, grouped per site and day
+        in one query; sites sharing the same raw days share one condition.
+        Visitors over 7 days are counted as the dashboard counts them: daily uniques add
+        up for a daily identity window, while weekly and monthly windows merge the daily
+        sketches and the raw days' visitor hashes, which both queries also return for
+        those sites.
+        """
+        today = date.today()
+        start = today - timedelta(days=days - 1)
+        week_start = today - timedelta(days=6)
+        sites = await SiteService.list_sites(db, user_id)
+        counts: dict[str, dict[date, tuple[int, int]]] = {site.id: {} for site in sites}
+        windowed = [site.id for site in sites if site.identity_window != "day"]
+        # Per site: the aggregated days of the week, and the raw days' visitor hashes
+        week_rows: dict[str, list] = {site.id: [] for site in sites}
+        week_hashes: dict[str, set[str]] = {site_id: set() for site_id in windowed}
+
+        result = await db.execute(
+            select(
+                DailySiteStats.site_id,
+                DailySiteStats.date,
+                DailySiteStats.pageviews,
+                DailySiteStats.unique_visitors,
+                case(
+                    (
+                        and_(
+                            DailySiteStats.site_id.in_(windowed),
+                            DailySiteStats.date >= week_start,
+                        ),
+                        DailySiteStats.visitors_hll,
+                    ),
+                ).label("visitors_hll"),
+            ).where(
+                DailySiteStats.site_id.in_(list(counts)),
+                DailySiteStats.date >= start,
+                DailySiteStats.date <= today,
+            )
+        )
+        for r in result.all():
+            counts[r.site_id][r.date] = (r.pageviews, r.unique_visitors)
+            if r.date >= week_start:
+                week_rows[r.site_id].append(r)
+
+        all_days = [start + timedelta(days=n) for n in range(days)]
+        by_runs: dict[tuple, list[str]] = {}
+        for site_id, per_day in counts.items():
+            runs = tuple(_runs([day for day in all_days if day not in per_day]))
+            if runs:
+                by_runs.setdefault(runs, []).append(site_id)
+        if by_runs:
+            conditions = []
+            for runs, site_ids in by_runs.items():
+                spans = (
+                    and_(
+                        PageviewEvent.timestamp >= datetime.combine(run_start, time()),
+                        PageviewEvent.timestamp
+                        < datetime.combine(run_end + timedelta(days=1), time()),
+                    )
+                    for run_start, run_end in runs
+                )
+                conditions.append(and_(PageviewEvent.site_id.in_(site_ids), or_(*spans)))
+            day = func.date(PageviewEvent.timestamp)
+            # One group per visitor on the week's raw days of windowed sites
+            visitor = case(
+                (
+                    and_(
+                        PageviewEvent.site_id.in_(windowed),
+                        PageviewEvent.timestamp >= datetime.combine(week_start, time()),
+                    ),
+                    PageviewEvent.visitor_hash,
+                ),
+            )
+            result = await db.execute(
+                select(
+                    PageviewEvent.site_id,
+                    day.label("day"),
+                    visitor.label("visitor"),
+                    func.count().label("pageviews"),
+                    func.count(func.distinct(PageviewEvent.visitor_hash)).label(
+                        "unique_visitors"
+                    ),
+                )
+                .where(or_(*conditions))
+                .group_by(PageviewEvent.site_id, day, visitor)
+            )
+            for r in result.all():
+                counted = date.fromisoformat(str(r.day)[:10])
+                pageviews, visitors = counts[r.site_id].get(counted, (0, 0))
+                counts[r.site_id][counted] = (
+                    pageviews + r.pageviews, visitors + r.unique_visitors
+                )
+                if r.visitor is not None:
+                    week_hashes[r.site_id].add(r.visitor)
+
+        overview = []
+        for site in sites:
+            per_day = counts[site.id]
+            week = [per_day.get(week_start + timedelta(days=n), (0, 0)) for n in range(7)]
+            overview.append(
+                {
+                    "id": site.id,
+                    "name": site.name,
+                    "domain": site.domain,
+                    "public": site.public,
+                    "today": dict(zip(("pageviews", "unique_visitors"), week[-1], strict=True)),
+                    "last_7_days": {
+                        "pageviews": sum(pageviews for pageviews, _ in week),
+                        "unique_visitors": AnalyticsService._week_visitors(
+                            site, week, week_rows[site.id], week_hashes.get(site.id)
+                        ),
+                    },
+                    "sparkline": [
+                        per_day.get(start + timedelta(days=n), (0, 0))[0] for n in range(days)
+                    ],
+                }
+            )
+        return {"start_date": start.isoformat(), "end_date": today.isoformat(), "sites": overview}
+
+    @staticmethod
+    def _week_visitors(site: Site, week: list, rows: list, hashes: set[str] | None) -> int:
+        """Uniques over the overview's week, merged as ``QueryPlanner.totals`` merges them.
+
+        ``week`` holds the seven daily ``(pageviews, visitors)``, ``rows`` the week's
+        ``DailySiteStats`` rows and ``hashes`` the raw days' visitors (windowed sites).
+        """
+        visitors = sum(visitors for _, visitors in week)
+        if hashes is None:
+            return visitors
+        aggregated_visitors, sketch = _merge_visitors(rows, site.identity_window)
+        aggregated = {
+            "pageviews": 0, "unique_visitors": aggregated_visitors, "visitors_hll": sketch
+        }
+        raw = {
+            "pageviews": 0,
+            "unique_visitors": len(hashes),
+            "visitors_hll": HyperLogLog.from_hashes(hashes),
+        }
+        return _merge_counts(aggregated, raw, site.identity_window)["unique_visitors"]
+
+    @staticmethod
+    async def warm_public_dashboards(
+        db: AsyncSession, periods: tuple[str, ...] = ("today", "7d", "30d")
+    ) -> int:
+        """Recompute and cache the default periods of every public site.
+
+        Run after aggregation so the first visitor of a shared dashboard is served
+        from the cache. Returns the number of dashboards cached.
+        """
+        site_ids = (await db.execute(select(Site.id).where(Site.public.is_(True)))).scalars()
+        warmed = 0
+        for site_id in site_ids.all():
+            for period in periods:
+                start_date, end_date = AnalyticsService._date_range(period)
+                key = response_cache.key(site_id, period, start_date, end_date, "day")
+                data = await AnalyticsService.get_full_dashboard(db, site_id, period)
+                if not data["degraded"]:
+                    response_cache.set(key, data)
+                    warmed += 1
+        return warmed
@@ -6,13 +6,26 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.models.event import PageviewEvent
+from app.periods import period_bounds
 
 
 class EventService:
     @staticmethod
-    def compute_visitor_hash(site_id: str, ip: str, user_agent: str) -> str:
-        today = date.today().isoformat()
-        salt = f"{settings.secret_key}:{today}"
+    def compute_visitor_hash(
+        site_id: str,
+        ip: str,
+        user_agent: str,
+        identity_window: str = "day",
+        day: date | None = None,
+    ) -> str:
+        """Anonymous visitor ID; the salt rotates at the start of each identity window.
+
+        Hashes are stable within one day, ISO week or calendar month, so distinct
+        hashes over a span inside that window count returning visitors once. ``day``
+        (today by default) dates pageviews read from logs or imports.
+        """
+        window_start, _ = period_bounds(identity_window, day or date.today())
+        salt = f"{settings.secret_key}:{window_start.isoformat()}"
         raw = f"{salt}:{site_id}:{ip}:{user_agent}"
         return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
@@ -0,0 +1,187 @@
+"""Streaming CSV / NDJSON export of raw events and the daily aggregate tables.
+
+Rows are read through a server-side cursor (``AsyncSession.stream`` with
+``yield_per``), formatted batch by batch and handed out in chunks of about
+``EXPORT_CHUNK_BYTES``, optionally through an incremental gzip compressor, so memory
+stays flat however many rows an export covers.
+
+Rows come in (timestamp, id) order for ``pageview_events`` and (date, id) order for the
+daily tables, and both columns are part of every row: an interrupted export resumes
+with ``after=<timestamp or date>,<id>`` taken from the last complete row received.
+Resumed CSV exports have no header, so the pieces concatenate. HyperLogLog sketch
+columns are not exported.
+"""
+
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import LargeBinary, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.event import PageviewEvent
+from app.models.stats import (
+    DailyBreakdownStats,
+    DailyBrowserStats,
+    DailyCountryStats,
+    DailyDeviceStats,
+    DailyPageStats,
+    DailyReferrerStats,
+    DailySiteStats,
+    DailyUTMStats,
+)
+
+EXPORT_TABLES = {
+    model.__tablename__: model
+    for model in (
+        PageviewEvent,
+        DailySiteStats,
+        DailyPageStats,
+        DailyReferrerStats,
+        DailyBrowserStats,
+        DailyDeviceStats,
+        DailyCountryStats,
+        DailyUTMStats,
+        DailyBreakdownStats,
+    )
+}
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class ExportStream:
+    """The chunks of one export, in order; ``cursor`` tracks how far it got.
+
+    Arguments are validated on construction (``ValueError`` for an unknown table or
+    format, or a malformed ``after``), so callers can reject a request before the first
+    byte is sent. ``cursor`` is the resume token of the last row in a chunk already
+    yielded and ``rows`` how many rows those chunks held.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        table: str,
+        start_date: date,
+        end_date: date,
+        fmt: str = "csv",
+        site_id: str | None = None,
+        after: str | None = None,
+        compress: bool = False,
+    ):
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown export table: {table!r}")
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"Unknown export format: {fmt!r}")
+        self.db = db
+        self.model = EXPORT_TABLES[table]
+        self.events = self.model is PageviewEvent
+        self.start_date = start_date
+        self.end_date = end_date
+        self.fmt = fmt
+        self.site_id = site_id
+        self.compress = compress
+        self.columns = [
+            column.name
+            for column in self.model.__table__.columns
+            if not isinstance(column.type, LargeBinary)
+        ]
+        self.key_name = "timestamp" if self.events else "date"
+        self.after = self.parse_cursor(after) if after else None
+        self.cursor = after
+        self.rows = 0
+
+    def parse_cursor(self, text: str) -> tuple:
+        key, sep, row_id = text.rpartition(",")
+        try:
+            if not sep or not row_id:
+                raise ValueError
+            value = datetime.fromisoformat(key) if self.events else date.fromisoformat(key)
+        except ValueError:
+            raise ValueError(f"Invalid export cursor: {text!r}") from None
+        return value, row_id
+
+    def _statement(self):
+        table = self.model.__table__
+        key = table.c[self.key_name]
+        if self.events:
+            lower = datetime.combine(self.start_date, time())
+            upper = datetime.combine(self.end_date + timedelta(days=1), time())
+            clauses = [key >= lower, key < upper]
+        else:
+            clauses = [key >= self.start_date, key <= self.end_date]
+        if self.after:
+            seek = self.after[0]
+            if self.events:
+                # SQLite compares timestamps as text, and rows stored by the server
+                # default lack the microseconds a bound datetime has, so the seek
+                # starts a second early; rows up to the cursor are skipped as they
+                # stream (see ``_fresh``).
+                seek -= timedelta(seconds=1)
+            clauses.append(key >= seek)
+        if self.site_id:
+            clauses.append(table.c.site_id == self.site_id)
+        return (
+            select(*(table.c[name] for name in self.columns))
+            .where(*clauses)
+            .order_by(key, table.c.id)
+            .execution_options(yield_per=settings.export_batch_rows)
+        )
+
+    def _fresh(self, row) -> bool:
+        if self.after is None:
+            return True
+        key = row._mapping[self.key_name]
+        return (key, row.id) > self.after
+
+    async def _text(self) -> AsyncIterator[tuple[str, str | None, int]]:
+        """Pieces of about ``EXPORT_CHUNK_BYTES`` with the cursor and rows they reach."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if self.fmt == "csv" and self.after is None:
+            writer.writerow(self.columns)
+        cursor, rows = None, 0
+        result = await self.db.stream(self._statement())
+        async for batch in result.partitions():
+            for row in batch:
+                if not self._fresh(row):
+                    continue
+                values = [_cell(value) for value in row]
+                if self.fmt == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(self.columns, values)), ensure_ascii=False))
+                    buffer.write("\n")
+                cursor = f"{_cell(row._mapping[self.key_name])},{row.id}"
+                rows += 1
+                if buffer.tell() >= settings.export_chunk_bytes:
+                    yield buffer.getvalue(), cursor, rows
+                    buffer.seek(0)
+                    buffer.truncate()
+                    rows = 0
+        yield buffer.getvalue(), cursor, rows
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        # wbits 31: gzip container. Each chunk is sync-flushed, so a client always
+        # holds complete rows up to the last chunk it received.
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if self.compress else None
+        async for text, cursor, rows in self._text():
+            data = text.encode("utf-8")
+            if compressor is not None:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+            if cursor is not None:
+                self.cursor = cursor
+            self.rows += rows
+        if compressor is not None:
+            yield compressor.flush()
@@ -0,0 +1,555 @@
+"""Streaming bulk import of CSV exports from other analytics tools.
+
+An import loads one CSV file into one table for one site: raw hits into
+``pageview_events`` or daily aggregates into one of the ``Daily*Stats`` tables (the
+tables ``app.services.export`` writes). CSV columns are matched to table fields by
+name, ignoring case and reading spaces or dashes as underscores, and ``mapping``
+renames them (``{"path": "Page"}``). Hits may also carry ``visitor``, ``ip`` and
+``user_agent`` columns: visitors are hashed with the salt of their day, as live
+ingestion does, and the user agent fills in browser, OS and device. A hit with neither
+``visitor`` nor ``ip`` counts as a visitor of its own, so uniques over such hits are
+approximate (an upper bound).
+
+The file is read one record at a time and written ``IMPORT_BATCH_ROWS`` rows per
+multi-row insert (an upsert on the daily tables' unique keys), so memory stays bounded
+whatever its size. Each batch commits together with the byte offset it reached in the
+``ImportJob``, so an import stopped at any point resumes from the last batch. Rows that
+cannot be parsed are counted in ``skipped``. Once the file is done, imported hits are
+aggregated for the site's days; imported daily rows get their rollups rebuilt. Days
+imported into a breakdown table without site totals get an empty ``DailySiteStats``
+row, so dashboards read them (see ``ImportService._mark_days``).
+"""
+
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time as clock
+import uuid
+from collections.abc import Callable
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from sqlalchemy import (
+    Date,
+    DateTime,
+    Integer,
+    LargeBinary,
+    UniqueConstraint,
+    and_,
+    func,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import response_cache
+from app.config import settings
+from app.models.event import PageviewEvent
+from app.models.import_job import ImportJob
+from app.models.site import Site
+from app.models.stats import DailySiteStats
+from app.periods import period_bounds
+from app.services.aggregation import AggregationService
+from app.services.event import EventService
+from app.services.export import EXPORT_TABLES
+from app.services.leaderboard import LeaderboardService
+from app.services.rollup import RollupService
+
+logger = logging.getLogger(__name__)
+
+IMPORT_TARGETS = EXPORT_TABLES
+# Source fields of raw hits that are not columns; they derive visitor_hash and the
+# user-agent fields
+HIT_FIELDS = ("visitor", "ip", "user_agent")
+# A running job whose last batch is older than this was interrupted and is resumed
+# by the scheduler
+_STALE_AFTER = timedelta(minutes=5)
+
+
+@lru_cache(maxsize=4096)
+def _parse_user_agent(user_agent: str) -> dict:
+    return EventService.parse_user_agent(user_agent)
+
+
+def _parse_datetime(value: str) -> datetime:
+    """ISO 8601 (naive values are taken as UTC) or Unix seconds, as naive UTC."""
+    try:
+        seconds = float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value[:10])
+
+
+def _parse_int(value: str) -> int:
+    return int(float(value))
+
+
+def _converter(column) -> Callable[[str], object]:
+    if isinstance(column.type, DateTime):
+        return _parse_datetime
+    if isinstance(column.type, Date):
+        return _parse_date
+    if isinstance(column.type, Integer):
+        return _parse_int
+    return lambda value: value[: column.type.length] if column.type.length else value
+
+
+def _normalize(name: str) -> str:
+    return name.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def _unique_key(model) -> list[str]:
+    for constraint in model.__table__.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            return [column.name for column in constraint.columns]
+    return []
+
+
+def import_fields(target: str) -> list[str]:
+    """Fields a CSV column can be mapped to for ``target``."""
+    model = IMPORT_TARGETS[target]
+    fields = [
+        column.name
+        for column in model.__table__.columns
+        if column.name not in ("id", "site_id", "visitor_hash")
+        and not isinstance(column.type, LargeBinary)
+    ]
+    return fields + list(HIT_FIELDS) if model is PageviewEvent else fields
+
+
+def _required(target: str) -> list[tuple[str, ...]]:
+    """Field alternatives of which each row needs one."""
+    model = IMPORT_TARGETS[target]
+    if model is PageviewEvent:
+        return [("timestamp",), ("path", "url")]
+    table = model.__table__
+    keys = [
+        (name,) for name in _unique_key(model)
+        if name != "site_id" and table.c[name].default is None
+    ]
+    return keys + [("pageviews",)]
+
+
+class _Lines:
+    """Decoded lines of a binary file, counting the bytes read (for resume offsets)."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.raw.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode("utf-8", errors="replace")
+
+
+class _RowBuilder:
+    """Turns CSV records into complete rows of the target table."""
+
+    def __init__(self, target: str, site: Site, header: list[str], mapping: dict[str, str]):
+        self.model = IMPORT_TARGETS[target]
+        self.table = self.model.__table__
+        self.site = site
+        self.hits = self.model is PageviewEvent
+        fields = import_fields(target)
+        unknown = set(mapping) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown fields for {target}: {', '.join(sorted(unknown))}")
+        positions = {_normalize(name): index for index, name in enumerate(header)}
+        self.indexes: dict[str, int] = {}
+        for field in fields:
+            column = mapping.get(field, field)
+            index = positions.get(_normalize(column))
+            if index is not None:
+                self.indexes[field] = index
+            elif field in mapping:
+                raise ValueError(f"Column {column!r} (for {field}) is not in the file")
+        for alternatives in _required(target):
+            if not any(field in self.indexes for field in alternatives):
+                raise ValueError(f"No column for {' or '.join(alternatives)}")
+        self.columns = [
+            column for column in self.table.columns
+            if column.name not in ("id", "site_id") and not isinstance(column.type, LargeBinary)
+        ]
+        self.converters = {
+            column.name: _converter(column)
+            for column in self.columns
+            if column.name in self.indexes
+        }
+        self.key = _unique_key(self.model)
+        self._salts: dict[date, str] = {}
+
+    def _salt(self, day: date) -> str:
+        salt = self._salts.get(day)
+        if salt is None:
+            window_start, _ = period_bounds(self.site.identity_window, day)
+            salt = self._salts[day] = f"{settings.secret_key}:{window_start.isoformat()}"
+        return salt
+
+    def build(self, record: list[str]) -> dict:
+        """A row for ``record``; ``ValueError`` or ``IndexError`` if it is unusable."""
+        raw = {field: record[index].strip() for field, index in self.indexes.items()}
+        row = {"id": str(uuid.uuid4()), "site_id": self.site.id}
+        for column in self.columns:
+            value = raw.get(column.name)
+            if value:
+                row[column.name] = self.converters[column.name](value)
+            elif column.nullable:
+                row[column.name] = None
+            elif column.default is not None:
+                row[column.name] = column.default.arg
+            elif not self.hits or column.name not in ("url", "path", "visitor_hash"):
+                raise ValueError(f"Missing {column.name}")
+        if self.hits:
+            self._complete_hit(row, raw)
+        return row
+
+    def _complete_hit(self, row: dict, raw: dict) -> None:
+        path, url = row.get("path"), row.get("url")
+        if not path and not url:
+            raise ValueError("Missing path")
+        if not path:
+            path = row["path"] = urlparse(url).path or "/"
+        if not url:
+            row["url"] = f"https://{self.site.domain}{path}"[:2048]
+        if row["referrer"] and not row["referrer_domain"]:
+            row["referrer_domain"] = EventService.extract_referrer_domain(row["referrer"])
+        user_agent = raw.get("user_agent", "")
+        if user_agent:
+            parsed = _parse_user_agent(user_agent)
+            for field in ("browser", "os", "device_type"):
+                row[field] = row[field] or parsed[field]
+        if row["country_code"]:
+            row["country_code"] = row["country_code"].upper()
+        day = row["timestamp"].date()
+        visitor = raw.get("visitor")
+        if raw.get("ip") and not visitor:
+            # Same hash as live ingestion gives this IP and user agent on that day
+            row["visitor_hash"] = EventService.compute_visitor_hash(
+                self.site.id, raw["ip"], user_agent, self.site.identity_window, day
+            )
+            return
+        if not visitor:
+            # Nothing tells visitors apart (a user agent alone is shared by many), so
+            # the hit is its own visitor and uniques over such hits are an upper bound
+            visitor = row["id"]
+        source = f"{self._salt(day)}:{self.site.id}:import:{visitor}"
+        row["visitor_hash"] = hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def day(self, row: dict) -> date:
+        return row["timestamp"].date() if self.hits else row["date"]
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _read_header(lines: _Lines) -> list[str] | None:
+    header = next(csv.reader(lines), None)
+    if header:
+        header[0] = header[0].lstrip("\ufeff")
+    return header
+
+
+class ImportService:
+    """Creates, runs and reports on bulk CSV imports."""
+
+    @staticmethod
+    async def create_job(
+        db: AsyncSession,
+        site_id: str,
+        target: str,
+        path: str,
+        mapping: dict[str, str] | None = None,
+        queued: bool = True,
+    ) -> ImportJob:
+        """Validate the file's header against ``target`` and record the import.
+
+        A ``queued`` job is picked up by the scheduler; otherwise it is ``paused``
+        until run (from the CLI). Raises ``ValueError`` for an unknown site or target,
+        an unreadable file or a mapping that does not fit its header.
+        """
+        if target not in IMPORT_TARGETS:
+            raise ValueError(f"Unknown import table: {target!r}")
+        site = await db.get(Site, site_id)
+        if site is None:
+            raise ValueError(f"Unknown site: {site_id!r}")
+        path = os.path.abspath(path)
+        try:
+            with _open(path) as raw:
+                header = _read_header(_Lines(raw))
+        except OSError as exc:
+            raise ValueError(f"Cannot read {path}: {exc}") from exc
+        if not header:
+            raise ValueError(f"{path} is empty")
+        _RowBuilder(target, site, header, mapping or {})
+        job = ImportJob(
+            site_id=site_id,
+            target=target,
+            path=path,
+            mapping=json.dumps(mapping or {}),
+            status="queued" if queued else "paused",
+            size=None if path.endswith(".gz") else os.path.getsize(path),
+        )
+        db.add(job)
+        await db.commit()
+        return job
+
+    @staticmethod
+    async def run(
+        db: AsyncSession,
+        job_id: str,
+        max_seconds: float | None = None,
+        progress: Callable[[ImportJob], None] | None = None,
+    ) -> ImportJob:
+        """Import from the job's offset on; stop after ``max_seconds`` if given.
+
+        A job stopped by the time limit goes back to ``queued``. ``progress`` is called
+        after every committed batch. A failure marks the job ``failed`` and is re-raised.
+        """
+        job = await db.get(ImportJob, job_id)
+        if job is None:
+            raise ValueError(f"Unknown import job: {job_id!r}")
+        if job.status == "done":
+            return job
+        job.status = "running"
+        job.error = None
+        await db.commit()
+        deadline = clock.monotonic() + max_seconds if max_seconds is not None else None
+        try:
+            if await ImportService._load(db, job, deadline, progress):
+                await ImportService._finish(db, job)
+                job.status = "done"
+            else:
+                job.status = "queued"
+            await db.commit()
+        except Exception as exc:
+            await db.rollback()
+            await db.refresh(job)
+            job.status = "failed"
+            job.error = str(exc)[:2000]
+            await db.commit()
+            raise
+        logger.info(
+            "Import %s into %s: %s, %d rows, %d skipped",
+            job.id, job.target, job.status, job.rows, job.skipped,
+        )
+        return job
+
+    @staticmethod
+    async def _load(
+        db: AsyncSession,
+        job: ImportJob,
+        deadline: float | None,
+        progress: Callable[[ImportJob], None] | None,
+    ) -> bool:
+        """Stream the file from ``job.offset``; False if stopped at the deadline."""
+        site = await db.get(Site, job.site_id)
+        with _open(job.path) as raw:
+            lines = _Lines(raw)
+            header = _read_header(lines)
+            if not header:
+                return True
+            builder = _RowBuilder(job.target, site, header, json.loads(job.mapping))
+            if job.offset > lines.offset:
+                raw.seek(job.offset)
+                lines.offset = job.offset
+            else:
+                job.offset = lines.offset
+            batch = []
+            for record in csv.reader(lines):
+                if not any(record):
+                    continue
+                try:
+                    batch.append(builder.build(record))
+                except (ValueError, IndexError):
+                    job.skipped += 1
+                if len(batch) >= settings.import_batch_rows:
+                    await ImportService._commit_batch(db, job, builder, batch, lines.offset)
+                    batch = []
+                    if progress is not None:
+                        progress(job)
+                    if deadline is not None and clock.monotonic() >= deadline:
+                        return False
+            await ImportService._commit_batch(db, job, builder, batch, lines.offset)
+            if progress is not None:
+                progress(job)
+        return True
+
+    @staticmethod
+    async def _commit_batch(
+        db: AsyncSession, job: ImportJob, builder: _RowBuilder, batch: list[dict], offset: int
+    ) -> None:
+        """Insert a batch and record the offset it reaches, in one transaction."""
+        if batch:
+            if builder.hits:
+                await db.execute(insert(builder.table), batch)
+            else:
+                # Later rows for the same key win, within the batch and over the table
+                latest = {tuple(row[name] for name in builder.key): row for row in batch}
+                rows = list(latest.values())
+                dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+                statement = dialect.insert(builder.table)
+                values = {
+                    name: statement.excluded[name]
+                    for name in rows[0]
+                    if name not in builder.key and name != "id"
+                }
+                if "visitors_hll" in builder.table.c:
+                    values["visitors_hll"] = None
+                await db.execute(
+                    statement.on_conflict_do_update(index_elements=builder.key, set_=values),
+                    rows,
+                )
+            days = [builder.day(row) for row in batch]
+            if not builder.hits and builder.model is not DailySiteStats:
+                await ImportService._mark_days(db, job.site_id, set(days))
+            job.first_date = min(days + ([job.first_date] if job.first_date else []))
+            job.last_date = max(days + ([job.last_date] if job.last_date else []))
+            job.rows += len(batch)
+        job.offset = offset
+        await db.commit()
+
+    @staticmethod
+    async def _mark_days(db: AsyncSession, site_id: str, days: set[date]) -> None:
+        """Give imported breakdown days a ``DailySiteStats`` row if they have none.
+
+        Query planning only reads the daily tables for days with a site row, so
+        without one the imported rows would never be shown. The marker carries no
+        totals; importing ``daily_site_stats`` for the same days (before or after)
+        fills them in, and an existing row is left as it is.
+
+        Today and later, and days with raw events for the site, are left unmarked:
+        a marker would hide their events from the dashboard until they are aggregated,
+        and aggregation gives them their site row anyway.
+        """
+        days = {day for day in days if day < date.today()}
+        if not days:
+            return
+        result = await db.execute(
+            select(func.date(PageviewEvent.timestamp)).distinct().where(
+                PageviewEvent.site_id == site_id,
+                func.date(PageviewEvent.timestamp).between(
+                    min(days).isoformat(), max(days).isoformat()
+                ),
+            )
+        )
+        days -= {date.fromisoformat(str(day)) for day in result.scalars().all()}
+        if not days:
+            return
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(DailySiteStats).on_conflict_do_nothing(
+            index_elements=["site_id", "date"]
+        )
+        await db.execute(
+            statement,
+            [
+                {"site_id": site_id, "date": day, "pageviews": 0, "unique_visitors": 0}
+                for day in sorted(days)
+            ],
+        )
+
+    @staticmethod
+    async def _finish(db: AsyncSession, job: ImportJob) -> None:
+        """Aggregate imported hits, or rebuild rollups over imported daily rows."""
+        if job.first_date is None:
+            return
+        if IMPORT_TARGETS[job.target] is PageviewEvent:
+            # Today's daily rows are left to the nightly job; its hours are rolled up
+            await AggregationService.aggregate_site(
+                db, job.site_id, job.first_date, job.last_date
+            )
+            return
+        await RollupService.cascade(db, job.first_date, job.last_date)
+        response_cache.invalidate(job.site_id)
+        recent = date.today() - timedelta(days=1)
+        if job.first_date <= recent and LeaderboardService.covers(min(job.last_date, recent)):
+            await LeaderboardService.refresh_site(db, job.site_id)
+
+    @staticmethod
+    async def pause(db: AsyncSession, job_id: str) -> None:
+        job = await db.get(ImportJob, job_id)
+        if job is not None and job.status == "running":
+            job.status = "paused"
+            await db.commit()
+
+    @staticmethod
+    async def pending(db: AsyncSession) -> list[str]:
+        """Jobs for the scheduler: queued ones and running ones left by a dead process."""
+        stale = datetime.now(timezone.utc).replace(tzinfo=None) - _STALE_AFTER
+        result = await db.execute(
+            select(ImportJob.id)
+            .where(
+                or_(
+                    ImportJob.status == "queued",
+                    and_(ImportJob.status == "running", ImportJob.updated_at < stale),
+                )
+            )
+            .order_by(ImportJob.created_at)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def run_pending(db: AsyncSession, max_seconds: float) -> dict:
+        """Run pending jobs in turn for up to ``max_seconds`` in total."""
+        deadline = clock.monotonic() + max_seconds
+        stats = {"jobs": 0, "done": 0, "failed": 0}
+        for job_id in await ImportService.pending(db):
+            remaining = deadline - clock.monotonic()
+            if remaining <= 0:
+                break
+            stats["jobs"] += 1
+            try:
+                job = await ImportService.run(db, job_id, max_seconds=remaining)
+            except Exception:
+                logger.exception("Import %s failed", job_id)
+                stats["failed"] += 1
+                continue
+            stats["done"] += job.status == "done"
+        return stats
+
+    @staticmethod
+    async def list_jobs(db: AsyncSession, site_id: str) -> list[ImportJob]:
+        result = await db.execute(
+            select(ImportJob)
+            .where(ImportJob.site_id == site_id)
+            .order_by(ImportJob.created_at.desc())
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    def describe(job: ImportJob) -> dict:
+        return {
+            "id": job.id,
+            "table": job.target,
+            "file": os.path.basename(job.path),
+            "status": job.status,
+            "rows": job.rows,
+            "skipped": job.skipped,
+            "bytes_read": job.offset,
+            "bytes_total": job.size,
+            "percent": round(job.offset / job.size * 100, 1) if job.size else None,
+            "first_date": job.first_date.isoformat() if job.first_date else None,
+            "last_date": job.last_date.isoformat() if job.last_date else None,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        }
@@ -0,0 +1,159 @@
+"""Precomputed top-N leaderboards for the rolling 7d and 30d dashboard periods.
+
+After aggregation, each site's top ``LEADERBOARD_SIZE`` values per dimension over the
+aggregated days of both windows (up to yesterday) are stored in
+``LeaderboardEntry``, ranked. A dashboard request for 7d or 30d reads them by primary
+key instead of grouping and sorting the daily tables, and merges in today's raw events.
+"""
+
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.dimensions import DIMENSIONS
+from app.hll import HyperLogLog
+from app.models.stats import LeaderboardEntry
+from app.services.planner import QueryPlan, QueryPlanner
+from app.services.rollup import RollupService
+
+# Window name -> length in days, including today
+WINDOWS = {"7d": 7, "30d": 30}
+
+
+class LeaderboardService:
+    """Builds and reads the per-site 7d/30d leaderboards."""
+
+    @staticmethod
+    def window_for(plan: QueryPlan) -> str | None:
+        """The leaderboard window matching a plan's range, if any."""
+        if plan.end_date != date.today():
+            return None
+        days = (plan.end_date - plan.start_date).days + 1
+        for window, length in WINDOWS.items():
+            if length == days:
+                return window
+        return None
+
+    @staticmethod
+    def covers(target_date: date) -> bool:
+        """Whether re-aggregating ``target_date`` changes a current leaderboard."""
+        today = date.today()
+        return today - timedelta(days=max(WINDOWS.values()) - 1) <= target_date < today
+
+    @staticmethod
+    async def refresh_site(db: AsyncSession, site_id: str) -> int:
+        """Rebuild a site's leaderboards. Returns the number of rows written.
+
+        Each window covers the days aggregated so far (days before a site existed have
+        no summary rows); the ``"site"`` marker row records them, and reads only use a
+        leaderboard whose coverage matches their own plan.
+        """
+        today = date.today()
+        end = today - timedelta(days=1)
+        await db.execute(delete(LeaderboardEntry).where(LeaderboardEntry.site_id == site_id))
+        written = 0
+        for window, length in WINDOWS.items():
+            start = today - timedelta(days=length - 1)
+            plan = await QueryPlanner.plan(db, site_id, start, end)
+            if not plan.aggregated:
+                continue
+            counts = await RollupService.read_breakdowns(
+                db, site_id, DIMENSIONS, plan.segments, plan.identity_window,
+                settings.leaderboard_size,
+            )
+            base = {"site_id": site_id, "window": window, "start_date": start, "end_date": end}
+            rows = [
+                {
+                    **base, "dimension": "site", "rank": 0,
+                    "value": plan.coverage(),
+                    "pageviews": 0, "unique_visitors": 0, "visitors_hll": None,
+                }
+            ]
+            for dimension, values in counts.items():
+                for rank, (value, c) in enumerate(values.items(), start=1):
+                    rows.append(
+                        {
+                            **base,
+                            "dimension": dimension,
+                            "rank": rank,
+                            "value": value,
+                            "pageviews": c["pageviews"],
+                            "unique_visitors": c["unique_visitors"],
+                            "visitors_hll": (
+                                c["visitors_hll"].to_bytes() if c["visitors_hll"] else None
+                            ),
+                        }
+                    )
+            await db.execute(insert(LeaderboardEntry), rows)
+            written += len(rows)
+        await db.commit()
+        return written
+
+    @staticmethod
+    async def refresh_sites(db: AsyncSession, site_ids: list[str]) -> int:
+        written = 0
+        for site_id in site_ids:
+            written += await LeaderboardService.refresh_site(db, site_id)
+        return written
+
+    @staticmethod
+    async def breakdowns(
+        db: AsyncSession, plan: QueryPlan, dimensions: list[str], limit: int = 10
+    ) -> dict[str, list[dict]] | None:
+        """Top ``limit`` values per dimension from the leaderboard, or None if unusable.
+
+        The leaderboard is used when the plan is a 7d/30d window whose aggregated days
+        are exactly the ones the leaderboard was built from. Raw days (today) are merged
+        in; a raw value missing from a full leaderboard has its aggregated counts looked
+        up, so the merged ranking is exact.
+        """
+        window = LeaderboardService.window_for(plan)
+        if window is None or not plan.aggregated or limit > settings.leaderboard_size:
+            return None
+        result = await db.execute(
+            select(LeaderboardEntry)
+            .where(
+                LeaderboardEntry.site_id == plan.site_id,
+                LeaderboardEntry.window == window,
+                LeaderboardEntry.dimension.in_(["site", *dimensions]),
+            )
+            .order_by(LeaderboardEntry.dimension, LeaderboardEntry.rank)
+        )
+        entries = result.scalars().all()
+        marker = next((e for e in entries if e.dimension == "site"), None)
+        if marker is None or marker.value != plan.coverage():
+            return None
+
+        sketched = plan.identity_window != "day"
+        aggregated: dict[str, dict[str, dict]] = {dimension: {} for dimension in dimensions}
+        for e in entries:
+            if e.dimension == "site":
+                continue
+            aggregated[e.dimension][e.value] = {
+                "pageviews": e.pageviews,
+                "unique_visitors": e.unique_visitors,
+                "visitors_hll": (
+                    HyperLogLog.from_bytes(e.visitors_hll)
+                    if sketched and e.visitors_hll
+                    else None
+                ),
+            }
+
+        raw = await QueryPlanner.raw_breakdowns(db, plan, dimensions)
+        # Values beyond a full leaderboard may still have aggregated counts
+        missing = {
+            dimension: [value for value in raw[dimension] if value not in aggregated[dimension]]
+            for dimension in dimensions
+            if len(aggregated[dimension]) >= settings.leaderboard_size
+        }
+        missing = {dimension: values for dimension, values in missing.items() if values}
+        if missing:
+            extra = await RollupService.read_breakdowns(
+                db, plan.site_id, missing, plan.segments, plan.identity_window, 0,
+                include=missing,
+            )
+            for dimension, values in extra.items():
+                aggregated[dimension].update(values)
+        return QueryPlanner.merge_breakdowns(plan, dimensions, aggregated, raw, limit)
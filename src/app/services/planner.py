@@ -0,0 +1,825 @@
+"""Hybrid query planning for dashboard reads.
+
+A requested date range is split into days that the nightly job has already aggregated
+(served from the daily and rollup tables) and days that it has not, normally just
+today (served from raw events). Each query reads both parts and merges them.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, delete, func, literal, or_, select, true, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import hour_bucket
+from app.dimensions import DIMENSIONS, dimension_label
+from app.hll import HyperLogLog
+from app.models.event import PageviewEvent
+from app.models.stats import BreakdownRanking, BreakdownRankingBuild, DailySiteStats
+from app.services.rollup import RollupService
+from app.singleflight import SingleFlight
+
+
+def _runs(days: list[date]) -> list[tuple[date, date]]:
+    """Collapse sorted days into inclusive ``(start, end)`` runs of consecutive days."""
+    runs: list[tuple[date, date]] = []
+    for day in days:
+        if runs and runs[-1][1] == day - timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def _merge_counts(aggregated: dict, raw: dict, identity_window: str) -> dict:
+    """Combine aggregated and raw counts for one key."""
+    pageviews = aggregated["pageviews"] + raw["pageviews"]
+    agg_sketch, raw_sketch = aggregated["visitors_hll"], raw["visitors_hll"]
+    if identity_window == "day" or agg_sketch is None or raw_sketch is None:
+        # Daily hashes never repeat across days, so the two parts are disjoint
+        visitors = aggregated["unique_visitors"] + raw["unique_visitors"]
+    else:
+        visitors = HyperLogLog(bytearray(agg_sketch.registers)).merge(raw_sketch).cardinality()
+    return {"pageviews": pageviews, "unique_visitors": visitors, "visitors_hll": None}
+
+
+_EMPTY = {"pageviews": 0, "unique_visitors": 0, "visitors_hll": None}
+
+# Values per IN list, well below SQLite's limit on bound parameters
+_IN_CHUNK = 500
+
+# Concurrent requests for the same ranking share one build (see ``QueryPlanner.rank``)
+ranking_flights = SingleFlight()
+
+# Labels of the two windows of a comparison
+PERIODS = ("current", "previous")
+
+
+def previous_range(start_date: date, end_date: date) -> tuple[date, date]:
+    """The range of the same length ending the day before ``start_date``."""
+    days = (end_date - start_date).days + 1
+    return start_date - timedelta(days=days), start_date - timedelta(days=1)
+
+
+def _period(day, split_at: date | None):
+    """SQL label of the comparison window a day falls in (``"current"`` from ``split_at``)."""
+    if split_at is None:
+        return literal("current")
+    return case((day >= split_at, "current"), else_="previous")
+
+
+class QueryPlan:
+    """How one site's date range is served: aggregated runs, raw runs and rollup segments."""
+
+    def __init__(
+        self,
+        site_id: str,
+        start_date: date,
+        end_date: date,
+        aggregated_days: list[date],
+        segments: list[tuple[str, date, date]],
+        identity_window: str = "day",
+    ):
+        self.site_id = site_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.identity_window = identity_window
+        self.aggregated = _runs(aggregated_days)
+        aggregated = set(aggregated_days)
+        self.raw = _runs(
+            [
+                start_date + timedelta(days=offset)
+                for offset in range((end_date - start_date).days + 1)
+                if start_date + timedelta(days=offset) not in aggregated
+            ]
+        )
+        self.segments = segments
+
+    @classmethod
+    def joined(cls, first: "QueryPlan", second: "QueryPlan") -> "QueryPlan":
+        """One plan over two adjacent plans of a site, keeping each one's segments."""
+        aggregated_days = [
+            start + timedelta(days=offset)
+            for start, end in first.aggregated + second.aggregated
+            for offset in range((end - start).days + 1)
+        ]
+        return cls(
+            first.site_id, first.start_date, second.end_date, aggregated_days,
+            first.segments + second.segments, first.identity_window,
+        )
+
+    def coverage(self) -> str:
+        """Stored form of the aggregated date runs, to tell whether a materialized read
+        was built from the same days."""
+        return ",".join(f"{start.isoformat()}:{end.isoformat()}" for start, end in self.aggregated)
+
+    def raw_date_filter(self):
+        return or_(
+            *(
+                func.date(PageviewEvent.timestamp).between(start, end)
+                for start, end in self.raw
+            )
+        )
+
+    def describe(self) -> dict:
+        """Which days came from aggregates and which from raw events."""
+        rollups = {"day": 0, "week": 0, "month": 0, "year": 0}
+        for granularity, _, _ in self.segments:
+            rollups[granularity] += 1
+        return {
+            "aggregated": [[s.isoformat(), e.isoformat()] for s, e in self.aggregated],
+            "raw": [[s.isoformat(), e.isoformat()] for s, e in self.raw],
+            "aggregated_days": sum((e - s).days + 1 for s, e in self.aggregated),
+            "raw_days": sum((e - s).days + 1 for s, e in self.raw),
+            "segments": rollups,
+            # Sections counted from raw events over the whole range: none any more
+            "raw_sections": [],
+        }
+
+
+class QueryPlanner:
+    """Builds ``QueryPlan``s and runs merged aggregate + raw reads against them."""
+
+    @staticmethod
+    async def plan(db: AsyncSession, site_id: str, start_date: date, end_date: date) -> QueryPlan:
+        """Days with a ``DailySiteStats`` row are aggregated; the rest are read raw."""
+        result = await db.execute(
+            select(DailySiteStats.date)
+            .where(
+                DailySiteStats.site_id == site_id,
+                DailySiteStats.date >= start_date,
+                DailySiteStats.date <= end_date,
+            )
+            .order_by(DailySiteStats.date)
+        )
+        aggregated_days = list(result.scalars().all())
+        window = await RollupService.identity_window(db, site_id)
+        segments: list[tuple[str, date, date]] = []
+        if aggregated_days:
+            available = await RollupService.available_periods(db, site_id, start_date, end_date)
+            for run_start, run_end in _runs(aggregated_days):
+                segments += RollupService.plan(run_start, run_end, available)
+        return QueryPlan(site_id, start_date, end_date, aggregated_days, segments, window)
+
+    @staticmethod
+    async def totals(db: AsyncSession, plan: QueryPlan) -> dict:
+        """Pageviews and unique visitors over the whole plan."""
+        aggregated = await RollupService.read_totals(
+            db, plan.site_id, plan.segments, plan.identity_window
+        )
+        raw = _EMPTY
+        if plan.raw:
+            where = (PageviewEvent.site_id == plan.site_id, plan.raw_date_filter())
+            if plan.identity_window == "day":
+                row = (
+                    await db.execute(
+                        select(
+                            func.count().label("pageviews"),
+                            func.count(func.distinct(PageviewEvent.visitor_hash)).label(
+                                "unique_visitors"
+                            ),
+                        ).where(*where)
+                    )
+                ).one()
+                raw = {
+                    "pageviews": row.pageviews or 0,
+                    "unique_visitors": row.unique_visitors or 0,
+                    "visitors_hll": None,
+                }
+            else:
+                result = await db.execute(
+                    select(PageviewEvent.visitor_hash, func.count().label("pageviews"))
+                    .where(*where)
+                    .group_by(PageviewEvent.visitor_hash)
+                )
+                rows = result.all()
+                raw = {
+                    "pageviews": sum(r.pageviews for r in rows),
+                    "unique_visitors": len(rows),
+                    "visitors_hll": HyperLogLog.from_hashes(r.visitor_hash for r in rows),
+                }
+        merged = _merge_counts(aggregated, raw, plan.identity_window)
+        return {"pageviews": merged["pageviews"], "unique_visitors": merged["unique_visitors"]}
+
+    @staticmethod
+    async def raw_bounces(db: AsyncSession, *where) -> tuple[int, int]:
+        """``(bounces, visits)`` over raw events matching ``where``, counted in SQL.
+
+        A visit is a visitor's pageviews on one day, and a bounce a visit of one pageview.
+        """
+        per_visit = (
+            select(func.count().label("pageviews"))
+            .where(*where)
+            .group_by(func.date(PageviewEvent.timestamp), PageviewEvent.visitor_hash)
+            .subquery()
+        )
+        row = (
+            await db.execute(
+                select(
+                    func.sum(case((per_visit.c.pageviews == 1, 1), else_=0)).label("bounces"),
+                    func.count().label("visits"),
+                )
+            )
+        ).one()
+        return row.bounces or 0, row.visits or 0
+
+    @staticmethod
+    async def _stored_bounces(
+        db: AsyncSession, plan: QueryPlan, split_at: date | None = None
+    ) -> dict[str, tuple[int, int]]:
+        """``(bounces, visits)`` stored for the plan's aggregated days, per comparison period.
+
+        A daily row's uniques are the visitors seen that day, so they add up to visits
+        whatever the identity window.
+        """
+        counts = {period: (0, 0) for period in PERIODS}
+        if not plan.aggregated:
+            return counts
+        period = _period(DailySiteStats.date, split_at).label("period")
+        result = await db.execute(
+            select(
+                period,
+                func.sum(DailySiteStats.bounces).label("bounces"),
+                func.sum(DailySiteStats.unique_visitors).label("visits"),
+            )
+            .where(
+                DailySiteStats.site_id == plan.site_id,
+                or_(*(DailySiteStats.date.between(start, end) for start, end in plan.aggregated)),
+            )
+            .group_by(period)
+        )
+        for r in result.all():
+            counts[r.period] = (r.bounces or 0, r.visits or 0)
+        return counts
+
+    @staticmethod
+    async def bounce_rate(db: AsyncSession, plan: QueryPlan) -> float:
+        """Percentage of the plan's visits (a visitor's day) with a single pageview.
+
+        The bounces and uniques stored per aggregated day add up to the range's bounced
+        visits and visits, so only the raw days are counted from events, as in ``totals``.
+        With a daily identity window a visit is simply a visitor.
+        """
+        bounces, visits = (await QueryPlanner._stored_bounces(db, plan))["current"]
+        if plan.raw:
+            raw_bounces, raw_visits = await QueryPlanner.raw_bounces(
+                db, PageviewEvent.site_id == plan.site_id, plan.raw_date_filter()
+            )
+            bounces += raw_bounces
+            visits += raw_visits
+        if not visits:
+            return 0.0
+        return round(bounces / visits * 100, 1)
+
+    @staticmethod
+    async def _raw_visitor_totals(
+        db: AsyncSession, split_at: date, *where
+    ) -> dict[str, dict]:
+        """Pageviews, visitors and bounces per comparison period, counted in SQL."""
+        period = _period(func.date(PageviewEvent.timestamp), split_at).label("period")
+        per_visitor = (
+            select(period, func.count().label("pageviews"))
+            .where(*where)
+            .group_by(period, PageviewEvent.visitor_hash)
+            .subquery()
+        )
+        result = await db.execute(
+            select(
+                per_visitor.c.period,
+                func.sum(per_visitor.c.pageviews).label("pageviews"),
+                func.count().label("visitors"),
+                func.sum(case((per_visitor.c.pageviews == 1, 1), else_=0)).label("bounces"),
+            ).group_by(per_visitor.c.period)
+        )
+        totals = {period: {"pageviews": 0, "visitors": 0, "bounces": 0} for period in PERIODS}
+        for r in result.all():
+            totals[r.period] = {
+                "pageviews": r.pageviews or 0, "visitors": r.visitors, "bounces": r.bounces or 0,
+            }
+        return totals
+
+    @staticmethod
+    async def compared_totals(
+        db: AsyncSession, current: QueryPlan, previous: QueryPlan
+    ) -> dict[str, dict]:
+        """Totals and bounce rate of two adjacent plans, keyed ``"current"``/``"previous"``.
+
+        Each query covers both windows and tells them apart with a period column: the
+        aggregated rows of both plans are one tagged UNION ALL, and their raw days are
+        grouped per period and visitor in one pass, which also yields the bounces.
+        Longer identity windows group the raw days per visit (a visitor's day) instead,
+        and add the bounces and visits stored for the aggregated days, as ``bounce_rate``.
+        """
+        window = current.identity_window
+        both = QueryPlan.joined(previous, current)
+        split_at = current.start_date
+        site_filter = PageviewEvent.site_id == current.site_id
+        aggregated = await RollupService.read_totals_compared(
+            db, current.site_id,
+            {"current": current.segments, "previous": previous.segments}, window,
+        )
+        raw = {
+            period: {
+                "pageviews": 0, "unique_visitors": 0, "bounces": 0, "visits": 0,
+                "visitors_hll": HyperLogLog() if window != "day" else None,
+            }
+            for period in PERIODS
+        }
+        if both.raw and window == "day":
+            counted = await QueryPlanner._raw_visitor_totals(
+                db, split_at, site_filter, both.raw_date_filter()
+            )
+            for period, counts in counted.items():
+                raw[period].update(
+                    pageviews=counts["pageviews"],
+                    unique_visitors=counts["visitors"],
+                    bounces=counts["bounces"],
+                )
+        elif both.raw:
+            day = func.date(PageviewEvent.timestamp)
+            period = _period(day, split_at).label("period")
+            result = await db.execute(
+                select(period, PageviewEvent.visitor_hash, func.count().label("pageviews"))
+                .where(site_filter, both.raw_date_filter())
+                .group_by(period, day, PageviewEvent.visitor_hash)
+            )
+            seen: dict[str, set] = {period: set() for period in PERIODS}
+            for r in result.all():
+                counts = raw[r.period]
+                counts["pageviews"] += r.pageviews
+                counts["bounces"] += r.pageviews == 1
+                counts["visits"] += 1
+                seen[r.period].add(r.visitor_hash)
+                counts["visitors_hll"].add(r.visitor_hash)
+            for period in PERIODS:
+                raw[period]["unique_visitors"] = len(seen[period])
+
+        if window != "day":
+            stored = await QueryPlanner._stored_bounces(db, both, split_at)
+            bounces = {
+                period: (
+                    stored[period][0] + raw[period]["bounces"],
+                    stored[period][1] + raw[period]["visits"],
+                )
+                for period in PERIODS
+            }
+        else:
+            bounces = {
+                period: (
+                    aggregated[period]["bounces"] + raw[period]["bounces"],
+                    aggregated[period]["unique_visitors"] + raw[period]["unique_visitors"],
+                )
+                for period in PERIODS
+            }
+
+        totals = {}
+        for period in PERIODS:
+            merged = _merge_counts(aggregated[period], raw[period], window)
+            bounced, visitors = bounces[period]
+            totals[period] = {
+                "pageviews": merged["pageviews"],
+                "unique_visitors": merged["unique_visitors"],
+                "bounce_rate": round(bounced / visitors * 100, 1) if visitors else 0.0,
+            }
+        return totals
+
+    @staticmethod
+    async def daily_series(db: AsyncSession, plan: QueryPlan) -> dict[str, dict]:
+        """Per-day pageviews and uniques keyed by ISO date (days without data omitted)."""
+        series: dict[str, dict] = {}
+        if plan.aggregated:
+            result = await db.execute(
+                select(
+                    DailySiteStats.date, DailySiteStats.pageviews, DailySiteStats.unique_visitors
+                ).where(
+                    DailySiteStats.site_id == plan.site_id,
+                    or_(*(DailySiteStats.date.between(s, e) for s, e in plan.aggregated)),
+                )
+            )
+            for r in result.all():
+                series[r.date.isoformat()] = {
+                    "pageviews": r.pageviews, "unique_visitors": r.unique_visitors,
+                }
+        if plan.raw:
+            day = func.date(PageviewEvent.timestamp).label("day")
+            result = await db.execute(
+                select(
+                    day,
+                    func.count().label("pageviews"),
+                    func.count(func.distinct(PageviewEvent.visitor_hash)).label("unique_visitors"),
+                )
+                .where(PageviewEvent.site_id == plan.site_id, plan.raw_date_filter())
+                .group_by(day)
+            )
+            for r in result.all():
+                series[str(r.day)] = {
+                    "pageviews": r.pageviews, "unique_visitors": r.unique_visitors,
+                }
+        return series
+
+    @staticmethod
+    async def changes(
+        db: AsyncSession, plan: QueryPlan, since: datetime, until: datetime,
+        dimensions: list[str], granularity: str = "day",
+    ) -> dict[str, set[str]]:
+        """What events received in ``(since, until]`` touched, in one query.
+
+        Returns the chart buckets (``"bucket"``: ISO days, or hour starts with
+        ``granularity="hour"``) and, per dimension, the values those events carry.
+        """
+        fields = {field for dimension in dimensions for field in DIMENSIONS[dimension].fields}
+        events = (
+            select(
+                PageviewEvent.timestamp,
+                *(getattr(PageviewEvent, field) for field in sorted(fields)),
+            )
+            .where(
+                PageviewEvent.site_id == plan.site_id,
+                PageviewEvent.timestamp > since,
+                PageviewEvent.timestamp <= until,
+                func.date(PageviewEvent.timestamp).between(plan.start_date, plan.end_date),
+            )
+            .cte("new_events")
+        )
+        if granularity == "hour":
+            bucket = hour_bucket(db, events.c.timestamp)
+        else:
+            bucket = func.date(events.c.timestamp)
+        branches = [
+            select(literal("bucket").label("dimension"), bucket.label("value")).group_by(bucket)
+        ]
+        for dimension in dimensions:
+            entry = DIMENSIONS[dimension]
+            key = entry.raw_key(events.c).label("value")
+            branches.append(
+                select(dimension_label(dimension), key)
+                .where(*entry.raw_filters(events.c))
+                .group_by(key)
+            )
+        result = await db.execute(union_all(*branches))
+
+        touched: dict[str, set[str]] = {"bucket": set(), **{d: set() for d in dimensions}}
+        for r in result.all():
+            touched[r.dimension].add(str(r.value))
+        return touched
+
+    @staticmethod
+    async def raw_breakdowns(
+        db: AsyncSession, plan: QueryPlan, dimensions: list[str],
+        only: dict[str, set[str]] | None = None,
+    ) -> dict[str, dict[str, dict]]:
+        """Every value of each dimension over the raw part, in one pass over its events.
+
+        The plan's events are filtered once into a CTE and each dimension is a grouped
+        branch of a UNION ALL over it. ``only`` restricts dimensions to the given values.
+        """
+        return (await QueryPlanner._raw_breakdowns(db, plan, dimensions, only))["current"]
+
+    @staticmethod
+    async def _raw_breakdowns(
+        db: AsyncSession, plan: QueryPlan, dimensions: list[str],
+        only: dict[str, set[str]] | None = None, split_at: date | None = None,
+    ) -> dict[str, dict[str, dict[str, dict]]]:
+        """``raw_breakdowns`` keyed by period: days before ``split_at`` are "previous"."""
+        raw: dict[str, dict[str, dict[str, dict]]] = {
+            period: {dimension: {} for dimension in dimensions} for period in PERIODS
+        }
+        if only is not None:
+            dimensions = [dimension for dimension in dimensions if only.get(dimension)]
+        if not plan.raw or not dimensions:
+            return raw
+        fields = {field for dimension in dimensions for field in DIMENSIONS[dimension].fields}
+        events = (
+            select(
+                PageviewEvent.visitor_hash,
+                _period(func.date(PageviewEvent.timestamp), split_at).label("period"),
+                *(getattr(PageviewEvent, field) for field in sorted(fields)),
+            )
+            .where(PageviewEvent.site_id == plan.site_id, plan.raw_date_filter())
+            .cte("raw_events")
+        )
+        per_visitor = plan.identity_window != "day"
+        branches = []
+        for dimension in dimensions:
+            entry = DIMENSIONS[dimension]
+            key = entry.raw_key(events.c).label("value")
+            if per_visitor:
+                columns = (events.c.visitor_hash, func.count().label("pageviews"))
+                group_by = (events.c.period, key, events.c.visitor_hash)
+            else:
+                columns = (
+                    func.count().label("pageviews"),
+                    func.count(func.distinct(events.c.visitor_hash)).label("unique_visitors"),
+                )
+                group_by = (events.c.period, key)
+            where = entry.raw_filters(events.c)
+            if only is not None:
+                where += (entry.raw_key(events.c).in_(only[dimension]),)
+            branches.append(
+                select(events.c.period, dimension_label(dimension), key, *columns)
+                .where(*where)
+                .group_by(*group_by)
+            )
+        result = await db.execute(union_all(*branches))
+
+        for r in result.all():
+            values = raw[r.period][r.dimension]
+            if not per_visitor:
+                values[r.value] = {
+                    "pageviews": r.pageviews,
+                    "unique_visitors": r.unique_visitors,
+                    "visitors_hll": None,
+                }
+                continue
+            counts = values.setdefault(
+                r.value, {"pageviews": 0, "unique_visitors": 0, "visitors_hll": HyperLogLog()}
+            )
+            counts["pageviews"] += r.pageviews
+            counts["unique_visitors"] += 1
+            counts["visitors_hll"].add(r.visitor_hash)
+        return raw
+
+    @staticmethod
+    async def breakdowns(
+        db: AsyncSession, plan: QueryPlan, dimensions=None, limit: int = 10
+    ) -> dict[str, list[dict]]:
+        """Top ``limit`` values of several dimensions, merged from aggregates and raw events.
+
+        ``dimensions`` defaults to every entry of ``app.dimensions.DIMENSIONS``. The raw
+        part (normally a single day) is grouped in full in one query; the aggregated part
+        returns each dimension's top ``limit`` plus every value seen in the raw part, also
+        in one query, which is enough to rank the merged result exactly.
+        """
+        dimensions = list(dimensions or DIMENSIONS)
+        raw = await QueryPlanner.raw_breakdowns(db, plan, dimensions)
+        aggregated = await RollupService.read_breakdowns(
+            db, plan.site_id, dimensions, plan.segments, plan.identity_window, limit,
+            include=raw,
+        )
+        return QueryPlanner.merge_breakdowns(plan, dimensions, aggregated, raw, limit)
+
+    @staticmethod
+    async def compared_breakdowns(
+        db: AsyncSession, current: QueryPlan, previous: QueryPlan, dimensions=None,
+        limit: int = 10,
+    ) -> dict[str, list[dict]]:
+        """``breakdowns`` of ``current``, each row with its ``previous`` counts.
+
+        Ranking only uses the current window. The raw days of both plans are grouped
+        in one pass with a period column, and the aggregated rows of both are one
+        conditional aggregate (see ``RollupService.read_breakdowns_compared``).
+        """
+        dimensions = list(dimensions or DIMENSIONS)
+        window = current.identity_window
+        both = QueryPlan.joined(previous, current)
+        raw = await QueryPlanner._raw_breakdowns(
+            db, both, dimensions, split_at=current.start_date
+        )
+        aggregated = await RollupService.read_breakdowns_compared(
+            db, current.site_id, dimensions, current.segments, previous.segments, window,
+            limit, include=raw["current"],
+        )
+        results = QueryPlanner.merge_breakdowns(
+            current, dimensions, aggregated["current"], raw["current"], limit
+        )
+        for dimension, rows in results.items():
+            entry = DIMENSIONS[dimension]
+            agg, fresh = aggregated["previous"][dimension], raw["previous"][dimension]
+            for row in rows:
+                value = entry.join(row)
+                counts = _merge_counts(agg.get(value, _EMPTY), fresh.get(value, _EMPTY), window)
+                row["previous"] = {
+                    "pageviews": counts["pageviews"],
+                    "unique_visitors": counts["unique_visitors"],
+                }
+        return results
+
+    @staticmethod
+    async def rank(db: AsyncSession, plan: QueryPlan, dimension: str) -> None:
+        """Materialize the aggregated pageviews per value of ``dimension`` over the plan.
+
+        The ranking is kept in ``BreakdownRanking`` under the plan's range and reused
+        while its ``BreakdownRankingBuild`` (aggregated runs and their total pageviews)
+        still matches, so only the first page of a range groups the aggregate tables.
+
+        It is built on a session of its own, leaving the request's session read-only,
+        and concurrent requests for the same ranking share one build. Rows are upserted,
+        so processes building the same ranking at once leave one complete copy.
+        """
+        session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+        coverage = plan.coverage()
+
+        async def build():
+            async with session_factory() as session:
+                await QueryPlanner._build_ranking(session, plan, dimension, coverage)
+
+        key = (plan.site_id, plan.start_date, plan.end_date, dimension, coverage)
+        await ranking_flights.do(key, build)
+
+    @staticmethod
+    async def _build_ranking(
+        db: AsyncSession, plan: QueryPlan, dimension: str, coverage: str
+    ) -> None:
+        ranking, build = BreakdownRanking, BreakdownRankingBuild
+        scope = (
+            ranking.site_id == plan.site_id,
+            ranking.start_date == plan.start_date,
+            ranking.end_date == plan.end_date,
+            ranking.dimension == dimension,
+        )
+        total = await db.scalar(
+            select(func.coalesce(func.sum(DailySiteStats.pageviews), 0)).where(
+                DailySiteStats.site_id == plan.site_id,
+                or_(*(DailySiteStats.date.between(s, e) for s, e in plan.aggregated)),
+            )
+        )
+        built = (
+            await db.execute(
+                select(build.coverage, build.pageviews).where(
+                    build.site_id == plan.site_id,
+                    build.start_date == plan.start_date,
+                    build.end_date == plan.end_date,
+                    build.dimension == dimension,
+                )
+            )
+        ).one_or_none()
+        if built is not None and tuple(built) == (coverage, total):
+            return
+
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        await db.execute(delete(ranking).where(*scope))
+        combined = RollupService._range_query(plan.site_id, [dimension], plan.segments)
+        statement = dialect.insert(ranking).from_select(
+            ["site_id", "start_date", "end_date", "dimension", "value", "pageviews"],
+            select(
+                literal(plan.site_id),
+                literal(plan.start_date),
+                literal(plan.end_date),
+                literal(dimension),
+                combined.c.value,
+                func.sum(combined.c.pageviews),
+            )
+            # SQLite needs a WHERE clause to parse INSERT ... SELECT ... ON CONFLICT
+            .where(true())
+            .group_by(combined.c.value),
+        )
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["site_id", "start_date", "end_date", "dimension", "value"],
+                set_={"pageviews": statement.excluded.pageviews},
+            )
+        )
+        statement = dialect.insert(build).values(
+            site_id=plan.site_id, start_date=plan.start_date, end_date=plan.end_date,
+            dimension=dimension, coverage=coverage, pageviews=total,
+        )
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["site_id", "start_date", "end_date", "dimension"],
+                set_={"coverage": coverage, "pageviews": total},
+            )
+        )
+        await db.commit()
+
+    @staticmethod
+    async def purge_rankings(db: AsyncSession) -> int:
+        """Drop every materialized ranking; they are rebuilt on the next page request.
+
+        Run after the nightly aggregation, which changes the aggregated days of every
+        range up to today anyway. Returns the number of rankings dropped.
+        """
+        await db.execute(delete(BreakdownRanking))
+        result = await db.execute(delete(BreakdownRankingBuild))
+        await db.commit()
+        return result.rowcount
+
+    @staticmethod
+    async def breakdown_page(
+        db: AsyncSession, plan: QueryPlan, dimension: str, limit: int = 50,
+        after: tuple[int, str] | None = None,
+    ) -> list[tuple[str, dict]]:
+        """One page of a dimension's ``(value, row)`` pairs by (pageviews desc, value).
+
+        Keyset pagination: ``after`` is the ``(pageviews, value)`` of the last row of
+        the previous page. The aggregated part is read from its ``BreakdownRanking``
+        (see ``rank``), seeking the ``(pageviews DESC, value)`` index past ``after``.
+        The raw days (normally just today) are grouped in full: their values are
+        re-ranked with their aggregated pageviews added, while every other value keeps
+        its ranked position. The counts of the page's values are then read the same
+        way as the dashboard's, so both agree.
+        """
+        entry = DIMENSIONS[dimension]
+
+        def past(pageviews: int, value: str) -> bool:
+            return after is None or (-pageviews, value) > (-after[0], after[1])
+
+        raw: dict[str, int] = {}
+        if plan.raw:
+            key = entry.raw_key()
+            result = await db.execute(
+                select(key, func.count())
+                .where(
+                    PageviewEvent.site_id == plan.site_id,
+                    plan.raw_date_filter(),
+                    *entry.raw_filters(),
+                )
+                .group_by(key)
+            )
+            raw = dict(result.all())
+
+        candidates = dict(raw)
+        if plan.segments:
+            await QueryPlanner.rank(db, plan, dimension)
+            ranking = BreakdownRanking
+            scope = (
+                ranking.site_id == plan.site_id,
+                ranking.start_date == plan.start_date,
+                ranking.end_date == plan.end_date,
+                ranking.dimension == dimension,
+            )
+            values = list(raw)
+            for i in range(0, len(values), _IN_CHUNK):
+                result = await db.execute(
+                    select(ranking.value, ranking.pageviews).where(
+                        *scope, ranking.value.in_(values[i:i + _IN_CHUNK])
+                    )
+                )
+                for value, pageviews in result.all():
+                    candidates[value] += pageviews
+
+            # Seek past ``after`` a page at a time; values with raw pageviews were
+            # re-ranked above, so their ranked rows are skipped here
+            found, cursor = 0, after
+            while found < limit:
+                query = (
+                    select(ranking.value, ranking.pageviews)
+                    .where(*scope)
+                    .order_by(ranking.pageviews.desc(), ranking.value)
+                    .limit(limit)
+                )
+                if cursor is not None:
+                    last_pageviews, last_value = cursor
+                    query = query.where(
+                        ranking.pageviews <= last_pageviews,
+                        or_(ranking.pageviews < last_pageviews, ranking.value > last_value),
+                    )
+                rows = (await db.execute(query)).all()
+                for value, pageviews in rows:
+                    if value not in raw:
+                        candidates[value] = pageviews
+                        found += 1
+                if len(rows) < limit:
+                    break
+                cursor = (rows[-1].pageviews, rows[-1].value)
+
+        ranked = sorted(
+            (item for item in candidates.items() if past(item[1], item[0])),
+            key=lambda item: (-item[1], item[0]),
+        )
+        values = [value for value, _ in ranked[:limit]]
+        if not values:
+            return []
+
+        only = {dimension: set(values)}
+        raw_counts = await QueryPlanner.raw_breakdowns(db, plan, [dimension], only=only)
+        aggregated = await RollupService.read_breakdowns(
+            db, plan.site_id, [dimension], plan.segments, plan.identity_window, 0,
+            include=only,
+        )
+        merged = QueryPlanner.merge_breakdowns(
+            plan, [dimension], aggregated, raw_counts, len(values)
+        )
+        by_key = {entry.join(row): row for row in merged[dimension]}
+        return [(value, by_key[value]) for value in values]
+
+    @staticmethod
+    def merge_breakdowns(
+        plan: QueryPlan, dimensions: list[str], aggregated: dict, raw: dict, limit: int
+    ) -> dict[str, list[dict]]:
+        """Merge per-dimension aggregated and raw counts and keep the top ``limit``."""
+        results = {}
+        for dimension in dimensions:
+            agg, fresh = aggregated[dimension], raw[dimension]
+            merged = {
+                value: _merge_counts(
+                    agg.get(value, _EMPTY), fresh.get(value, _EMPTY), plan.identity_window
+                )
+                for value in agg.keys() | fresh.keys()
+            }
+            ranked = sorted(merged.items(), key=lambda item: (-item[1]["pageviews"], item[0]))
+            results[dimension] = [
+                {
+                    **DIMENSIONS[dimension].split(value),
+                    "pageviews": counts["pageviews"],
+                    "unique_visitors": counts["unique_visitors"],
+                }
+                for value, counts in ranked[:limit]
+            ]
+        return results
+
+    @staticmethod
+    async def breakdown(
+        db: AsyncSession, plan: QueryPlan, dimension: str, limit: int = 10
+    ) -> list[dict]:
+        """Top ``limit`` values of a single dimension (see ``breakdowns``)."""
+        return (await QueryPlanner.breakdowns(db, plan, [dimension], limit))[dimension]
@@ -0,0 +1,592 @@
+"""Week, month and year rollups cascaded from the daily summary tables.
+
+Weeks (ISO, Monday-based) and months are built from the daily tables, years from the
+month rollups. Only complete periods are rolled up. Reads cover a date range with the
+coarsest periods that fit inside it exactly and fall back to daily rows for the rest.
+"""
+
+import logging
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dimensions import DIMENSIONS, dimension_label
+from app.hll import HyperLogLog, merge_sketches
+from app.models.site import Site
+from app.models.stats import DailySiteStats, RollupStats
+from app.periods import period_bounds
+
+logger = logging.getLogger(__name__)
+
+# Coarsest first: the order in which ``plan`` tries to cover a range
+TIERS = ("year", "month", "week")
+
+_INSERT_BATCH = 5000
+
+
+def _merge_visitors(rows, identity_window: str) -> tuple[int, HyperLogLog | None]:
+    """Unique visitors across rows of one key, plus their merged sketch.
+
+    With a daily identity window every day has its own visitor hashes, so the exact
+    per-day counts simply add up. Longer windows reuse hashes across days and the
+    distinct count comes from the merged sketch. Rows aggregated before sketches
+    existed have none; the merge is then skipped and counts are summed.
+    """
+    summed = sum(r.unique_visitors for r in rows)
+    if any(r.visitors_hll is None for r in rows):
+        return summed, None
+    sketch = merge_sketches(r.visitors_hll for r in rows)
+    if identity_window == "day":
+        return summed, sketch
+    return sketch.cardinality(), sketch
+
+
+def _daily_source(dimension: str):
+    """Daily table, key expression, bounces column and filters for a dimension.
+
+    ``"site"`` selects the site totals; only those carry bounces.
+    """
+    if dimension == "site":
+        return DailySiteStats, literal(""), DailySiteStats.bounces, ()
+    entry = DIMENSIONS[dimension]
+    return entry.daily_table, entry.daily_key(), literal(0), entry.daily_filters()
+
+
+class RollupService:
+    """Builds and reads the week/month/year rollup tiers."""
+
+    @staticmethod
+    def plan(
+        start_date: date, end_date: date, available: set[tuple[str, date]]
+    ) -> list[tuple[str, date, date]]:
+        """Cover ``[start_date, end_date]`` with the fewest available rollup periods.
+
+        Returns ``(granularity, start, end)`` segments in date order; days not covered
+        by an available week/month/year rollup become ``"day"`` runs.
+        """
+        segments: list[tuple[str, date, date]] = []
+        cursor = start_date
+        while cursor <= end_date:
+            for granularity in TIERS:
+                period_start, period_end = period_bounds(granularity, cursor)
+                if (
+                    period_start == cursor
+                    and period_end <= end_date
+                    and (granularity, period_start) in available
+                ):
+                    segments.append((granularity, period_start, period_end))
+                    cursor = period_end + timedelta(days=1)
+                    break
+            else:
+                previous = segments[-1] if segments else None
+                if previous and previous[0] == "day" and previous[2] == cursor - timedelta(days=1):
+                    segments[-1] = ("day", previous[1], cursor)
+                else:
+                    segments.append(("day", cursor, cursor))
+                cursor += timedelta(days=1)
+        return segments
+
+    @staticmethod
+    async def available_periods(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date
+    ) -> set[tuple[str, date]]:
+        """Rollup periods already built for a site that start inside the range."""
+        result = await db.execute(
+            select(RollupStats.granularity, RollupStats.period_start).where(
+                RollupStats.site_id == site_id,
+                RollupStats.dimension == "site",
+                RollupStats.period_start >= start_date,
+                RollupStats.period_start <= end_date,
+            )
+        )
+        return {(r.granularity, r.period_start) for r in result.all()}
+
+    # --- Building ---
+
+    @staticmethod
+    async def build_period(db: AsyncSession, granularity: str, period_start: date) -> int:
+        """(Re)build one period for every site. Returns the number of rows written.
+
+        A year is merged from its month rollups, building any month that has none yet
+        (history older than the rollups). Only sites with all 12 months get a year row:
+        ``plan`` serves the whole year from it, which must not hide days a month does
+        not cover.
+        """
+        start, end = period_bounds(granularity, period_start)
+        months = []
+        if granularity == "year":
+            months = [date(start.year, month, 1) for month in range(1, 13)]
+            built = set(
+                (
+                    await db.execute(
+                        select(RollupStats.period_start)
+                        .where(
+                            RollupStats.granularity == "month",
+                            RollupStats.period_start.in_(months),
+                        )
+                        .distinct()
+                    )
+                ).scalars()
+            )
+            for month in months:
+                if month not in built:
+                    await RollupService.build_period(db, "month", month)
+
+        await db.execute(
+            delete(RollupStats).where(
+                RollupStats.granularity == granularity, RollupStats.period_start == start
+            )
+        )
+
+        if granularity == "year":
+            complete = (
+                select(RollupStats.site_id)
+                .where(
+                    RollupStats.granularity == "month",
+                    RollupStats.dimension == "site",
+                    RollupStats.period_start.in_(months),
+                )
+                .group_by(RollupStats.site_id)
+                .having(func.count() == len(months))
+            )
+            queries = [
+                select(
+                    RollupStats.site_id,
+                    RollupStats.dimension,
+                    RollupStats.value,
+                    RollupStats.pageviews,
+                    RollupStats.unique_visitors,
+                    RollupStats.bounces,
+                    RollupStats.visitors_hll,
+                ).where(
+                    RollupStats.granularity == "month",
+                    RollupStats.period_start.in_(months),
+                    RollupStats.site_id.in_(complete),
+                )
+            ]
+        else:
+            queries = []
+            for dimension in ("site", *DIMENSIONS):
+                model, key, bounces, filters = _daily_source(dimension)
+                queries.append(
+                    select(
+                        model.site_id,
+                        dimension_label(dimension),
+                        key.label("value"),
+                        model.pageviews,
+                        model.unique_visitors,
+                        bounces.label("bounces"),
+                        model.visitors_hll,
+                    ).where(model.date >= start, model.date <= end, *filters)
+                )
+
+        windows = dict((await db.execute(select(Site.id, Site.identity_window))).all())
+        written = 0
+        for query in queries:
+            groups: dict[tuple, list] = {}
+            for r in (await db.execute(query)).all():
+                groups.setdefault((r.site_id, r.dimension, r.value), []).append(r)
+            rows = []
+            for (site_id, dimension, value), members in groups.items():
+                visitors, sketch = _merge_visitors(members, windows.get(site_id, "day"))
+                rows.append(
+                    {
+                        "site_id": site_id,
+                        "granularity": granularity,
+                        "period_start": start,
+                        "dimension": dimension,
+                        "value": value,
+                        "pageviews": sum(m.pageviews for m in members),
+                        "unique_visitors": visitors,
+                        "bounces": sum(m.bounces for m in members),
+                        "visitors_hll": sketch.to_bytes() if sketch else None,
+                    }
+                )
+            for i in range(0, len(rows), _INSERT_BATCH):
+                await db.execute(insert(RollupStats), rows[i:i + _INSERT_BATCH])
+            written += len(rows)
+        await db.commit()
+        return written
+
+    @staticmethod
+    async def cascade(db: AsyncSession, start_date: date, end_date: date) -> dict:
+        """Rebuild every complete week, month and year overlapping the range.
+
+        A period is complete once its last day is before today. Weeks and months are
+        built before years, which are summed from months.
+        """
+        last_complete = date.today() - timedelta(days=1)
+        stats = {"week": 0, "month": 0, "year": 0, "rows": 0}
+        for granularity in ("week", "month", "year"):
+            cursor, _ = period_bounds(granularity, start_date)
+            while cursor <= end_date:
+                period_start, period_end = period_bounds(granularity, cursor)
+                if period_end > last_complete:
+                    break
+                stats["rows"] += await RollupService.build_period(db, granularity, period_start)
+                stats[granularity] += 1
+                cursor = period_end + timedelta(days=1)
+        if stats["week"] or stats["month"] or stats["year"]:
+            logger.info(
+                "Rolled up %d weeks, %d months, %d years (%d rows)",
+                stats["week"], stats["month"], stats["year"], stats["rows"],
+            )
+        return stats
+
+    # --- Reading ---
+
+    @staticmethod
+    def _segment_filters(segments, day_column):
+        """Split a plan into daily-row date ranges and rollup period starts per tier."""
+        day_ranges = [
+            day_column.between(seg_start, seg_end)
+            for granularity, seg_start, seg_end in segments
+            if granularity == "day"
+        ]
+        tier_starts = {
+            granularity: [seg_start for g, seg_start, _ in segments if g == granularity]
+            for granularity in TIERS
+        }
+        return day_ranges, {g: starts for g, starts in tier_starts.items() if starts}
+
+    @staticmethod
+    def _range_query(site_id: str, dimensions, segments, values: dict | None = None):
+        """UNION ALL of daily and rollup rows of ``dimensions`` covering the planned segments.
+
+        Rows carry ``dimension``, ``value`` and their counts. ``values`` optionally limits
+        each dimension to the given keys.
+        """
+        parts = []
+        for dimension in dimensions:
+            model, key, bounces, filters = _daily_source(dimension)
+            day_ranges, _ = RollupService._segment_filters(segments, model.date)
+            if not day_ranges:
+                continue
+            conditions = [model.site_id == site_id, or_(*day_ranges), *filters]
+            if values is not None:
+                conditions.append(key.in_(values.get(dimension, ())))
+            parts.append(
+                select(
+                    dimension_label(dimension),
+                    key.label("value"),
+                    model.pageviews,
+                    model.unique_visitors,
+                    bounces.label("bounces"),
+                    model.visitors_hll,
+                ).where(*conditions)
+            )
+        _, tiers = RollupService._segment_filters(segments, RollupStats.period_start)
+        for granularity, starts in tiers.items():
+            conditions = [
+                RollupStats.site_id == site_id,
+                RollupStats.dimension.in_(list(dimensions)),
+                RollupStats.granularity == granularity,
+                RollupStats.period_start.in_(starts),
+            ]
+            if values is not None:
+                conditions.append(
+                    or_(
+                        *(
+                            and_(RollupStats.dimension == name, RollupStats.value.in_(keys))
+                            for name, keys in values.items()
+                        )
+                    )
+                )
+            parts.append(
+                select(
+                    RollupStats.dimension,
+                    RollupStats.value,
+                    RollupStats.pageviews,
+                    RollupStats.unique_visitors,
+                    RollupStats.bounces,
+                    RollupStats.visitors_hll,
+                ).where(*conditions)
+            )
+        return union_all(*parts).subquery()
+
+    @staticmethod
+    async def plan_for_site(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date
+    ) -> list[tuple[str, date, date]]:
+        available = await RollupService.available_periods(db, site_id, start_date, end_date)
+        return RollupService.plan(start_date, end_date, available)
+
+    @staticmethod
+    async def identity_window(db: AsyncSession, site_id: str) -> str:
+        site = await db.get(Site, site_id)
+        return site.identity_window if site is not None else "day"
+
+    @staticmethod
+    async def read_totals(
+        db: AsyncSession, site_id: str, segments, identity_window: str = "day"
+    ) -> dict:
+        """Site totals over planned segments, with the merged visitor sketch (or None).
+
+        ``bounces`` adds up the per-day counts, which is only meaningful for sites with a
+        daily identity window.
+        """
+        if not segments:
+            return {
+                "pageviews": 0, "unique_visitors": 0, "bounces": 0,
+                "visitors_hll": HyperLogLog(),
+            }
+        combined = RollupService._range_query(site_id, ["site"], segments)
+        rows = (await db.execute(select(combined))).all()
+        visitors, sketch = _merge_visitors(rows, identity_window)
+        return {
+            "pageviews": sum(r.pageviews for r in rows),
+            "unique_visitors": visitors,
+            "bounces": sum(r.bounces for r in rows),
+            "visitors_hll": sketch,
+        }
+
+    @staticmethod
+    async def read_breakdowns(
+        db: AsyncSession,
+        site_id: str,
+        dimensions: Iterable[str],
+        segments,
+        identity_window: str = "day",
+        limit: int = 10,
+        include: dict[str, Iterable[str]] | None = None,
+    ) -> dict[str, dict[str, dict]]:
+        """Top ``limit`` values of every dimension over planned segments, in one query.
+
+        ``include`` maps a dimension to extra values that must be returned even outside
+        its top ``limit``. Returns ``{dimension: {value: {"pageviews", "unique_visitors",
+        "visitors_hll"}}}`` with values ordered by pageviews. Sketches are only loaded for
+        weekly and monthly identity windows, where uniques cannot be added up across days.
+        """
+        dimensions = list(dimensions)
+        counts: dict[str, dict[str, dict]] = {dimension: {} for dimension in dimensions}
+        if not segments or not dimensions:
+            return counts
+        combined = RollupService._range_query(site_id, dimensions, segments)
+        pageviews = func.sum(combined.c.pageviews)
+        grouped = (
+            select(
+                combined.c.dimension,
+                combined.c.value,
+                pageviews.label("pageviews"),
+                func.sum(combined.c.unique_visitors).label("unique_visitors"),
+                func.row_number()
+                .over(
+                    partition_by=combined.c.dimension,
+                    order_by=(pageviews.desc(), combined.c.value),
+                )
+                .label("rank"),
+            )
+            .group_by(combined.c.dimension, combined.c.value)
+            .subquery()
+        )
+        extra = [
+            and_(grouped.c.dimension == dimension, grouped.c.value.in_(list(values)))
+            for dimension, values in (include or {}).items()
+            if values
+        ]
+        rows = (
+            await db.execute(
+                select(grouped)
+                .where(or_(grouped.c.rank <= limit, *extra))
+                .order_by(grouped.c.dimension, grouped.c.rank)
+            )
+        ).all()
+        for r in rows:
+            counts[r.dimension][r.value] = {
+                "pageviews": r.pageviews, "unique_visitors": r.unique_visitors,
+                "visitors_hll": None,
+            }
+
+        if identity_window != "day" and rows:
+            # Distinct visitors across days come from the merged sketches
+            sketched = RollupService._range_query(
+                site_id, dimensions, segments,
+                values={dimension: list(values) for dimension, values in counts.items()},
+            )
+            members: dict[tuple[str, str], list] = {}
+            for r in (await db.execute(select(sketched))).all():
+                members.setdefault((r.dimension, r.value), []).append(r)
+            for (dimension, value), value_rows in members.items():
+                visitors, sketch = _merge_visitors(value_rows, identity_window)
+                counts[dimension][value]["unique_visitors"] = visitors
+                counts[dimension][value]["visitors_hll"] = sketch
+        return counts
+
+    @staticmethod
+    def _tagged_range_query(
+        site_id: str, dimensions, periods: dict[str, list], values: dict | None = None
+    ):
+        """``_range_query`` over several plans in one UNION ALL, each row tagged ``period``.
+
+        ``periods`` maps a label to its planned segments. Returns None when none of
+        them has any.
+        """
+        parts = []
+        for period, segments in periods.items():
+            if not segments:
+                continue
+            rows = RollupService._range_query(site_id, dimensions, segments, values)
+            parts.append(select(literal(period).label("period"), *rows.c))
+        return union_all(*parts).subquery() if parts else None
+
+    @staticmethod
+    async def read_totals_compared(
+        db: AsyncSession, site_id: str, periods: dict[str, list], identity_window: str = "day"
+    ) -> dict[str, dict]:
+        """``read_totals`` of several labelled plans, read in one query."""
+        members: dict[str, list] = {period: [] for period in periods}
+        combined = RollupService._tagged_range_query(site_id, ["site"], periods)
+        if combined is not None:
+            for r in (await db.execute(select(combined))).all():
+                members[r.period].append(r)
+        totals = {}
+        for period, rows in members.items():
+            visitors, sketch = _merge_visitors(rows, identity_window)
+            totals[period] = {
+                "pageviews": sum(r.pageviews for r in rows),
+                "unique_visitors": visitors,
+                "bounces": sum(r.bounces for r in rows),
+                "visitors_hll": sketch if rows else HyperLogLog(),
+            }
+        return totals
+
+    @staticmethod
+    async def read_breakdowns_compared(
+        db: AsyncSession,
+        site_id: str,
+        dimensions: Iterable[str],
+        current,
+        previous,
+        identity_window: str = "day",
+        limit: int = 10,
+        include: dict[str, Iterable[str]] | None = None,
+    ) -> dict[str, dict[str, dict[str, dict]]]:
+        """``read_breakdowns`` of a current plan, with the same values' previous counts.
+
+        Both plans' rows are read in one query: each value's current and previous
+        counts are conditional sums over the tagged union, and the top ``limit`` is
+        ranked by the current pageviews alone. Returns ``{"current": counts,
+        "previous": counts}`` shaped like ``read_breakdowns``; values without current
+        pageviews only appear under ``"previous"``.
+        """
+        dimensions = list(dimensions)
+        counts: dict[str, dict[str, dict[str, dict]]] = {
+            period: {dimension: {} for dimension in dimensions}
+            for period in ("current", "previous")
+        }
+        periods = {"current": current, "previous": previous}
+        combined = (
+            RollupService._tagged_range_query(site_id, dimensions, periods)
+            if dimensions
+            else None
+        )
+        if combined is None:
+            return counts
+
+        def period_sum(period, column):
+            return func.sum(case((combined.c.period == period, column), else_=0))
+
+        pageviews = period_sum("current", combined.c.pageviews)
+        grouped = (
+            select(
+                combined.c.dimension,
+                combined.c.value,
+                pageviews.label("pageviews"),
+                period_sum("current", combined.c.unique_visitors).label("unique_visitors"),
+                period_sum("previous", combined.c.pageviews).label("previous_pageviews"),
+                period_sum("previous", combined.c.unique_visitors).label(
+                    "previous_unique_visitors"
+                ),
+                func.row_number()
+                .over(
+                    partition_by=combined.c.dimension,
+                    order_by=(pageviews.desc(), combined.c.value),
+                )
+                .label("rank"),
+            )
+            .group_by(combined.c.dimension, combined.c.value)
+            .subquery()
+        )
+        extra = [
+            and_(grouped.c.dimension == dimension, grouped.c.value.in_(list(values)))
+            for dimension, values in (include or {}).items()
+            if values
+        ]
+        rows = (
+            await db.execute(
+                select(grouped)
+                .where(or_(grouped.c.rank <= limit, *extra))
+                .order_by(grouped.c.dimension, grouped.c.rank)
+            )
+        ).all()
+        for r in rows:
+            if r.pageviews:
+                counts["current"][r.dimension][r.value] = {
+                    "pageviews": r.pageviews, "unique_visitors": r.unique_visitors,
+                    "visitors_hll": None,
+                }
+            if r.previous_pageviews:
+                counts["previous"][r.dimension][r.value] = {
+                    "pageviews": r.previous_pageviews,
+                    "unique_visitors": r.previous_unique_visitors,
+                    "visitors_hll": None,
+                }
+
+        if identity_window != "day" and rows:
+            # Distinct visitors across days come from the merged sketches
+            values: dict[str, list] = {dimension: [] for dimension in dimensions}
+            for r in rows:
+                values[r.dimension].append(r.value)
+            sketched = RollupService._tagged_range_query(
+                site_id, dimensions, periods, values=values
+            )
+            members: dict[tuple[str, str, str], list] = {}
+            for r in (await db.execute(select(sketched))).all():
+                members.setdefault((r.period, r.dimension, r.value), []).append(r)
+            for (period, dimension, value), value_rows in members.items():
+                entry = counts[period][dimension].get(value)
+                if entry is not None:
+                    visitors, sketch = _merge_visitors(value_rows, identity_window)
+                    entry["unique_visitors"] = visitors
+                    entry["visitors_hll"] = sketch
+        return counts
+
+    @staticmethod
+    async def get_totals(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date
+    ) -> dict:
+        """Pageviews and unique visitors for the range, read from rollups and daily rows.
+
+        For sites with a weekly or monthly identity window, uniques are estimated from
+        the merged visitor sketches (see ``app.hll`` for the error bound).
+        """
+        segments = await RollupService.plan_for_site(db, site_id, start_date, end_date)
+        window = await RollupService.identity_window(db, site_id)
+        totals = await RollupService.read_totals(db, site_id, segments, window)
+        return {"pageviews": totals["pageviews"], "unique_visitors": totals["unique_visitors"]}
+
+    @staticmethod
+    async def get_breakdown(
+        db: AsyncSession,
+        site_id: str,
+        dimension: str,
+        start_date: date,
+        end_date: date,
+        limit: int = 10,
+    ) -> list[dict]:
+        """Top ``limit`` values of a dimension for the range, from rollups and daily rows."""
+        segments = await RollupService.plan_for_site(db, site_id, start_date, end_date)
+        window = await RollupService.identity_window(db, site_id)
+        counts = await RollupService.read_breakdowns(
+            db, site_id, [dimension], segments, window, limit
+        )
+        return [
+            {
+                **DIMENSIONS[dimension].split(value),
+                "pageviews": c["pageviews"],
+                "unique_visitors": c["unique_visitors"],
+            }
+            for value, c in counts[dimension].items()
+        ]
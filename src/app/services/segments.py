@@ -0,0 +1,287 @@
+"""Filtered (segmented) dashboards backed by the per-day bitmap index."""
+
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import and_, case, delete, func, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import as_datetime, hour_bucket
+from app.dimensions import DIMENSIONS, dimension_label
+from app.models.event import PageviewEvent
+from app.models.stats import DailySegmentIndex
+from app.segments import BITMAP_FIELDS, FILTER_FIELDS, DayIndex, SegmentFilter
+from app.services.planner import _runs
+
+# Columns of the matched events every section is counted from
+_EVENT_COLUMNS = (*FILTER_FIELDS, "visitor_hash", "timestamp")
+
+
+def _as_date(value: date | str) -> date:
+    """Normalize a ``date()`` result (SQLite returns text) to a date."""
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+class SegmentService:
+    """Builds the per-day segment index and answers filtered dashboard queries."""
+
+    @staticmethod
+    async def build_day(db: AsyncSession, site_id: str, target_date: date) -> int:
+        """(Re)build a site-day's ``DailySegmentIndex``. Returns the events indexed."""
+        result = await db.execute(
+            select(*(getattr(PageviewEvent, field) for field in BITMAP_FIELDS))
+            .where(
+                PageviewEvent.site_id == site_id,
+                func.date(PageviewEvent.timestamp) == target_date.isoformat(),
+            )
+            .order_by(PageviewEvent.timestamp, PageviewEvent.id)
+        )
+        index = DayIndex.build(SimpleNamespace(**row._mapping) for row in result.all())
+        await db.execute(
+            delete(DailySegmentIndex).where(
+                DailySegmentIndex.site_id == site_id, DailySegmentIndex.date == target_date
+            )
+        )
+        if index.size:
+            db.add(
+                DailySegmentIndex(
+                    site_id=site_id, date=target_date, events=index.size, data=index.to_bytes()
+                )
+            )
+        await db.flush()
+        return index.size
+
+    @staticmethod
+    async def _indexes(
+        db: AsyncSession, site_id: str, start_date: date, end_date: date
+    ) -> dict[date, DayIndex]:
+        """Usable indexes of the range: a day whose events changed since its index was
+        built (or whose index predates the current format) is read raw instead."""
+        result = await db.execute(
+            select(DailySegmentIndex.date, DailySegmentIndex.events, DailySegmentIndex.data)
+            .where(
+                DailySegmentIndex.site_id == site_id,
+                DailySegmentIndex.date >= start_date,
+                DailySegmentIndex.date <= end_date,
+            )
+        )
+        stored = result.all()
+        if not stored:
+            return {}
+        day = func.date(PageviewEvent.timestamp)
+        result = await db.execute(
+            select(day, func.count())
+            .where(
+                PageviewEvent.site_id == site_id,
+                day.in_([row.date.isoformat() for row in stored]),
+            )
+            .group_by(day)
+        )
+        events = {_as_date(value): count for value, count in result.all()}
+        indexes = {}
+        for row in stored:
+            if events.get(row.date) != row.events:
+                continue
+            try:
+                indexes[row.date] = DayIndex.from_bytes(row.data)
+            except ValueError:
+                continue
+        return indexes
+
+    @staticmethod
+    def _indexed_events(site_id: str, indexes: dict[date, DayIndex], segment: SegmentFilter):
+        """Events of the indexed days matching ``segment``, or None if none can.
+
+        The day's events are numbered in SQL the way ``build_day`` ordered them, so
+        each index's bitmaps line up with the rows.
+        """
+        day = func.date(PageviewEvent.timestamp)
+        positioned = (
+            select(
+                *(getattr(PageviewEvent, column) for column in _EVENT_COLUMNS),
+                day.label("day"),
+                (
+                    func.row_number().over(
+                        partition_by=day, order_by=(PageviewEvent.timestamp, PageviewEvent.id)
+                    )
+                    - 1
+                ).label("position"),
+            )
+            .where(
+                PageviewEvent.site_id == site_id,
+                day.in_([indexed.isoformat() for indexed in indexes]),
+            )
+            .subquery("positioned")
+        )
+        clauses = []
+        for indexed, index in indexes.items():
+            clause = index.where(segment, positioned.c, positioned.c.position)
+            if clause is not None:
+                clauses.append(and_(positioned.c.day == indexed.isoformat(), clause))
+        if not clauses:
+            return None
+        return select(*(positioned.c[column] for column in _EVENT_COLUMNS)).where(
+            or_(*clauses)
+        )
+
+    @staticmethod
+    async def dashboard(
+        db: AsyncSession,
+        site_id: str,
+        start_date: date,
+        end_date: date,
+        segment: SegmentFilter,
+        granularity: str = "day",
+        limit: int | None = 10,
+    ) -> dict:
+        """Every dashboard section over the events matching ``segment``.
+
+        ``limit`` caps each breakdown (None keeps every value).
+
+        Indexed days are narrowed with their bitmaps and the remaining conditions run
+        in SQL; other days (normally just today) are filtered from raw events in SQL.
+        Every section is then counted in SQL over the matched events. ``sources`` lists
+        both kinds of date runs.
+        """
+        indexes = await SegmentService._indexes(db, site_id, start_date, end_date)
+        days = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+        raw = _runs([day for day in days if day not in indexes])
+
+        branches = []
+        if indexes:
+            indexed = SegmentService._indexed_events(site_id, indexes, segment)
+            if indexed is not None:
+                branches.append(indexed)
+        if raw:
+            branches.append(
+                select(*(getattr(PageviewEvent, column) for column in _EVENT_COLUMNS)).where(
+                    PageviewEvent.site_id == site_id,
+                    or_(
+                        *(
+                            func.date(PageviewEvent.timestamp).between(start, end)
+                            for start, end in raw
+                        )
+                    ),
+                    segment.where(),
+                )
+            )
+
+        data = await SegmentService._sections(db, branches, granularity, limit)
+        data["visitors_over_time"] = SegmentService._series(
+            data.pop("series"), start_date, end_date, granularity
+        )
+        data["sources"] = {
+            "indexed": [[s.isoformat(), e.isoformat()] for s, e in _runs(sorted(indexes))],
+            "raw": [[s.isoformat(), e.isoformat()] for s, e in raw],
+        }
+        return data
+
+    @staticmethod
+    async def _sections(db: AsyncSession, branches: list, granularity: str, limit) -> dict:
+        """Summary, bounce rate, series buckets and breakdowns of the matched events."""
+        data = {
+            "summary": {"pageviews": 0, "unique_visitors": 0},
+            "bounce_rate": 0.0,
+            "series": {},
+            "breakdowns": {name: [] for name in DIMENSIONS},
+        }
+        if not branches:
+            return data
+        events = (union_all(*branches) if len(branches) > 1 else branches[0]).cte(
+            "segment_events"
+        )
+
+        per_visitor = (
+            select(events.c.visitor_hash, func.count().label("pageviews"))
+            .group_by(events.c.visitor_hash)
+            .subquery()
+        )
+        totals = (
+            await db.execute(
+                select(
+                    func.count(),
+                    func.coalesce(func.sum(per_visitor.c.pageviews), 0),
+                    func.coalesce(func.sum(case((per_visitor.c.pageviews == 1, 1), else_=0)), 0),
+                )
+            )
+        ).one()
+        visitors, pageviews, bounces = totals
+        data["summary"] = {"pageviews": pageviews, "unique_visitors": visitors}
+        data["bounce_rate"] = round(bounces / visitors * 100, 1) if visitors else 0.0
+
+        if granularity == "hour":
+            bucket = hour_bucket(db, events.c.timestamp)
+        else:
+            bucket = func.date(events.c.timestamp)
+        result = await db.execute(
+            select(
+                bucket, func.count(), func.count(func.distinct(events.c.visitor_hash))
+            ).group_by(bucket)
+        )
+        for value, bucket_pageviews, bucket_visitors in result.all():
+            if granularity == "hour":
+                hour = as_datetime(value)
+                key = (hour.date(), hour.hour)
+            else:
+                key = _as_date(value)
+            data["series"][key] = (bucket_pageviews, bucket_visitors)
+
+        branches = []
+        for name, entry in DIMENSIONS.items():
+            key = entry.raw_key(events.c).label("value")
+            branches.append(
+                select(
+                    dimension_label(name),
+                    key,
+                    func.count().label("pageviews"),
+                    func.count(func.distinct(events.c.visitor_hash)).label("unique_visitors"),
+                )
+                .where(*entry.raw_filters(events.c))
+                .group_by(key)
+            )
+        grouped = union_all(*branches).subquery()
+        rank = (
+            func.row_number()
+            .over(
+                partition_by=grouped.c.dimension,
+                order_by=(grouped.c.pageviews.desc(), grouped.c.value),
+            )
+            .label("rank")
+        )
+        ranked = select(grouped, rank).subquery()
+        query = select(ranked).order_by(ranked.c.dimension, ranked.c.rank)
+        if limit is not None:
+            query = query.where(ranked.c.rank <= limit)
+        for row in (await db.execute(query)).all():
+            data["breakdowns"][row.dimension].append(
+                {
+                    **DIMENSIONS[row.dimension].split(row.value),
+                    "pageviews": row.pageviews,
+                    "unique_visitors": row.unique_visitors,
+                }
+            )
+        return data
+
+    @staticmethod
+    def _series(buckets: dict, start_date: date, end_date: date, granularity: str) -> list:
+        series = []
+        day = start_date
+        while day <= end_date:
+            if granularity == "hour":
+                for hour in range(24):
+                    pageviews, visitors = buckets.get((day, hour), (0, 0))
+                    series.append(
+                        {
+                            "date": day.isoformat(),
+                            "hour": datetime.combine(day, time(hour)).isoformat(),
+                            "pageviews": pageviews,
+                            "unique_visitors": visitors,
+                        }
+                    )
+            else:
+                pageviews, visitors = buckets.get(day, (0, 0))
+                series.append(
+                    {"date": day.isoformat(), "pageviews": pageviews, "unique_visitors": visitors}
+                )
+            day += timedelta(days=1)
+        return series
@@ -1,10 +1,15 @@
 from urllib.parse import urlparse
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import make_transient_to_detached
 
 from app.config import settings
 from app.models.site import Site
+from app.singleflight import SingleFlight
+
+# Concurrent lookups of the same site share one query
+site_flights = SingleFlight()
 
 
 class SiteService:
@@ -49,8 +54,27 @@ class SiteService:
 
     @staticmethod
     async def get_site(db: AsyncSession, site_id: str) -> Site | None:
-        result = await db.execute(select(Site).where(Site.id == site_id))
-        return result.scalar_one_or_none()
+        """Load a site, coalescing concurrent lookups of the same id.
+
+        The shared query runs on a session of its own, since the first caller's
+        request may be cancelled while others wait on it. It returns plain column
+        values; each caller gets its own instance attached to its own session, so the
+        result is safe to modify.
+        """
+        session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+
+        async def fetch():
+            async with session_factory() as session:
+                result = await session.execute(select(Site.__table__).where(Site.id == site_id))
+                row = result.mappings().one_or_none()
+            return dict(row) if row is not None else None
+
+        values = await site_flights.do(site_id, fetch)
+        if values is None:
+            return None
+        site = Site(**values)
+        make_transient_to_detached(site)
+        return await db.merge(site, load=False)
 
     @staticmethod
     async def get_site_by_domain(db: AsyncSession, domain: str) -> Site | None:
@@ -61,7 +85,8 @@ class SiteService:
     @staticmethod
     async def update_site(
         db: AsyncSession, site: Site, name: str | None = None,
-        domain: str | None = None, public: bool | None = None
+        domain: str | None = None, public: bool | None = None,
+        identity_window: str | None = None,
     ) -> Site:
         if name is not None:
             site.name = name
@@ -69,6 +94,8 @@ class SiteService:
             site.domain = SiteService.normalize_domain(domain)
         if public is not None:
             site.public = public
+        if identity_window is not None:
+            site.identity_window = identity_window
         await db.flush()
         await db.refresh(site)
         return site
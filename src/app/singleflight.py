@@ -0,0 +1,55 @@
+"""Coalescing of concurrent identical async calls ("single flight").
+
+While a call for a key is in flight, later callers with the same key await the same
+task instead of starting their own. The result (or exception) is shared by everyone
+waiting; the next call after it finishes starts a fresh one.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Per-key deduplication of in-flight coroutines.
+
+    The shared call runs as its own task, so a caller that is cancelled (for example
+    because its client disconnected) does not cancel it for the others. Keys are
+    scoped to the running event loop, since a task cannot be awaited from another.
+    """
+
+    def __init__(self):
+        self._calls: dict[tuple[int, Hashable], asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        task = self._calls.get(slot)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.started += 1
+        task = loop.create_task(fn())
+        self._calls[slot] = task
+
+        def done(finished: asyncio.Task) -> None:
+            if self._calls.get(slot) is finished:
+                del self._calls[slot]
+            if not finished.cancelled() and finished.exception() is not None:
+                # Retrieved here so an error nobody is left waiting for is still logged
+                logger.debug("Coalesced call %r failed", key, exc_info=finished.exception())
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {"started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,130 @@
+"""Isolated executor for background jobs that must not share the web event loop."""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import create_engine
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+
+
+class TimeBudget:
+    """Cooperative time accounting for a job running on the worker loop.
+
+    Queries execute on the database driver's own thread, which ``time.thread_time()``
+    cannot see, so the budget counts the active time of the worker loop between
+    checkpoints; pauses spent yielding are not charged. ``checkpoint()`` sleeps briefly
+    once the current slice is used up and returns False once the total is spent.
+    """
+
+    def __init__(
+        self, total_seconds: float, slice_seconds: float = 0.05, pause_seconds: float = 0.01
+    ):
+        self.total_seconds = total_seconds
+        self.slice_seconds = slice_seconds
+        self.pause_seconds = pause_seconds
+        self._used = 0.0
+        self._slice_started = time.perf_counter()
+
+    @classmethod
+    def from_settings(cls) -> "TimeBudget":
+        return cls(
+            settings.aggregation_budget_seconds,
+            settings.aggregation_slice_ms / 1000,
+        )
+
+    @property
+    def used(self) -> float:
+        return self._used + time.perf_counter() - self._slice_started
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.total_seconds
+
+    async def checkpoint(self) -> bool:
+        """Yield to other threads if this slice is spent; return False when out of budget."""
+        elapsed = time.perf_counter() - self._slice_started
+        if elapsed >= self.slice_seconds:
+            self._used += elapsed
+            await asyncio.sleep(self.pause_seconds)
+            self._slice_started = time.perf_counter()
+        else:
+            await asyncio.sleep(0)
+        return not self.exhausted
+
+
+def _lower_priority() -> None:
+    # On Linux the nice value is per thread and inherited by threads it spawns, so the
+    # database driver threads opened by jobs also yield the CPU to request handling.
+    if settings.worker_niceness <= 0 or not hasattr(os, "setpriority"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), settings.worker_niceness)
+    except OSError:
+        logger.debug("Could not lower worker thread priority", exc_info=True)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pagepulse-worker", initializer=_lower_priority
+        )
+    return _executor
+
+
+async def _run_job(
+    job: Callable[..., Awaitable[Any]], database_url: str, args: tuple, kwargs: dict
+) -> Any:
+    engine = create_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            return await job(db, *args, **kwargs)
+    finally:
+        await engine.dispose()
+
+
+def _run_in_thread(
+    job: Callable[..., Awaitable[Any]], database_url: str, args: tuple, kwargs: dict
+) -> Any:
+    return asyncio.run(_run_job(job, database_url, args, kwargs))
+
+
+async def run_isolated(
+    job: Callable[..., Awaitable[Any]],
+    *args: Any,
+    database_url: str | None = None,
+    **kwargs: Any,
+) -> Any:
+    """Run ``job(db, *args, **kwargs)`` on the worker thread and await its result.
+
+    The job gets its own event loop, engine and session, so its CPU-bound work never
+    runs on the loop serving HTTP requests. Jobs are executed one at a time.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(),
+        partial(_run_in_thread, job, database_url or settings.database_url, args, kwargs),
+    )
+
+
+def shutdown_worker() -> None:
+    """Stop accepting jobs; a job already running finishes on its own thread."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logger.info("Background worker stopped")
@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.cli import ingest_log, parse_args
+from app.models.event import PageviewEvent
+from app.models.stats import DailySiteStats
+from app.services.access_log import LogIngester, follow, parse_log_time
+from app.services.auth import AuthService
+from app.services.site import SiteService
+from tests.conftest import test_session_factory as session_factory
+
+CHROME = "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0) AppleWebKit/537.36 Chrome/120.0"
+IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1 Mobile"
+SITE = SimpleNamespace(id="site-1", domain="logs.com", identity_window="day")
+
+
+def _line(path="/", status=200, method="GET", referrer="-", agent=CHROME, ip="1.2.3.4",
+          when="10/Oct/2024:13:55:36 +0000"):
+    return (
+        f'{ip} - - [{when}] "{method} {path} HTTP/1.1" {status} 512 "{referrer}" "{agent}"\n'
+    )
+
+
+def test_parse_log_time_converts_to_utc():
+    assert parse_log_time("10/Oct/2024:13:55:36 -0700") == datetime(2024, 10, 10, 20, 55, 36)
+    assert parse_log_time("01/Jan/2025:01:00:00 +0200") == datetime(2024, 12, 31, 23, 0, 0)
+
+
+def test_parse_keeps_page_views_and_filters_the_rest():
+    ingester = LogIngester(SITE)
+    row = ingester.parse(
+        _line("/pricing?utm_source=news&x=1", referrer="https://www.google.com/", agent=IPHONE)
+    )
+    assert row["path"] == "/pricing"
+    assert row["url"] == "https://logs.com/pricing?utm_source=news&x=1"
+    assert row["referrer_domain"] == "google.com"
+    assert row["utm_source"] == "news" and row["utm_medium"] is None
+    assert (row["browser"], row["os"], row["device_type"]) == ("Safari", "iOS", "mobile")
+    assert row["timestamp"] == datetime(2024, 10, 10, 13, 55, 36)
+
+    same_visitor = ingester.parse(_line("/docs", agent=IPHONE))
+    assert same_visitor["visitor_hash"] == row["visitor_hash"]
+    assert ingester.parse(_line("/", ip="5.6.7.8"))["visitor_hash"] != row["visitor_hash"]
+    assert ingester.parse(_line("/", referrer="https://logs.com/a"))["referrer_domain"] is None
+    assert ingester.parse(_line("https://logs.com/abs?q=1"))["path"] == "/abs"
+    assert ingester.parse(_line("/v1.2/release"))["path"] == "/v1.2/release"
+    assert ingester.parse(_line("/", status=304)) is not None
+
+    common = '9.9.9.9 - - [10/Oct/2024:13:55:36 +0000] "GET /about HTTP/1.0" 200 2326\n'
+    row = ingester.parse(common)
+    assert row["path"] == "/about" and row["referrer"] is None
+
+    for line in [
+        _line("/static/app.css"),
+        _line("/logo.PNG?v=2"),
+        _line("/", status=404),
+        _line("/", status=301),
+        _line("/", method="POST"),
+        _line("/", agent="Mozilla/5.0 (compatible; Googlebot/2.1)"),
+    ]:
+        assert ingester.parse(line) is None
+    assert ingester.parse("garbage\n") is None
+    assert ingester.parse(_line(when="10/Foo/2024:13:55:36 +0000")) is None
+    assert ingester.counts["skipped"] == 6
+    assert ingester.counts["malformed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cli_loads_logs_and_aggregates_past_days(db, tmp_path):
+    user = await AuthService.create_user(db, "Test", "logs@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Logs", "logs.com")
+    await db.commit()
+    day = date.today() - timedelta(days=2)
+    when = f"{day.strftime('%d/%b/%Y')}:12:00:00 +0000"
+    (tmp_path / "access.log.1").write_text(
+        _line("/", when=when) + _line("/a.js", when=when) + _line("/b", when=when)
+    )
+    (tmp_path / "access.log.2.gz").write_bytes(
+        gzip.compress(_line("/c", ip="8.8.8.8", when=when).encode())
+    )
+
+    args = parse_args([
+        "ingest-log", str(tmp_path / "access.log.1"), str(tmp_path / "access.log.2.gz"),
+        "--site", site.id,
+    ])
+    counts = await ingest_log(args, session_factory)
+    assert counts == {"lines": 4, "pageviews": 3, "skipped": 1, "malformed": 0}
+
+    totals = (
+        await db.execute(select(DailySiteStats).where(DailySiteStats.site_id == site.id))
+    ).scalar_one()
+    assert (totals.date, totals.pageviews, totals.unique_visitors) == (day, 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_follow_tails_appends_and_rotation(db, tmp_path):
+    user = await AuthService.create_user(db, "Test", "tail@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Tail", "logs.com")
+    await db.commit()
+    log = tmp_path / "access.log"
+    log.write_text(_line("/old"))
+
+    ingester = LogIngester(site)
+
+    async def wait_for(pageviews):
+        for _ in range(200):
+            if ingester.counts["pageviews"] >= pageviews:
+                return
+            await asyncio.sleep(0.01)
+
+    stop = asyncio.Event()
+    async with session_factory() as tail_db:
+        task = asyncio.create_task(follow(tail_db, ingester, str(log), 0.01, stop=stop))
+        await asyncio.sleep(0.05)
+        with log.open("a") as handle:
+            handle.write(_line("/new"))
+            handle.write(_line("/partial")[:20])
+        await wait_for(1)
+        with log.open("a") as handle:
+            handle.write(_line("/partial")[20:])
+        await wait_for(2)
+
+        log.rename(tmp_path / "access.log.1")
+        log.write_text(_line("/rotated"))
+        await wait_for(3)
+        stop.set()
+        await task
+
+    result = await db.execute(select(PageviewEvent.path).order_by(PageviewEvent.path))
+    assert result.scalars().all() == ["/new", "/partial", "/rotated"]
@@ -1,20 +1,26 @@
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import select, update
 
+from app.hll import HyperLogLog
+from app.models.event import PageviewEvent
 from app.models.stats import (
     DailyBrowserStats,
     DailyCountryStats,
     DailyDeviceStats,
     DailyPageStats,
     DailyReferrerStats,
+    DailySiteStats,
     DailyUTMStats,
+    HourlyPageStats,
+    HourlySiteStats,
 )
 from app.services.aggregation import AggregationService
 from app.services.auth import AuthService
 from app.services.event import EventService
 from app.services.site import SiteService
+from app.worker import TimeBudget
 
 
 async def _seed_events(db):
@@ -130,6 +136,25 @@ async def test_aggregate_day_creates_page_stats(db):
     assert rows[0].unique_visitors == 3
 
 
+@pytest.mark.asyncio
+async def test_aggregate_day_stores_visitor_sketches(db):
+    user, site = await _seed_events(db)
+    today = date.today()
+    await AggregationService.aggregate_day(db, today)
+
+    totals = (
+        await db.execute(select(DailySiteStats).where(DailySiteStats.site_id == site.id))
+    ).scalar_one()
+    assert totals.pageviews == 5
+    assert totals.unique_visitors == 4
+    assert HyperLogLog.from_bytes(totals.visitors_hll).cardinality() == 4
+
+    page = (
+        await db.execute(select(DailyPageStats).where(DailyPageStats.path == "/"))
+    ).scalar_one()
+    assert HyperLogLog.from_bytes(page.visitors_hll).cardinality() == page.unique_visitors
+
+
 @pytest.mark.asyncio
 async def test_aggregate_day_creates_referrer_stats(db):
     user, site = await _seed_events(db)
@@ -268,3 +293,106 @@ async def test_backfill(db):
     today = date.today()
     stats = await AggregationService.backfill(db, today - timedelta(days=2), today)
     assert stats["days_processed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_aggregate_day_defers_sites_when_budget_spent(db):
+    """An exhausted time budget stops after the current site and reports the rest."""
+    user, site = await _seed_events(db)
+    other = await SiteService.create_site(db, user.id, "Other", "other.com")
+    await db.commit()
+    await EventService.record_event(
+        db=db, site_id=other.id, visitor_hash="o1", url="https://other.com/",
+        path="/", referrer=None, referrer_domain=None, browser="Chrome", os="Linux",
+        device_type="desktop", screen_width=1280, country_code=None, utm_source=None,
+        utm_medium=None, utm_campaign=None, utm_term=None, utm_content=None,
+    )
+    await db.commit()
+
+    stats = await AggregationService.aggregate_day(db, date.today(), TimeBudget(0))
+    assert stats["sites_processed"] == 1
+    assert stats["sites_deferred"] == 1
+
+    # Re-running without a budget picks up the deferred site
+    stats = await AggregationService.aggregate_day(db, date.today())
+    assert stats["sites_processed"] == 2
+    assert stats["sites_deferred"] == 0
+
+
+@pytest.mark.asyncio
+async def test_catch_up_aggregates_deferred_site_days(db):
+    user, site = await _seed_events(db)
+    other = await SiteService.create_site(db, user.id, "Other", "other.com")
+    await db.commit()
+    await EventService.record_event(
+        db=db, site_id=other.id, visitor_hash="o1", url="https://other.com/",
+        path="/", referrer=None, referrer_domain=None, browser="Chrome", os="Linux",
+        device_type="desktop", screen_width=1280, country_code=None, utm_source=None,
+        utm_medium=None, utm_campaign=None, utm_term=None, utm_content=None,
+    )
+    yesterday = date.today() - timedelta(days=1)
+    await db.execute(
+        update(PageviewEvent).values(timestamp=datetime.combine(yesterday, time(12)))
+    )
+    await db.commit()
+
+    stats = await AggregationService.aggregate_day(db, yesterday, TimeBudget(0))
+    assert stats["sites_deferred"] == 1
+    pending = await AggregationService.pending_site_days(db, yesterday, yesterday)
+    assert len(pending) == 1
+
+    stats = await AggregationService.catch_up(db, TimeBudget(60))
+    assert (stats["site_days"], stats["remaining"]) == (1, 0)
+    assert await AggregationService.pending_site_days(db, yesterday, yesterday) == []
+    rows = (
+        await db.execute(select(DailySiteStats).where(DailySiteStats.date == yesterday))
+    ).scalars().all()
+    assert sorted(r.pageviews for r in rows) == [1, 5]
+
+
+@pytest.mark.asyncio
+async def test_backfill_keeps_existing_rows_of_quiet_sites(db):
+    user = await AuthService.create_user(db, "Test", "quiet@test.com", "pass1234")
+    imported = await SiteService.create_site(db, user.id, "Imported", "imported.com")
+    quiet = await SiteService.create_site(db, user.id, "Quiet", "quiet.com")
+    day = date.today() - timedelta(days=10)
+    db.add(DailySiteStats(site_id=imported.id, date=day, pageviews=40, unique_visitors=12))
+    db.add(DailyPageStats(
+        site_id=imported.id, date=day, path="/", pageviews=40, unique_visitors=12
+    ))
+    await db.commit()
+
+    await AggregationService.backfill(db, day, day)
+
+    rows = (
+        await db.execute(select(DailySiteStats).where(DailySiteStats.date == day))
+    ).scalars().all()
+    assert {r.site_id: r.pageviews for r in rows} == {imported.id: 40, quiet.id: 0}
+
+
+@pytest.mark.asyncio
+async def test_aggregate_day_builds_hourly_stats(db):
+    user, site = await _seed_events(db)
+    stats = await AggregationService.aggregate_day(db, date.today())
+    assert stats["hours"] >= 1
+    assert stats["hourly_pages"] >= 3
+
+    result = await db.execute(select(HourlySiteStats).where(HourlySiteStats.site_id == site.id))
+    rows = result.scalars().all()
+    assert sum(r.pageviews for r in rows) == 5
+    assert all(r.hour.minute == 0 and r.hour.second == 0 for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_aggregate_hours_is_idempotent(db):
+    user, site = await _seed_events(db)
+    start = datetime.combine(date.today(), time())
+    end = start + timedelta(days=1)
+    await AggregationService.aggregate_hours(db, start, end)
+    stats = await AggregationService.aggregate_hours(db, start, end)
+    assert stats["sites_processed"] == 1
+
+    result = await db.execute(select(HourlyPageStats).where(HourlyPageStats.site_id == site.id))
+    rows = result.scalars().all()
+    assert sum(r.pageviews for r in rows) == 5
+    assert len(rows) == stats["hourly_pages"]
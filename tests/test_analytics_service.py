@@ -1,8 +1,12 @@
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
 
 import pytest
+from sqlalchemy import delete, event
 
-from app.services.analytics import AnalyticsService
+from app.models.event import PageviewEvent
+from app.models.stats import DailySiteStats
+from app.services.aggregation import AggregationService
+from app.services.analytics import AnalyticsService, _encode_cursor
 from app.services.auth import AuthService
 from app.services.event import EventService
 from app.services.site import SiteService
@@ -231,6 +235,25 @@ async def test_get_utm_campaigns(db):
     assert result[0]["utm_campaign"] == "launch"
 
 
+@pytest.mark.asyncio
+async def test_utm_campaigns_keep_missing_fields_null(db):
+    user, site = await _seed_data(db)
+    await EventService.record_event(
+        db=db, site_id=site.id, visitor_hash="v9", url="https://test.com/", path="/",
+        referrer=None, referrer_domain=None, browser="Chrome", os="Linux",
+        device_type="desktop", screen_width=None, country_code=None, utm_source="news",
+        utm_medium=None, utm_campaign=None, utm_term=None, utm_content=None,
+    )
+    await db.commit()
+    today = date.today()
+    raw = await AnalyticsService.get_utm_campaigns(db, site.id, today, today)
+    await AggregationService.aggregate_day(db, today)
+    aggregated = await AnalyticsService.get_utm_campaigns(db, site.id, today, today)
+    for result in (raw, aggregated):
+        [news] = [r for r in result if r["utm_source"] == "news"]
+        assert news["utm_medium"] is None and news["utm_campaign"] is None
+
+
 @pytest.mark.asyncio
 async def test_get_full_dashboard(db):
     user, site = await _seed_data(db)
@@ -261,3 +284,247 @@ async def test_get_full_dashboard_empty(db):
     assert result["summary"]["bounce_rate"] == 0.0
     assert len(result["visitors_over_time"]) == 7
     assert all(d["pageviews"] == 0 for d in result["visitors_over_time"])
+
+
+@pytest.mark.asyncio
+async def test_get_visitors_over_time_hourly_from_raw_events(db):
+    user, site = await _seed_data(db)
+    today = date.today()
+    result = await AnalyticsService.get_visitors_over_time_hourly(db, site.id, today, today)
+    assert len(result) == 24
+    assert result[0]["hour"] == f"{today.isoformat()}T00:00:00"
+    assert sum(h["pageviews"] for h in result) == 5
+
+
+@pytest.mark.asyncio
+async def test_get_visitors_over_time_hourly_uses_rollups(db):
+    user, site = await _seed_data(db)
+    today = date.today()
+    await AggregationService.aggregate_day(db, today)
+    # Once rolled up, hourly figures come from the hourly tables, not raw events
+    await db.execute(delete(PageviewEvent).where(PageviewEvent.site_id == site.id))
+    await db.commit()
+
+    result = await AnalyticsService.get_visitors_over_time_hourly(db, site.id, today, today)
+    assert sum(h["pageviews"] for h in result) == 5
+
+
+@pytest.mark.asyncio
+async def test_hourly_series_reads_missed_hours_from_raw_events(db):
+    user = await AuthService.create_user(db, "Test", "hours@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Hours", "hours.com")
+    yesterday = date.today() - timedelta(days=1)
+    two, three = datetime.combine(yesterday, time(2)), datetime.combine(yesterday, time(3))
+    for moment in (two, three):
+        db.add(PageviewEvent(
+            site_id=site.id, visitor_hash="v1", url="https://hours.com/", path="/",
+            browser="Chrome", os="Linux", device_type="desktop",
+            timestamp=moment + timedelta(minutes=30),
+        ))
+    await db.commit()
+
+    # The 02:00 run was skipped; 03:00 was rolled up
+    await AggregationService.aggregate_hours(db, three, three + timedelta(hours=1))
+    result = await AnalyticsService.get_visitors_over_time_hourly(
+        db, site.id, yesterday, yesterday
+    )
+    assert [h["pageviews"] for h in result[2:4]] == [1, 1]
+
+    # The next hourly run catches the missed hour up
+    stats = await AggregationService.aggregate_last_hour(db)
+    assert stats["hours_rolled_up"] >= 2
+    await db.execute(delete(PageviewEvent))
+    await db.commit()
+    result = await AnalyticsService.get_visitors_over_time_hourly(
+        db, site.id, yesterday, yesterday
+    )
+    assert [h["pageviews"] for h in result[2:4]] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_get_full_dashboard_hourly(db):
+    user, site = await _seed_data(db)
+    result = await AnalyticsService.get_full_dashboard(db, site.id, "7d", granularity="hour")
+    assert result["granularity"] == "hour"
+    assert len(result["visitors_over_time"]) == 7 * 24
+
+
+async def _add_delta_events(db, site, day: date, events: list[tuple[str, str]], hour: int):
+    for visitor, path in events:
+        db.add(
+            PageviewEvent(
+                site_id=site.id, visitor_hash=visitor, url=f"https://test.com{path}",
+                path=path, browser="Chrome", device_type="desktop",
+                timestamp=datetime.combine(day, time(hour)),
+            )
+        )
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_dashboard_delta_returns_only_changed_rows(db):
+    user = await AuthService.create_user(db, "Test", "delta@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Delta", "delta.com")
+    yesterday = date.today() - timedelta(days=1)
+    await _add_delta_events(db, site, yesterday, [("a", "/"), ("b", "/"), ("a", "/docs")], 9)
+    start, end = AnalyticsService._date_range("7d")
+    cursor = _encode_cursor(datetime.combine(yesterday, time(10)), start, end, "day")
+    await _add_delta_events(db, site, yesterday, [("c", "/docs")], 11)
+
+    delta = await AnalyticsService.get_dashboard_delta(db, site.id, cursor, "7d")
+    assert delta["full"] is False
+    assert delta["changed"] is True
+    assert delta["summary"]["pageviews"] == 4
+    assert delta["visitors_over_time"] == [
+        {"date": yesterday.isoformat(), "pageviews": 4, "unique_visitors": 3}
+    ]
+    # Only the touched value, with its counts over the whole range
+    assert delta["top_pages"] == [{"path": "/docs", "pageviews": 2, "unique_visitors": 2}]
+    assert delta["browsers"] == [{"browser": "Chrome", "pageviews": 4, "unique_visitors": 3}]
+    assert "top_referrers" not in delta
+
+    again = await AnalyticsService.get_dashboard_delta(db, site.id, delta["cursor"], "7d")
+    assert again["changed"] is False
+    assert "top_pages" not in again
+
+
+@pytest.mark.asyncio
+async def test_dashboard_delta_hourly_buckets(db):
+    user = await AuthService.create_user(db, "Test", "delta-hour@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Delta", "delta.com")
+    yesterday = date.today() - timedelta(days=1)
+    start, end = AnalyticsService._date_range("7d")
+    cursor = _encode_cursor(datetime.combine(yesterday, time(10)), start, end, "hour")
+    await _add_delta_events(db, site, yesterday, [("a", "/"), ("b", "/")], 11)
+
+    delta = await AnalyticsService.get_dashboard_delta(
+        db, site.id, cursor, "7d", granularity="hour"
+    )
+    assert delta["visitors_over_time"] == [
+        {
+            "date": yesterday.isoformat(),
+            "hour": datetime.combine(yesterday, time(11)).isoformat(),
+            "pageviews": 2,
+            "unique_visitors": 2,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_dashboard_delta_without_usable_cursor_is_full(db):
+    user, site = await _seed_data(db)
+    full = await AnalyticsService.get_dashboard_delta(db, site.id, None, "7d")
+    assert full["full"] is True
+    assert full["summary"]["pageviews"] == 5
+    assert full["cursor"]
+
+    assert (await AnalyticsService.get_dashboard_delta(db, site.id, "bogus", "7d"))["full"]
+    # A cursor for another range (or granularity) starts over too
+    other = await AnalyticsService.get_dashboard_delta(db, site.id, full["cursor"], "30d")
+    assert other["full"] is True
+    same = await AnalyticsService.get_dashboard_delta(db, site.id, full["cursor"], "7d")
+    assert same["full"] is False
+
+
+@pytest.mark.asyncio
+async def test_sites_overview_uses_constant_queries(db):
+    user = await AuthService.create_user(db, "Test", "overview@test.com", "pass1234")
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    sites = []
+    for n in range(5):
+        site = await SiteService.create_site(db, user.id, f"Site {n}", f"site{n}.com")
+        sites.append(site)
+        for day, visitors in ((yesterday, n + 1), (today, n)):
+            for v in range(visitors):
+                db.add(
+                    PageviewEvent(
+                        site_id=site.id, visitor_hash=f"{day}-{v}", url=f"https://site{n}.com/",
+                        path="/", timestamp=datetime.combine(day, time(12)),
+                    )
+                )
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    statements = []
+    engine = db.bind.sync_engine
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        overview = await AnalyticsService.get_sites_overview(db, user.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 3
+    by_name = {entry["name"]: entry for entry in overview["sites"]}
+    assert by_name["Site 3"]["today"] == {"pageviews": 3, "unique_visitors": 3}
+    assert by_name["Site 3"]["last_7_days"] == {"pageviews": 7, "unique_visitors": 7}
+    sparkline = by_name["Site 3"]["sparkline"]
+    assert len(sparkline) == 30
+    assert sparkline[-2:] == [4, 3]
+    assert by_name["Site 0"]["today"] == {"pageviews": 0, "unique_visitors": 0}
+
+
+@pytest.mark.asyncio
+async def test_sites_overview_reads_unaggregated_days_per_site(db):
+    user = await AuthService.create_user(db, "Test", "coverage@test.com", "pass1234")
+    yesterday = date.today() - timedelta(days=1)
+    sites = []
+    for n in range(2):
+        site = await SiteService.create_site(db, user.id, f"Site {n}", f"site{n}.com")
+        sites.append(site)
+        for v in range(2):
+            db.add(
+                PageviewEvent(
+                    site_id=site.id, visitor_hash=f"v{v}", url=f"https://site{n}.com/",
+                    path="/", timestamp=datetime.combine(yesterday, time(12)),
+                )
+            )
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+    # Site 1's yesterday was deferred: it has events but no summary row yet
+    await db.execute(delete(DailySiteStats).where(DailySiteStats.site_id == sites[1].id))
+    await db.commit()
+
+    overview = await AnalyticsService.get_sites_overview(db, user.id)
+    sparklines = {entry["name"]: entry["sparkline"] for entry in overview["sites"]}
+    assert sparklines["Site 0"][-2:] == [2, 0]
+    assert sparklines["Site 1"][-2:] == [2, 0]
+
+
+@pytest.mark.asyncio
+async def test_sites_overview_week_visitors_match_the_dashboard(db):
+    user = await AuthService.create_user(db, "Test", "week@test.com", "pass1234")
+    today = date.today()
+    sites = {}
+    for window in ("day", "month"):
+        site = await SiteService.create_site(db, user.id, window, f"{window}.com")
+        await SiteService.update_site(db, site, identity_window=window)
+        sites[window] = site
+        # Two aggregated days and today, with visitors returning across them
+        for offset, visitors in ((2, ["v0", "v1"]), (1, ["v0", "v1"]), (0, ["v0", "v2"])):
+            for visitor in visitors:
+                db.add(
+                    PageviewEvent(
+                        site_id=site.id, visitor_hash=visitor, url=f"https://{window}.com/",
+                        path="/",
+                        timestamp=datetime.combine(today - timedelta(days=offset), time(12)),
+                    )
+                )
+    await db.commit()
+    for offset in (2, 1):
+        await AggregationService.aggregate_day(db, today - timedelta(days=offset))
+
+    overview = await AnalyticsService.get_sites_overview(db, user.id)
+    week = {entry["name"]: entry["last_7_days"] for entry in overview["sites"]}
+    for window, site in sites.items():
+        summary = await AnalyticsService.get_summary(
+            db, site.id, today - timedelta(days=6), today
+        )
+        assert week[window] == summary
+    # Daily hashes never repeat across days; a monthly window counts returning visitors once
+    assert week["day"]["unique_visitors"] == 6
+    assert week["month"]["unique_visitors"] == 3
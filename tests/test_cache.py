@@ -0,0 +1,163 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+
+import pytest
+
+from app.cache import ResponseCache, response_cache
+from app.models.event import PageviewEvent
+from app.services import analytics as analytics_module
+from app.services.aggregation import AggregationService
+from app.services.analytics import AnalyticsService
+from app.services.auth import AuthService
+from app.services.site import SiteService
+
+
+def _key(site_id: str, start: date, end: date):
+    return ResponseCache.key(site_id, "custom", start, end)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, historical_ttl=60, live_ttl=60)
+    day = date(2025, 1, 1)
+    cache.set(_key("a", day, day), 1)
+    cache.set(_key("b", day, day), 2)
+    assert cache.get(_key("a", day, day)) == 1
+    cache.set(_key("c", day, day), 3)
+
+    assert cache.get(_key("b", day, day)) is None
+    assert cache.get(_key("a", day, day)) == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ranges_including_today_use_short_ttl():
+    cache = ResponseCache(historical_ttl=60, live_ttl=0.01)
+    today = date.today()
+    old = today - timedelta(days=10)
+    cache.set(_key("s", today - timedelta(days=6), today), "live")
+    cache.set(_key("s", old - timedelta(days=6), old), "historical")
+    time.sleep(0.02)
+
+    assert cache.get(_key("s", today - timedelta(days=6), today)) is None
+    assert cache.get(_key("s", old - timedelta(days=6), old)) == "historical"
+
+
+def test_invalidate_only_drops_ranges_covering_the_day():
+    cache = ResponseCache(historical_ttl=60, live_ttl=60)
+    jan, feb = date(2025, 1, 15), date(2025, 2, 15)
+    cache.set(_key("s", date(2025, 1, 1), date(2025, 1, 31)), "jan")
+    cache.set(_key("s", date(2025, 2, 1), date(2025, 2, 28)), "feb")
+    cache.set(_key("other", date(2025, 1, 1), date(2025, 1, 31)), "other")
+
+    assert cache.invalidate("s", jan) == 1
+    assert cache.get(_key("s", date(2025, 2, 1), date(2025, 2, 28))) == "feb"
+    assert cache.get(_key("other", date(2025, 1, 1), date(2025, 1, 31))) == "other"
+    assert cache.invalidate("s", feb) == 1
+
+
+def test_invalidate_covers_the_previous_window_of_comparisons():
+    cache = ResponseCache(historical_ttl=60, live_ttl=60)
+    start, end = date(2025, 2, 8), date(2025, 2, 14)
+    cache.set(ResponseCache.key("s", "custom", start, end, compare=True), "compared")
+    cache.set(_key("s", start, end), "plain")
+
+    assert cache.invalidate("s", date(2025, 2, 1)) == 1
+    assert cache.get(_key("s", start, end)) == "plain"
+
+
+def test_stats_report_hit_ratio():
+    cache = ResponseCache(historical_ttl=60, live_ttl=60)
+    day = date(2025, 1, 1)
+    cache.get(_key("s", day, day))
+    cache.set(_key("s", day, day), 1)
+    cache.get(_key("s", day, day))
+    cache.get(_key("s", day, day))
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (2, 1, 0.6667)
+
+
+@pytest.mark.asyncio
+async def test_aggregation_invalidates_cached_dashboard(db):
+    user = await AuthService.create_user(db, "Test", "cache@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Cache", "cache.com")
+    await db.commit()
+    day = date.today() - timedelta(days=3)
+    start = (day - timedelta(days=1)).isoformat()
+    end = (day + timedelta(days=1)).isoformat()
+
+    first = await AnalyticsService.get_cached_dashboard(db, site.id, "custom", start, end)
+    assert first["summary"]["pageviews"] == 0
+
+    db.add(
+        PageviewEvent(
+            site_id=site.id, visitor_hash="v1", url="https://cache.com/", path="/",
+            timestamp=datetime.combine(day, dtime(12)),
+        )
+    )
+    await db.commit()
+    cached = await AnalyticsService.get_cached_dashboard(db, site.id, "custom", start, end)
+    assert cached["summary"]["pageviews"] == 0
+
+    await AggregationService.aggregate_day(db, day)
+    fresh = await AnalyticsService.get_cached_dashboard(db, site.id, "custom", start, end)
+    assert fresh["summary"]["pageviews"] == 1
+    assert response_cache.stats()["invalidations"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_health_reports_cache_stats(client):
+    response = await client.get("/health")
+    assert "hit_ratio" in response.json()["cache"]
+
+
+def test_invalidated_entries_are_still_served_stale():
+    cache = ResponseCache(historical_ttl=60, live_ttl=60, stale_seconds=60)
+    key = _key("s", date(2025, 1, 1), date(2025, 1, 31))
+    cache.set(key, "old")
+    cache.invalidate("s")
+
+    assert cache.get(key) is None
+    assert cache.get_stale(key) == ("old", False)
+
+
+@pytest.mark.asyncio
+async def test_public_dashboard_serves_stale_and_refreshes_in_background(db):
+    user = await AuthService.create_user(db, "Test", "swr@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "SWR", "swr.com")
+    await SiteService.update_site(db, site, public=True)
+    await db.commit()
+
+    first = await AnalyticsService.get_public_dashboard(db, site.id, "today")
+    assert first["summary"]["pageviews"] == 0
+
+    db.add(
+        PageviewEvent(
+            site_id=site.id, visitor_hash="v1", url="https://swr.com/", path="/",
+            timestamp=datetime.combine(date.today(), dtime(0)),
+        )
+    )
+    await db.commit()
+    response_cache.invalidate(site.id)
+
+    stale = await AnalyticsService.get_public_dashboard(db, site.id, "today")
+    assert stale["summary"]["pageviews"] == 0
+    await asyncio.gather(*analytics_module._revalidations)
+
+    fresh = await AnalyticsService.get_public_dashboard(db, site.id, "today")
+    assert fresh["summary"]["pageviews"] == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_public_dashboards_caches_default_periods(db):
+    user = await AuthService.create_user(db, "Test", "warm@test.com", "pass1234")
+    public = await SiteService.create_site(db, user.id, "Public", "public.com")
+    private = await SiteService.create_site(db, user.id, "Private", "private.com")
+    await SiteService.update_site(db, public, public=True)
+    await db.commit()
+
+    assert await AnalyticsService.warm_public_dashboards(db) == 3
+    start, end = AnalyticsService._date_range("30d")
+    assert response_cache.get(ResponseCache.key(public.id, "30d", start, end)) is not None
+    assert response_cache.get(ResponseCache.key(private.id, "30d", start, end)) is None
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from app.cache import ResponseCache
+from app.cluster import ClusterSync
+from app.live import LivePublisher
+from app.realtime import RealtimeStore
+from tests.conftest import test_session_factory as session_factory
+
+DAY = date(2024, 3, 10)
+
+
+def _process(holder_id):
+    """One worker's in-memory state and its cluster sync."""
+    store = RealtimeStore(window_minutes=30, top_capacity=10)
+    return ClusterSync(
+        holder_id=holder_id,
+        session_factory=session_factory,
+        cache=ResponseCache(max_entries=10, historical_ttl=3600, live_ttl=30),
+        store=store,
+        publisher=LivePublisher(store=store, interval=60),
+    )
+
+
+@pytest.mark.asyncio
+async def test_invalidation_in_one_process_reaches_the_others():
+    leader, worker = _process("leader"), _process("worker")
+    await leader.start()
+    await worker.start()
+    key = ResponseCache.key("site-1", "7d", DAY, DAY)
+    leader.cache.set(key, {"pageviews": 1})
+    worker.cache.set(key, {"pageviews": 1})
+
+    # Aggregation runs in the leader
+    leader.cache.invalidate("site-1", DAY)
+    assert worker.cache.get(key) is not None
+
+    await leader.sync()
+    await worker.sync()
+    assert worker.cache.get(key) is None
+    assert worker.invalidations_replayed == 1
+
+    # Replayed invalidations are not sent back
+    await worker.sync()
+    await leader.sync()
+    assert leader.invalidations_replayed == 0
+
+
+@pytest.mark.asyncio
+async def test_realtime_counters_merge_every_processes_traffic():
+    a, b = _process("a"), _process("b")
+    for i in range(30):
+        a.store.record("site-1", f"visitor-{i}", "/a")
+    for i in range(20, 60):
+        b.store.record("site-1", f"visitor-{i}", "/b")
+
+    for process in (a, b, a):
+        await process.sync()
+
+    for process in (a, b):
+        summary = process.store.summary("site-1")
+        assert summary["pageviews"] == 70
+        assert 55 <= summary["visitors"] <= 65
+        assert {row["path"] for row in summary["top_paths"]} == {"/a", "/b"}
+
+    # A changed bucket replaces its earlier copy instead of adding to it
+    b.store.record("site-1", "visitor-0", "/b")
+    await b.sync()
+    await a.sync()
+    assert a.store.summary("site-1")["pageviews"] == 71
+
+
+@pytest.mark.asyncio
+async def test_live_streams_hear_of_other_processes_pageviews():
+    a, b = _process("a"), _process("b")
+    queue = b.publisher.subscribe("site-1")
+    try:
+        for i in range(3):
+            a.store.record("site-1", f"visitor-{i}", "/")
+        await a.sync()
+        await b.sync()
+
+        update = b.publisher.update("site-1")
+        assert update["pageviews"] == 3
+        assert update["top_pages"] == [{"path": "/", "pageviews": 3}]
+    finally:
+        b.publisher.unsubscribe("site-1", queue)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_a_stopped_process_withdraws_its_counters():
+    a, b = _process("a"), _process("b")
+    a.store.record("site-1", "visitor", "/")
+    await a.sync()
+    await b.sync()
+    assert b.store.summary("site-1")["pageviews"] == 1
+
+    # Its snapshot carries the counters to the next process, which publishes them again
+    await a.stop()
+    await b.sync()
+    assert b.store.summary("site-1")["pageviews"] == 0
@@ -75,6 +75,15 @@ async def test_dashboard_page_date_periods(auth_client):
         assert resp.status_code == 200
 
 
+@pytest.mark.asyncio
+async def test_dashboard_page_hourly_chart(auth_client):
+    site_id = await _create_site(auth_client)
+    resp = await auth_client.get(f"/dashboard/{site_id}?period=today&granularity=hour")
+    assert resp.status_code == 200
+    assert "T23:00:00" in resp.text
+    assert "Hourly" in resp.text
+
+
 @pytest.mark.asyncio
 async def test_dashboard_page_custom_period(auth_client):
     site_id = await _create_site(auth_client)
@@ -218,6 +227,49 @@ async def test_analytics_api_endpoint(auth_client, client):
     assert data["summary"]["pageviews"] >= 1
 
 
+@pytest.mark.asyncio
+async def test_analytics_api_hourly_granularity(auth_client, client):
+    site_id = await _create_site(auth_client)
+    await _ingest_event(client, site_id, "/")
+
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/analytics?period=today&granularity=hour"
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["granularity"] == "hour"
+    assert len(data["visitors_over_time"]) == 24
+    assert sum(h["pageviews"] for h in data["visitors_over_time"]) == 1
+
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/analytics?granularity=minute")
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_analytics_api_compare(auth_client, client):
+    site_id = await _create_site(auth_client)
+    await _ingest_event(client, site_id, "/")
+    await _ingest_event(client, site_id, "/docs")
+
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/analytics", params={"period": "today", "compare": "true"}
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["compare"]["end_date"] < data["start_date"]
+    summary = data["summary"]
+    assert summary["previous"] == {"pageviews": 0, "unique_visitors": 0, "bounce_rate": 0.0}
+    assert summary["delta"]["pageviews"] == 2
+    assert summary["percent"]["pageviews"] is None
+    assert data["visitors_over_time"][0]["previous"]["date"] == data["compare"]["start_date"]
+    assert data["top_pages"][0]["previous"] == {"pageviews": 0, "unique_visitors": 0}
+    assert data["top_pages"][0]["delta"] == {"pageviews": 1, "unique_visitors": 1}
+
+    page = await auth_client.get(f"/dashboard/{site_id}?period=today&compare=true")
+    assert page.status_code == 200
+    assert "vs previous period" in page.text
+
+
 @pytest.mark.asyncio
 async def test_analytics_api_requires_auth(client):
     resp = await client.get("/api/v1/sites/someid/analytics")
@@ -230,6 +282,58 @@ async def test_analytics_api_wrong_site(auth_client):
     assert resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_analytics_delta_api(auth_client, client):
+    site_id = await _create_site(auth_client)
+    await _ingest_event(client, site_id, "/hello")
+
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/analytics/delta?period=7d")
+    assert resp.status_code == 200
+    first = resp.json()
+    assert first["full"] is True
+    assert first["summary"]["pageviews"] == 1
+
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/analytics/delta",
+        params={"period": "7d", "cursor": first["cursor"]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["full"] is False
+
+
+@pytest.mark.asyncio
+async def test_analytics_delta_api_wrong_site(auth_client):
+    resp = await auth_client.get("/api/v1/sites/nonexistent/analytics/delta")
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_breakdown_page_api(auth_client, client):
+    site_id = await _create_site(auth_client)
+    for path in ["/a", "/a", "/b", "/c"]:
+        await _ingest_event(client, site_id, path)
+
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/breakdowns/path?limit=2")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [row["path"] for row in data["rows"]] == ["/a", "/b"]
+
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/breakdowns/path", params={"limit": 2, "after": data["next"]}
+    )
+    assert [row["path"] for row in resp.json()["rows"]] == ["/c"]
+    assert resp.json()["next"] is None
+
+
+@pytest.mark.asyncio
+async def test_breakdown_page_api_errors(auth_client):
+    site_id = await _create_site(auth_client)
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/breakdowns/nope")
+    assert resp.status_code == 404
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/breakdowns/path?after=%%%")
+    assert resp.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_public_analytics_api_endpoint(auth_client, client):
     site_id = await _create_site(auth_client)
@@ -1,5 +1,8 @@
+from datetime import date
+
 import pytest
 
+from app.services import event as event_module
 from app.services.event import EventService
 
 
@@ -27,6 +30,24 @@ def test_visitor_hash_different_ua():
     assert h1 != h2
 
 
+def _hash_on(monkeypatch, day: date, identity_window: str) -> str:
+    class FixedDate(date):
+        @classmethod
+        def today(cls):
+            return day
+
+    monkeypatch.setattr(event_module, "date", FixedDate)
+    return EventService.compute_visitor_hash("site1", "1.2.3.4", "UA", identity_window)
+
+
+def test_visitor_hash_rotates_with_identity_window(monkeypatch):
+    monday, sunday, next_monday = date(2024, 3, 4), date(2024, 3, 10), date(2024, 3, 11)
+    assert _hash_on(monkeypatch, monday, "day") != _hash_on(monkeypatch, sunday, "day")
+    assert _hash_on(monkeypatch, monday, "week") == _hash_on(monkeypatch, sunday, "week")
+    assert _hash_on(monkeypatch, sunday, "week") != _hash_on(monkeypatch, next_monday, "week")
+    assert _hash_on(monkeypatch, monday, "month") == _hash_on(monkeypatch, next_monday, "month")
+
+
 def test_visitor_hash_is_sha256():
     h = EventService.compute_visitor_hash("site1", "1.2.3.4", "UA")
     assert len(h) == 64
@@ -0,0 +1,131 @@
+import csv
+import gzip
+import io
+import json
+from argparse import Namespace
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from app.cli import export
+from app.config import settings
+from app.models.event import PageviewEvent
+from app.services.aggregation import AggregationService
+from app.services.auth import AuthService
+from app.services.export import ExportStream
+from app.services.site import SiteService
+from tests.conftest import test_session_factory as session_factory
+
+DAY = date.today() - timedelta(days=1)
+
+
+async def _seed(db, events=5):
+    user = await AuthService.create_user(db, "Test", "export@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Export", "export.com")
+    for n in range(events):
+        db.add(
+            PageviewEvent(
+                site_id=site.id, visitor_hash=f"v{n}", path=f"/p{n % 2}",
+                url=f"https://export.com/p{n % 2}", referrer_domain="google.com",
+                timestamp=datetime.combine(DAY, time(12, n)),
+            )
+        )
+    await db.commit()
+    return site
+
+
+async def _collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+@pytest.mark.asyncio
+async def test_csv_export_in_small_chunks_resumes_after_cursor(db, monkeypatch):
+    monkeypatch.setattr(settings, "export_batch_rows", 2)
+    monkeypatch.setattr(settings, "export_chunk_bytes", 1)
+    site = await _seed(db)
+
+    stream = ExportStream(db, "pageview_events", DAY, DAY, site_id=site.id)
+    chunks = [chunk async for chunk in stream]
+    assert len(chunks) == 5  # one row per chunk, the header with the first
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert [row["visitor_hash"] for row in rows] == ["v0", "v1", "v2", "v3", "v4"]
+    assert "visitors_hll" not in rows[0]
+    assert stream.rows == 5
+    assert stream.cursor == f"{rows[-1]['timestamp']},{rows[-1]['id']}"
+
+    after = f"{rows[1]['timestamp']},{rows[1]['id']}"
+    rest = await _collect(ExportStream(db, "pageview_events", DAY, DAY, after=after))
+    lines = list(csv.reader(io.StringIO(rest.decode())))
+    assert [line[0] for line in lines] == [row["id"] for row in rows[2:]]
+
+
+@pytest.mark.asyncio
+async def test_gzipped_ndjson_export_of_daily_table(db):
+    site = await _seed(db)
+    await AggregationService.aggregate_day(db, DAY)
+
+    body = await _collect(
+        ExportStream(db, "daily_page_stats", DAY, DAY, "ndjson", site.id, compress=True)
+    )
+    rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+    assert sorted((row["path"], row["pageviews"]) for row in rows) == [("/p0", 3), ("/p1", 2)]
+    assert all(row["date"] == DAY.isoformat() for row in rows)
+
+
+def test_invalid_arguments_are_rejected_before_streaming():
+    for args in [("colours", "csv", None), ("pageview_events", "xml", None),
+                 ("pageview_events", "csv", "not-a-cursor")]:
+        table, fmt, after = args
+        with pytest.raises(ValueError):
+            ExportStream(None, table, DAY, DAY, fmt, after=after)
+
+
+@pytest.mark.asyncio
+async def test_export_api_streams_gzip(auth_client, client):
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Exp", "domain": "exp.com"})
+    site_id = resp.json()["id"]
+    event = {
+        "s": site_id, "u": "https://exp.com/", "p": "/", "r": "", "sw": 0,
+        "us": "", "um": "", "uc": "", "ut": "", "ux": "",
+    }
+    await client.post("/api/v1/event", json=event)
+    today = date.today().isoformat()
+    url = f"/api/v1/sites/{site_id}/export/pageview_events"
+
+    resp = await auth_client.get(
+        url, params={"start": today, "end": today}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert [row["path"] for row in rows] == ["/"]
+
+    resp = await auth_client.get(url, params={"start": today, "end": today, "after": "x"})
+    assert resp.status_code == 400
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/export/users", params={"start": today, "end": today}
+    )
+    assert resp.status_code == 400
+    resp = await auth_client.get(
+        "/api/v1/sites/missing/export/pageview_events", params={"start": today, "end": today}
+    )
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cli_export_appends_when_resuming(db, tmp_path):
+    await _seed(db, events=3)
+    output = tmp_path / "events.ndjson"
+    args = Namespace(
+        table="pageview_events", start=DAY, end=DAY, site=None, format="ndjson",
+        gzip=False, after=None, output=str(output),
+    )
+    assert await export(args, session_factory) == 3
+    first = [json.loads(line) for line in output.read_text().splitlines()]
+
+    output.write_text("\n".join(json.dumps(row) for row in first[:1]) + "\n")
+    args.after = f"{first[0]['timestamp']},{first[0]['id']}"
+    assert await export(args, session_factory) == 2
+    resumed = [json.loads(line) for line in output.read_text().splitlines()]
+    assert resumed == first
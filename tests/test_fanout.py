@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import create_engine
+from app.fanout import gather_sections, supports_concurrent_sessions
+from app.services.analytics import AnalyticsService
+from tests.conftest import test_engine
+
+
+@pytest.fixture
+async def file_db(tmp_path):
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/fanout.db")
+    async with async_sessionmaker(engine, class_=AsyncSession)() as session:
+        yield session
+    await engine.dispose()
+
+
+def test_in_memory_engine_shares_one_connection():
+    assert not supports_concurrent_sessions(test_engine)
+
+
+@pytest.mark.asyncio
+async def test_sections_run_concurrently_on_separate_sessions(file_db):
+    running = 0
+    peak = 0
+    shared = []
+
+    async def section(session):
+        nonlocal running, peak
+        shared.append(session is file_db)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return (await session.execute(text("SELECT 1"))).scalar()
+
+    results, errors = await gather_sections(
+        file_db, {f"s{i}": section for i in range(6)}, {}, max_concurrency=3, timeout=5
+    )
+    assert results == {f"s{i}": 1 for i in range(6)}
+    assert errors == {}
+    assert peak == 3
+    assert shared == [False] * 6
+
+
+@pytest.mark.asyncio
+async def test_failing_and_slow_sections_fall_back_to_defaults(file_db):
+    async def ok(session):
+        return "ok"
+
+    async def slow(session):
+        await asyncio.sleep(1)
+
+    async def broken(session):
+        raise RuntimeError("boom")
+
+    results, errors = await gather_sections(
+        file_db,
+        {"ok": ok, "slow": slow, "broken": broken},
+        {"slow": [], "broken": 0},
+        timeout=0.05,
+    )
+    assert results == {"ok": "ok", "slow": [], "broken": 0}
+    assert errors == {"slow": "timeout", "broken": "error"}
+
+
+@pytest.mark.asyncio
+async def test_full_dashboard_isolates_failed_section(db, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(AnalyticsService, "get_breakdowns", broken)
+    data = await AnalyticsService.get_full_dashboard(db, "missing-site", "7d")
+    assert data["browsers"] == []
+    assert data["operating_systems"] == []
+    assert data["degraded"]["browsers"] == "error"
+    assert "summary" not in data["degraded"]
+    assert len(data["visitors_over_time"]) == 7
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import select
+
+from app.cli import geoip_build, parse_args
+from app.geoip import GeoIPResolver, GeoIPTable, build_table, geoip
+from app.models.event import PageviewEvent
+
+SOURCE = """start_ip,end_ip,country
+1.0.0.0,1.0.0.255,AU
+1.0.1.0,1.0.3.255,CN
+1.0.4.0,1.0.7.255,CN
+16779264,16780287,AU
+8.8.8.0,8.8.8.255,us
+9.0.0.0,9.0.0.255,ZZ
+10.0.0.0,oops,DE
+2001:200::,2001:200:ffff:ffff:ffff:ffff:ffff:ffff,JP
+2a00:1450::,2a00:1450:ffff:ffff:ffff:ffff:ffff:ffff,IE
+"""
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    source = tmp_path / "ranges.csv"
+    source.write_text(SOURCE)
+    path = tmp_path / "geoip.bin"
+    counts = build_table(str(source), str(path))
+    # The two CN rows are merged; the header, ZZ and "oops" rows are skipped
+    assert counts == {"ipv4": 4, "ipv6": 2, "skipped": 3}
+    return str(path)
+
+
+def test_lookup_binary_searches_the_mapped_ranges(table_path):
+    table = GeoIPTable(table_path)
+    try:
+        assert table.ranges == 6
+        assert table.lookup("1.0.0.0") == "AU"
+        assert table.lookup("1.0.2.17") == "CN"
+        assert table.lookup("1.0.7.255") == "CN"
+        assert table.lookup("1.0.8.0") == "AU"  # from the integer row
+        assert table.lookup("8.8.8.8") == "US"
+        assert table.lookup("0.255.255.255") is None
+        assert table.lookup("1.0.12.0") is None
+        assert table.lookup("255.255.255.255") is None
+        assert table.lookup("2001:200:1::1") == "JP"
+        assert table.lookup("2a00:1450:4001::200e") == "IE"
+        assert table.lookup("::ffff:8.8.8.4") == "US"
+        assert table.lookup("2001:db8::1") is None
+        assert table.lookup("not-an-ip") is None
+    finally:
+        table.close()
+
+
+def test_resolver_caches_and_degrades_without_a_table(table_path, tmp_path):
+    resolver = GeoIPResolver(cache_size=16)
+    assert resolver.country("8.8.8.8") is None
+
+    assert resolver.load(table_path)
+    assert resolver.country("8.8.8.8") == "US"
+    assert resolver.country("8.8.8.8") == "US"
+    assert resolver._cached.cache_info().hits == 1
+    assert resolver.country(None) is None
+
+    garbage = tmp_path / "garbage.bin"
+    garbage.write_bytes(b"not a table at all")
+    assert not resolver.load(str(garbage))
+    assert not resolver.load(str(tmp_path / "missing.bin"))
+    assert resolver.country("8.8.8.8") is None
+
+
+@pytest.mark.asyncio
+async def test_cli_build_and_ingest_resolves_country(auth_client, client, db, tmp_path):
+    source = tmp_path / "ranges.csv"
+    source.write_text(SOURCE)
+    path = str(tmp_path / "cli.bin")
+    counts = await geoip_build(parse_args(["geoip-build", str(source), "-o", path]))
+    assert counts["ipv4"] == 4
+
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Geo", "domain": "geo.com"})
+    site_id = resp.json()["id"]
+    assert geoip.load(path)
+    try:
+        for ip, headers in [("8.8.8.8", {}), ("1.0.2.1", {"CF-IPCountry": "fr"})]:
+            resp = await client.post(
+                "/api/v1/event",
+                json={"s": site_id, "u": "https://geo.com/", "p": "/"},
+                headers={"X-Forwarded-For": ip, **headers},
+            )
+            assert resp.status_code == 202
+    finally:
+        geoip.close()
+
+    countries = (await db.execute(select(PageviewEvent.country_code))).scalars().all()
+    # The CDN header wins over the table
+    assert sorted(countries) == ["FR", "US"]
@@ -0,0 +1,38 @@
+from app.hll import REGISTERS, STANDARD_ERROR, HyperLogLog, merge_sketches
+
+
+def test_empty_sketch():
+    assert HyperLogLog().cardinality() == 0
+    assert merge_sketches([None, b""]).cardinality() == 0
+
+
+def test_small_cardinalities_are_near_exact():
+    sketch = HyperLogLog.from_hashes(f"v{i}" for i in range(50))
+    estimate = sketch.cardinality()
+    assert abs(estimate - 50) <= 1
+    # Duplicates don't change the estimate
+    sketch.add("v1")
+    assert sketch.cardinality() == estimate
+
+
+def test_large_cardinality_within_error_bound():
+    n = 50_000
+    sketch = HyperLogLog.from_hashes(f"visitor-{i}" for i in range(n))
+    assert abs(sketch.cardinality() - n) / n < 3 * STANDARD_ERROR
+
+
+def test_merge_is_union():
+    a = HyperLogLog.from_hashes(f"v{i}" for i in range(0, 600))
+    b = HyperLogLog.from_hashes(f"v{i}" for i in range(300, 900))
+    merged = merge_sketches([a.to_bytes(), b.to_bytes()])
+    assert abs(merged.cardinality() - 900) / 900 < 3 * STANDARD_ERROR
+
+
+def test_serialization_roundtrip():
+    sparse = HyperLogLog.from_hashes(f"v{i}" for i in range(20))
+    dense = HyperLogLog.from_hashes(f"v{i}" for i in range(20_000))
+    assert len(sparse.to_bytes()) < 100
+    assert len(dense.to_bytes()) <= REGISTERS + 3
+    for sketch in (sparse, dense):
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        assert restored.registers == sketch.registers
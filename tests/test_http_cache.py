@@ -0,0 +1,119 @@
+import gzip
+from datetime import date
+
+import pytest
+
+from app.cache import ResponseCache, response_cache
+from app.config import settings
+from app.http_cache import Representation, choose_encoding, not_modified
+
+
+def test_choose_encoding_respects_threshold_and_quality(monkeypatch):
+    monkeypatch.setattr(settings, "http_compression_min_bytes", 100)
+    assert choose_encoding("gzip, deflate", 99) is None
+    assert choose_encoding("gzip, deflate", 100) == "gzip"
+    assert choose_encoding("gzip;q=0, identity", 500) is None
+    assert choose_encoding("*", 500) in ("br", "gzip")
+    assert choose_encoding(None, 500) is None
+
+
+def test_not_modified_matches_any_coding_of_the_etag():
+    representation = Representation.json({"a": 1})
+    etag = representation.etag
+    assert not_modified(f'"{etag}"', etag)
+    assert not_modified(f'W/"{etag}-gzip"', etag)
+    assert not_modified(f'"other", "{etag}-br"', etag)
+    assert not_modified("*", etag)
+    assert not not_modified('"other"', etag)
+    assert not not_modified(None, etag)
+
+
+def test_representation_is_stable_and_compresses_once():
+    first = Representation.json({"pageviews": 3, "path": "/"})
+    second = Representation.json({"pageviews": 3, "path": "/"})
+    assert first.etag == second.etag
+    assert first.etag != Representation.json({"pageviews": 4, "path": "/"}).etag
+
+    compressed = first.encoded("gzip")
+    assert gzip.decompress(compressed) == first.body
+    assert first.encoded("gzip") is compressed
+
+
+def test_etag_ignores_the_delta_cursor():
+    first = Representation.json({"pageviews": 3, "cursor": "earlier"})
+    second = Representation.json({"pageviews": 3, "cursor": "later"})
+    assert first.body != second.body
+    assert first.etag == second.etag
+    assert first.etag != Representation.json({"pageviews": 4, "cursor": "later"}).etag
+
+
+def test_attachments_live_and_die_with_the_entry():
+    cache = ResponseCache(historical_ttl=60, live_ttl=60)
+    key = ResponseCache.key("s", "custom", date(2025, 1, 1), date(2025, 1, 7))
+    value = {"summary": 1}
+    cache.set(key, value)
+    built = []
+
+    def build():
+        built.append(1)
+        return Representation.json(value)
+
+    first = cache.attachment(key, value, "json", build)
+    assert cache.attachment(key, value, "json", build) is first
+    assert len(built) == 1
+
+    cache.set(key, {"summary": 2})
+    cache.attachment(key, value, "json", build)
+    assert len(built) == 2
+
+
+@pytest.mark.asyncio
+async def test_private_analytics_revalidates_with_etag(auth_client, client, monkeypatch):
+    monkeypatch.setattr(settings, "http_compression_min_bytes", 1)
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Etag", "domain": "etag.com"})
+    site_id = resp.json()["id"]
+    url = f"/api/v1/sites/{site_id}/analytics?period=today"
+
+    resp = await auth_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"] == "private, no-cache"
+    assert "Cookie" in resp.headers["vary"]
+    assert resp.json()["site"]["id"] == site_id
+    etag = resp.headers["etag"]
+
+    resp = await auth_client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+    # A recomputation with a newer delta cursor but the same data still revalidates
+    response_cache.clear()
+    resp = await auth_client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    event = {
+        "s": site_id, "u": "https://etag.com/", "p": "/", "r": "", "sw": 0,
+        "us": "", "um": "", "uc": "", "ut": "", "ux": "",
+    }
+    await client.post("/api/v1/event", json=event)
+    response_cache.clear()
+    resp = await auth_client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["summary"]["pageviews"] == 1
+
+
+@pytest.mark.asyncio
+async def test_share_page_is_publicly_cacheable(auth_client, client):
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Shared", "domain": "sh.com"})
+    site_id = resp.json()["id"]
+    await auth_client.patch(f"/api/v1/sites/{site_id}", json={"public": True})
+
+    resp = await client.get(f"/share/{site_id}")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "public, max-age=60"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert "Cookie" not in resp.headers["vary"]
+    assert "Shared" in resp.text
+
+    again = await client.get(f"/share/{site_id}", headers={"If-None-Match": resp.headers["etag"]})
+    assert again.status_code == 304
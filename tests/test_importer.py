@@ -0,0 +1,219 @@
+import gzip
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.cli import import_csv, parse_args
+from app.config import settings
+from app.models.event import PageviewEvent
+from app.models.stats import DailyPageStats, DailySiteStats
+from app.services.analytics import AnalyticsService
+from app.services.auth import AuthService
+from app.services.event import EventService
+from app.services.importer import ImportService
+from app.services.planner import QueryPlanner
+from app.services.site import SiteService
+from tests.conftest import test_session_factory as session_factory
+
+DAY = date.today() - timedelta(days=3)
+CHROME = "Mozilla/5.0 (Windows NT 10.0) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+HITS = f"""\ufeffDate,Page,Referrer,Visitor,User Agent
+{DAY}T10:00:00Z,/,https://www.google.com/search,a,{CHROME}
+{DAY}T10:05:00Z,/pricing,,a,{CHROME}
+{DAY}T11:00:00+02:00,/,,b,{CHROME}
+not-a-date,/,,c,{CHROME}
+{DAY}T12:00:00Z,"/quoted,path",,c,{CHROME}
+"""
+MAPPING = {"timestamp": "Date", "path": "Page", "visitor": "Visitor"}
+
+
+async def _site(db):
+    user = await AuthService.create_user(db, "Test", "import@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Import", "import.com")
+    await db.commit()
+    return site
+
+
+@pytest.mark.asyncio
+async def test_hits_import_maps_enriches_and_aggregates(db, tmp_path):
+    site = await _site(db)
+    path = tmp_path / "hits.csv"
+    path.write_text(HITS)
+
+    job = await ImportService.create_job(db, site.id, "pageview_events", str(path), MAPPING)
+    job = await ImportService.run(db, job.id)
+    assert (job.status, job.rows, job.skipped) == ("done", 4, 1)
+    assert job.offset == job.size == path.stat().st_size
+    assert job.first_date == job.last_date == DAY
+
+    events = (
+        await db.execute(select(PageviewEvent).order_by(PageviewEvent.timestamp))
+    ).scalars().all()
+    # 11:00+02:00 is stored as 09:00 UTC, before the others
+    assert [e.path for e in events] == ["/", "/", "/pricing", "/quoted,path"]
+    assert events[0].timestamp.hour == 9
+    assert events[1].referrer_domain == "google.com"
+    assert events[1].url == "https://import.com/"
+    assert {e.browser for e in events} == {"Chrome"}
+    assert events[1].visitor_hash == events[2].visitor_hash != events[0].visitor_hash
+
+    totals = (
+        await db.execute(select(DailySiteStats).where(DailySiteStats.site_id == site.id))
+    ).scalar_one()
+    assert (totals.date, totals.pageviews, totals.unique_visitors) == (DAY, 4, 3)
+
+
+@pytest.mark.asyncio
+async def test_hits_without_visitor_are_hashed_like_live_ingestion(db, tmp_path):
+    site = await _site(db)
+    path = tmp_path / "hits.csv"
+    path.write_text(
+        "timestamp,path,ip,user_agent\n"
+        f"{DAY}T10:00:00Z,/,203.0.113.7,{CHROME}\n"
+        f"{DAY}T10:05:00Z,/a,,{CHROME}\n"
+        f"{DAY}T10:06:00Z,/b,,{CHROME}\n"
+    )
+
+    job = await ImportService.create_job(db, site.id, "pageview_events", str(path))
+    await ImportService.run(db, job.id)
+    hashes = dict(
+        (await db.execute(select(PageviewEvent.path, PageviewEvent.visitor_hash))).all()
+    )
+    assert hashes["/"] == EventService.compute_visitor_hash(
+        site.id, "203.0.113.7", CHROME, site.identity_window, DAY
+    )
+    # A shared user agent is not an identity: each hit without one counts on its own
+    assert len(set(hashes.values())) == 3
+
+
+@pytest.mark.asyncio
+async def test_import_resumes_from_committed_offset(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "import_batch_rows", 2)
+    site = await _site(db)
+    path = tmp_path / "hits.csv.gz"
+    path.write_bytes(gzip.compress(HITS.encode()))
+
+    job = await ImportService.create_job(db, site.id, "pageview_events", str(path), MAPPING)
+    assert job.size is None
+    job = await ImportService.run(db, job.id, max_seconds=0)
+    assert (job.status, job.rows) == ("queued", 2)
+    assert await ImportService.pending(db) == [job.id]
+
+    job = await ImportService.run(db, job.id)
+    assert (job.status, job.rows, job.skipped) == ("done", 4, 1)
+    count = await db.scalar(select(func.count()).select_from(PageviewEvent))
+    assert count == 4
+    assert await ImportService.pending(db) == []
+
+
+@pytest.mark.asyncio
+async def test_daily_import_upserts_on_the_unique_key(db, tmp_path):
+    site = await _site(db)
+    path = tmp_path / "pages.csv"
+    path.write_text(
+        f"day,page,views,visitors\n{DAY},/,10,7\n{DAY},/docs,4,3\n{DAY},/,12,8\n"
+    )
+    mapping = {"date": "day", "path": "page", "pageviews": "views", "unique_visitors": "visitors"}
+    for _ in range(2):
+        job = await ImportService.create_job(db, site.id, "daily_page_stats", str(path), mapping)
+        job = await ImportService.run(db, job.id)
+        assert job.status == "done"
+
+    rows = (
+        await db.execute(select(DailyPageStats).order_by(DailyPageStats.path))
+    ).scalars().all()
+    assert [(r.path, r.pageviews, r.unique_visitors) for r in rows] == [
+        ("/", 12, 8),
+        ("/docs", 4, 3),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_breakdown_import_marks_its_days_for_the_planner(db, tmp_path):
+    site = await _site(db)
+    pages = tmp_path / "pages.csv"
+    pages.write_text(f"date,path,pageviews,unique_visitors\n{DAY},/,10,7\n{DAY},/docs,4,3\n")
+    job = await ImportService.create_job(db, site.id, "daily_page_stats", str(pages))
+    assert (await ImportService.run(db, job.id)).status == "done"
+
+    plan = await QueryPlanner.plan(db, site.id, DAY, DAY)
+    assert plan.aggregated == [(DAY, DAY)]
+    top = await AnalyticsService.get_top_pages(db, site.id, DAY, DAY)
+    assert [(row["path"], row["pageviews"]) for row in top] == [("/", 10), ("/docs", 4)]
+
+    # Site totals imported afterwards replace the empty marker
+    totals = tmp_path / "totals.csv"
+    totals.write_text(f"date,pageviews,unique_visitors\n{DAY},14,9\n")
+    job = await ImportService.create_job(db, site.id, "daily_site_stats", str(totals))
+    assert (await ImportService.run(db, job.id)).status == "done"
+    # ...and a later breakdown import leaves them alone
+    job = await ImportService.create_job(db, site.id, "daily_page_stats", str(pages))
+    assert (await ImportService.run(db, job.id)).status == "done"
+
+    row = (await db.execute(select(DailySiteStats))).scalar_one()
+    assert (row.pageviews, row.unique_visitors) == (14, 9)
+
+
+@pytest.mark.asyncio
+async def test_breakdown_import_leaves_days_with_raw_events_unmarked(db, tmp_path):
+    site = await _site(db)
+    today, busy = date.today(), DAY + timedelta(days=1)
+    db.add(
+        PageviewEvent(
+            site_id=site.id, visitor_hash="v", url="https://import.com/live", path="/live",
+            timestamp=datetime.combine(busy, time(12)),
+        )
+    )
+    await db.commit()
+    pages = tmp_path / "pages.csv"
+    pages.write_text(
+        f"date,path,pageviews\n{DAY},/,10\n{busy},/,5\n{today},/,3\n"
+    )
+    job = await ImportService.create_job(db, site.id, "daily_page_stats", str(pages))
+    assert (await ImportService.run(db, job.id)).status == "done"
+
+    marked = (await db.execute(select(DailySiteStats.date))).scalars().all()
+    assert marked == [DAY]
+    # The day with raw events is still read from them until it is aggregated
+    plan = await QueryPlanner.plan(db, site.id, DAY, today)
+    assert plan.raw == [(busy, today)]
+
+
+@pytest.mark.asyncio
+async def test_mapping_is_checked_against_the_header(db, tmp_path):
+    site = await _site(db)
+    path = tmp_path / "pages.csv"
+    path.write_text("day,views\n2025-01-01,3\n")
+    bad = [
+        ("daily_page_stats", {"date": "day", "pageviews": "views"}),  # no path column
+        ("daily_site_stats", {"date": "missing", "pageviews": "views"}),
+        ("daily_site_stats", {"colour": "day"}),
+        ("users", {}),
+    ]
+    for target, mapping in bad:
+        with pytest.raises(ValueError):
+            await ImportService.create_job(db, site.id, target, str(path), mapping)
+
+
+@pytest.mark.asyncio
+async def test_cli_import_and_progress_api(auth_client, db, tmp_path):
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Cli", "domain": "cli.com"})
+    site_id = resp.json()["id"]
+    path = tmp_path / "hits.csv"
+    path.write_text(HITS)
+    maps = [arg for field, column in MAPPING.items() for arg in ("--map", f"{field}={column}")]
+
+    args = parse_args(
+        ["import", str(path), "--site", site_id, "--table", "pageview_events", *maps]
+    )
+    job = await import_csv(args, session_factory)
+    assert (job.status, job.rows) == ("done", 4)
+
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/imports")
+    assert resp.status_code == 200
+    [listed] = resp.json()
+    assert listed["status"] == "done"
+    assert listed["file"] == "hits.csv"
+    assert listed["percent"] == 100.0
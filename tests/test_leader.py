@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app import scheduler
+from app.leader import DatabaseLease, FileLease, LeaderElection
+from app.models.lease import SchedulerLease
+from tests.conftest import test_session_factory as session_factory
+
+
+def _lease(holder_id):
+    return DatabaseLease(holder_id=holder_id, session_factory=session_factory)
+
+
+@pytest.mark.asyncio
+async def test_database_lease_single_leader():
+    a, b = _lease("a"), _lease("b")
+    assert await a.heartbeat() is True
+    assert await b.heartbeat() is False
+    assert a.is_leader and not b.is_leader
+
+    # Renewal keeps the lease with the current holder
+    assert await a.heartbeat() is True
+    assert await b.heartbeat() is False
+
+
+@pytest.mark.asyncio
+async def test_database_lease_failover_after_expiry():
+    a, b = _lease("a"), _lease("b")
+    await a.heartbeat()
+
+    # Simulate a dead leader: its lease runs out without being renewed
+    expired = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+    async with session_factory() as db:
+        await db.execute(update(SchedulerLease).values(expires_at=expired))
+        await db.commit()
+
+    assert await b.heartbeat() is True
+    assert await a.heartbeat() is False
+    assert b.is_leader and not a.is_leader
+
+
+@pytest.mark.asyncio
+async def test_database_lease_release_hands_over():
+    a, b = _lease("a"), _lease("b")
+    await a.heartbeat()
+    await a.release()
+    assert not a.is_leader
+    assert await b.heartbeat() is True
+
+
+@pytest.mark.asyncio
+async def test_file_lease_is_exclusive(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    a, b = FileLease(path, "a"), FileLease(path, "b")
+    assert await a.heartbeat() is True
+    assert await b.heartbeat() is False
+    await a.release()
+    assert await b.heartbeat() is True
+    await b.release()
+
+
+@pytest.mark.asyncio
+async def test_leader_only_skips_followers(monkeypatch):
+    calls = []
+
+    @scheduler.leader_only
+    async def job():
+        calls.append(1)
+        return "ran"
+
+    class Follower(LeaderElection):
+        @property
+        def is_leader(self):
+            return False
+
+    monkeypatch.setattr(scheduler, "leader", Follower())
+    assert await job() is None
+    monkeypatch.setattr(scheduler, "leader", LeaderElection())
+    assert await job() == "ran"
+    assert calls == [1]
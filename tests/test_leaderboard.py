@@ -0,0 +1,91 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.config import settings
+from app.models.event import PageviewEvent
+from app.models.stats import DailyPageStats, LeaderboardEntry
+from app.services.aggregation import AggregationService
+from app.services.analytics import AnalyticsService
+from app.services.auth import AuthService
+from app.services.leaderboard import LeaderboardService
+from app.services.planner import QueryPlanner
+from app.services.site import SiteService
+
+
+async def _seed(db, pages_by_day: dict[date, list[str]]):
+    user = await AuthService.create_user(db, "Test", "board@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Board", "board.com")
+    for day, paths in pages_by_day.items():
+        for i, path in enumerate(paths):
+            db.add(
+                PageviewEvent(
+                    site_id=site.id, visitor_hash=f"{day}-{i}", url=f"https://board.com{path}",
+                    path=path, timestamp=datetime.combine(day, time(12)),
+                )
+            )
+    await db.commit()
+    return site
+
+
+@pytest.mark.asyncio
+async def test_aggregation_builds_leaderboards_for_both_windows(db):
+    yesterday = date.today() - timedelta(days=1)
+    site = await _seed(db, {yesterday: ["/a", "/a", "/b"]})
+    stats = await AggregationService.aggregate_day(db, yesterday)
+    assert stats["leaderboards"] > 0
+
+    result = await db.execute(
+        select(LeaderboardEntry.window, LeaderboardEntry.rank, LeaderboardEntry.value).where(
+            LeaderboardEntry.site_id == site.id, LeaderboardEntry.dimension == "path"
+        )
+    )
+    assert sorted(result.all()) == [
+        ("30d", 1, "/a"), ("30d", 2, "/b"), ("7d", 1, "/a"), ("7d", 2, "/b"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_dashboard_reads_leaderboard_and_merges_today(db):
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    site = await _seed(db, {yesterday: ["/a", "/a", "/b"], today: ["/b", "/b", "/c"]})
+    await AggregationService.aggregate_day(db, yesterday)
+    start, end = AnalyticsService._date_range("7d")
+    plan = await QueryPlanner.plan(db, site.id, start, end)
+    expected = await QueryPlanner.breakdowns(db, plan, ["path"])
+
+    # With the daily rows gone, only the leaderboard can supply yesterday's counts
+    await db.execute(delete(DailyPageStats).where(DailyPageStats.site_id == site.id))
+    await db.commit()
+    data = await AnalyticsService.get_breakdowns(db, site.id, start, end, ["path"])
+    assert data == expected
+    assert [(p["path"], p["pageviews"]) for p in data["path"]] == [("/b", 3), ("/a", 2), ("/c", 1)]
+
+
+@pytest.mark.asyncio
+async def test_raw_value_beyond_full_leaderboard_is_ranked_exactly(db, monkeypatch):
+    monkeypatch.setattr(settings, "leaderboard_size", 2)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    site = await _seed(
+        db, {yesterday: ["/a"] * 3 + ["/b"] * 2 + ["/c"], today: ["/c"] * 4}
+    )
+    await AggregationService.aggregate_day(db, yesterday)
+
+    start, end = AnalyticsService._date_range("30d")
+    plan = await QueryPlanner.plan(db, site.id, start, end)
+    board = await LeaderboardService.breakdowns(db, plan, ["path"], limit=2)
+    assert [(p["path"], p["pageviews"]) for p in board["path"]] == [("/c", 5), ("/a", 3)]
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_is_skipped_when_window_is_not_aggregated(db):
+    site = await _seed(db, {date.today(): ["/a"]})
+    start, end = AnalyticsService._date_range("7d")
+    plan = await QueryPlanner.plan(db, site.id, start, end)
+    assert await LeaderboardService.breakdowns(db, plan, ["path"]) is None
+    assert LeaderboardService.window_for(
+        await QueryPlanner.plan(db, site.id, date.today(), date.today())
+    ) is None
@@ -0,0 +1,175 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.api import dashboard
+from app.live import LivePublisher
+from app.realtime import RealtimeStore
+from tests.conftest import test_session_factory as session_factory
+
+
+def _publisher(interval: float = 0.01) -> LivePublisher:
+    return LivePublisher(RealtimeStore(window_minutes=30, top_capacity=10), interval=interval)
+
+
+def _ingest(publisher: LivePublisher, site_id: str, visitor: str, path: str):
+    publisher.store.record(site_id, visitor, path)
+    publisher.notify(site_id)
+
+
+@pytest.mark.asyncio
+async def test_one_update_is_fanned_out_to_every_subscriber():
+    publisher = _publisher()
+    first = publisher.subscribe("s")
+    second = publisher.subscribe("s")
+    _ingest(publisher, "s", "v1", "/")
+    _ingest(publisher, "s", "v2", "/pricing")
+
+    a = await asyncio.wait_for(first.get(), timeout=1)
+    b = await asyncio.wait_for(second.get(), timeout=1)
+    assert a is b
+    assert a["pageviews"] == 2
+    assert a["active_visitors"] == 2
+    assert {p["path"] for p in a["top_pages"]} == {"/", "/pricing"}
+    assert publisher.published == 1
+
+    publisher.unsubscribe("s", first)
+    publisher.unsubscribe("s", second)
+    assert publisher.stats()["sites"] == 0
+
+
+@pytest.mark.asyncio
+async def test_update_only_lists_changed_pages():
+    publisher = _publisher(interval=60)
+    queue = publisher.subscribe("s")
+    _ingest(publisher, "s", "v1", "/")
+    _ingest(publisher, "s", "v1", "/docs")
+    assert publisher.update("s")["pageviews"] == 2
+
+    _ingest(publisher, "s", "v2", "/docs")
+    update = publisher.update("s")
+    assert update["pageviews"] == 1
+    assert update["top_pages"] == [{"path": "/docs", "pageviews": 2}]
+    assert update["removed_pages"] == []
+    # Nothing new: no update is published
+    assert publisher.update("s") is None
+    publisher.unsubscribe("s", queue)
+
+
+@pytest.mark.asyncio
+async def test_unsubscribed_sites_are_not_tracked():
+    publisher = _publisher()
+    _ingest(publisher, "s", "v1", "/")
+    assert publisher.update("s") is None
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_drops_oldest_update():
+    publisher = _publisher(interval=60)
+    queue = publisher.subscribe("s")
+    for i in range(queue.maxsize + 3):
+        publisher._broadcast("s", {"n": i})
+
+    assert queue.qsize() == queue.maxsize
+    assert queue.get_nowait() == {"n": 3}
+    publisher.unsubscribe("s", queue)
+
+
+@pytest.mark.asyncio
+async def test_event_stream_sends_snapshot_then_updates():
+    publisher = _publisher()
+    publisher.store.record("s", "v1", "/")
+    stream = publisher.events("s", heartbeat=0.01)
+
+    assert (await anext(stream)).startswith("retry:")
+    snapshot = await anext(stream)
+    assert snapshot.startswith("event: snapshot\n")
+    assert json.loads(snapshot.split("data: ")[1])["pageviews"] == 1
+    assert await anext(stream) == ": keep-alive\n\n"
+
+    _ingest(publisher, "s", "v2", "/new")
+    chunk = await anext(stream)
+    while chunk.startswith(":"):
+        chunk = await anext(stream)
+    assert chunk.startswith("event: update\n")
+    assert json.loads(chunk.split("data: ")[1])["pageviews"] == 1
+
+    await stream.aclose()
+    assert publisher.subscriber_count("s") == 0
+
+
+@pytest.fixture
+def live_sessions(monkeypatch):
+    # The stream checks access on a session of its own rather than through get_db
+    monkeypatch.setattr(dashboard, "async_session", session_factory)
+
+
+@pytest.mark.asyncio
+async def test_live_stream_holds_no_database_connection(app, auth_client, live_sessions):
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Live", "domain": "live.com"})
+    site_id = resp.json()["id"]
+    token = next(c.value for c in auth_client.cookies.jar if c.name == "access_token")
+
+    # Sessions currently holding a connection. Pool events can't tell: the in-memory
+    # test engine hands every session the same pooled connection.
+    holding = set()
+
+    def on_begin(session, transaction, connection):
+        holding.add(id(session))
+
+    def on_end(session, transaction):
+        if transaction.parent is None:
+            holding.discard(id(session))
+
+    event.listen(Session, "after_begin", on_begin)
+    event.listen(Session, "after_transaction_end", on_end)
+
+    # httpx buffers whole responses, so drive the ASGI app directly
+    first_chunk, disconnected = asyncio.Event(), asyncio.Event()
+    messages = []
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_chunk.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": f"/api/v1/sites/{site_id}/live",
+        "raw_path": f"/api/v1/sites/{site_id}/live".encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"test"),
+            (b"cookie", f"access_token={token}".encode()),
+        ],
+        "client": ("127.0.0.1", 5000),
+        "server": ("test", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, send))
+    try:
+        await asyncio.wait_for(first_chunk.wait(), timeout=5)
+        assert messages[0]["status"] == 200
+        assert holding == set()
+    finally:
+        disconnected.set()
+        await asyncio.wait_for(task, timeout=5)
+        event.remove(Session, "after_begin", on_begin)
+        event.remove(Session, "after_transaction_end", on_end)
+
+
+@pytest.mark.asyncio
+async def test_live_endpoint_requires_owner(auth_client, live_sessions):
+    resp = await auth_client.get("/api/v1/sites/nonexistent/live")
+    assert resp.status_code == 404
@@ -0,0 +1,14 @@
+from datetime import date
+
+import pytest
+
+from app.periods import period_bounds
+
+
+def test_period_bounds():
+    wednesday = date(2024, 2, 14)
+    assert period_bounds("week", wednesday) == (date(2024, 2, 12), date(2024, 2, 18))
+    assert period_bounds("month", wednesday) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert period_bounds("year", wednesday) == (date(2024, 1, 1), date(2024, 12, 31))
+    with pytest.raises(ValueError):
+        period_bounds("decade", wednesday)
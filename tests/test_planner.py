@@ -0,0 +1,388 @@
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import delete, event, func, select
+
+from app.models.event import PageviewEvent
+from app.models.stats import BreakdownRanking, BreakdownRankingBuild
+from app.services import planner
+from app.services.aggregation import AggregationService
+from app.services.analytics import AnalyticsService
+from app.services.auth import AuthService
+from app.services.planner import QueryPlanner, previous_range, ranking_flights
+from app.services.site import SiteService
+
+
+async def _seed_site(db, identity_window: str = "day"):
+    user = await AuthService.create_user(db, "Test", "planner@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Planner", "planner.com")
+    if identity_window != "day":
+        await SiteService.update_site(db, site, identity_window=identity_window)
+    await db.commit()
+    return site
+
+
+async def _add_event(db, site, day: date, visitor: str, path: str = "/", browser="Chrome"):
+    db.add(
+        PageviewEvent(
+            site_id=site.id, visitor_hash=visitor, url=f"https://planner.com{path}",
+            path=path, browser=browser, device_type="desktop",
+            timestamp=datetime.combine(day, time(12)),
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_plan_splits_aggregated_and_raw_days(db):
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    await _add_event(db, site, yesterday, "v1")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    plan = await QueryPlanner.plan(db, site.id, today - timedelta(days=3), today)
+    assert plan.aggregated == [(yesterday, yesterday)]
+    assert plan.raw == [(today - timedelta(days=3), today - timedelta(days=2)), (today, today)]
+    sources = plan.describe()
+    assert sources["aggregated_days"] == 1
+    assert sources["raw_days"] == 3
+
+
+@pytest.mark.asyncio
+async def test_aggregated_days_are_not_read_from_raw_events(db):
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    for i in range(3):
+        await _add_event(db, site, yesterday, f"y{i}", path="/old")
+    await _add_event(db, site, today, "t1", path="/new")
+    await _add_event(db, site, today, "t2", path="/old")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    # Drop yesterday's raw events: the totals must now come from the daily tables
+    await db.execute(
+        delete(PageviewEvent).where(func.date(PageviewEvent.timestamp) == yesterday)
+    )
+    await db.commit()
+
+    summary = await AnalyticsService.get_summary(db, site.id, yesterday, today)
+    assert summary == {"pageviews": 5, "unique_visitors": 5}
+
+    pages = await AnalyticsService.get_top_pages(db, site.id, yesterday, today)
+    assert pages == [
+        {"path": "/old", "pageviews": 4, "unique_visitors": 4},
+        {"path": "/new", "pageviews": 1, "unique_visitors": 1},
+    ]
+
+    series = await AnalyticsService.get_visitors_over_time(db, site.id, yesterday, today)
+    assert [d["pageviews"] for d in series] == [3, 2]
+
+
+@pytest.mark.asyncio
+async def test_breakdown_ranks_merged_values(db):
+    """A value outside the aggregated top-N can still win once today's events are added."""
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    for i in range(3):
+        await _add_event(db, site, yesterday, f"a{i}", browser="Chrome")
+    for i in range(2):
+        await _add_event(db, site, yesterday, f"b{i}", browser="Firefox")
+    await _add_event(db, site, yesterday, "c0", browser="Safari")
+    for i in range(4):
+        await _add_event(db, site, today, f"t{i}", browser="Safari")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    browsers = await AnalyticsService.get_browsers(db, site.id, yesterday, today, limit=2)
+    assert [(b["browser"], b["pageviews"]) for b in browsers] == [("Safari", 5), ("Chrome", 3)]
+
+
+@pytest.mark.asyncio
+async def test_weekly_window_counts_returning_visitor_once(db):
+    site = await _seed_site(db, identity_window="week")
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    await _add_event(db, site, yesterday, "same")
+    await _add_event(db, site, yesterday, "other")
+    await _add_event(db, site, today, "same")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    summary = await AnalyticsService.get_summary(db, site.id, yesterday, today)
+    assert summary == {"pageviews": 3, "unique_visitors": 2}
+
+
+@pytest.mark.asyncio
+async def test_full_dashboard_reports_sources(db):
+    site = await _seed_site(db)
+    today = date.today()
+    await AggregationService.aggregate_day(db, today - timedelta(days=1))
+
+    data = await AnalyticsService.get_full_dashboard(db, site.id, "7d")
+    sources = data["sources"]
+    assert sources["aggregated"] == [[(today - timedelta(days=1)).isoformat()] * 2]
+    assert sources["raw_days"] == 6
+    assert sources["raw_sections"] == []
+
+
+@pytest.mark.asyncio
+async def test_breakdowns_cover_registered_dimensions_in_one_call(db):
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    for day, visitor, os_name, term in [
+        (yesterday, "a", "Windows", "shoes"),
+        (yesterday, "b", "macOS", None),
+        (today, "c", "Windows", "shoes"),
+        (today, "d", "Linux", "boots"),
+    ]:
+        db.add(
+            PageviewEvent(
+                site_id=site.id, visitor_hash=visitor, url="https://planner.com/", path="/",
+                os=os_name, utm_source="ads", utm_term=term,
+                timestamp=datetime.combine(day, time(12)),
+            )
+        )
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    data = await AnalyticsService.get_breakdowns(db, site.id, yesterday, today)
+    assert data["os"] == [
+        {"os": "Windows", "pageviews": 2, "unique_visitors": 2},
+        {"os": "Linux", "pageviews": 1, "unique_visitors": 1},
+        {"os": "macOS", "pageviews": 1, "unique_visitors": 1},
+    ]
+    assert [(t["utm_term"], t["pageviews"]) for t in data["utm_term"]] == [
+        ("shoes", 2), ("boots", 1),
+    ]
+    assert data["utm_content"] == []
+    # The single-pass result matches the per-dimension methods
+    assert data["path"] == await AnalyticsService.get_top_pages(db, site.id, yesterday, today)
+
+    dashboard = await AnalyticsService.get_full_dashboard(db, site.id, "7d")
+    assert dashboard["operating_systems"] == data["os"]
+    assert dashboard["utm_terms"] == data["utm_term"]
+
+
+@pytest.mark.asyncio
+async def test_bounce_rate_uses_stored_daily_bounces(db):
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    for visitor in ("a", "a", "b", "c"):
+        await _add_event(db, site, yesterday, visitor)
+    await _add_event(db, site, today, "d")
+    await _add_event(db, site, today, "d")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    await db.execute(
+        delete(PageviewEvent).where(func.date(PageviewEvent.timestamp) == yesterday)
+    )
+    await db.commit()
+
+    # Yesterday: b and c bounced out of 3 visitors; today: d did not bounce
+    rate = await AnalyticsService.get_bounce_rate(db, site.id, yesterday, today)
+    assert rate == 50.0
+
+
+@pytest.mark.asyncio
+async def test_weekly_window_bounce_rate_counts_visits_from_stored_days(db):
+    site = await _seed_site(db, identity_window="week")
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    for visitor in ("same", "same", "once"):
+        await _add_event(db, site, yesterday, visitor)
+    await _add_event(db, site, today, "same")
+    await _add_event(db, site, today, "new")
+    await _add_event(db, site, today, "new")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    await db.execute(
+        delete(PageviewEvent).where(func.date(PageviewEvent.timestamp) == yesterday)
+    )
+    await db.commit()
+
+    # Yesterday: "once" bounced out of 2 visits; today: "same" bounced out of 2 visits
+    rate = await AnalyticsService.get_bounce_rate(db, site.id, yesterday, today)
+    assert rate == 50.0
+    plan = await QueryPlanner.plan(db, site.id, yesterday, today)
+    assert plan.describe()["raw_sections"] == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("identity_window", ["day", "week"])
+async def test_compared_reads_match_separate_reads(db, identity_window):
+    site = await _seed_site(db, identity_window=identity_window)
+    today = date.today()
+    days = [today - timedelta(days=n) for n in range(3, -1, -1)]
+    # (day index, visitor, path): the first two days are the previous window
+    for index, visitor, path in [
+        (0, "a", "/"), (0, "a", "/docs"), (0, "b", "/"), (1, "c", "/pricing"),
+        (1, "a", "/"), (2, "a", "/"), (2, "d", "/docs"), (2, "d", "/"),
+        (3, "e", "/"), (3, "a", "/new"),
+    ]:
+        await _add_event(db, site, days[index], visitor, path=path)
+    await db.commit()
+    for day in days[:3]:
+        await AggregationService.aggregate_day(db, day)
+
+    assert previous_range(days[2], today) == (days[0], days[1])
+    current = await QueryPlanner.plan(db, site.id, days[2], today)
+    previous = await QueryPlanner.plan(db, site.id, days[0], days[1])
+    totals = await QueryPlanner.compared_totals(db, current, previous)
+    for period, plan in (("current", current), ("previous", previous)):
+        expected = await QueryPlanner.totals(db, plan)
+        expected["bounce_rate"] = await QueryPlanner.bounce_rate(db, plan)
+        assert totals[period] == expected
+
+    rows = (await QueryPlanner.compared_breakdowns(db, current, previous, ["path"]))["path"]
+    assert [row["path"] for row in rows] == [
+        row["path"] for row in await QueryPlanner.breakdown(db, current, "path")
+    ]
+    earlier = {row["path"]: row for row in await QueryPlanner.breakdown(db, previous, "path")}
+    for row in rows:
+        counts = earlier.get(row["path"], {"pageviews": 0, "unique_visitors": 0})
+        assert row["previous"] == {
+            "pageviews": counts["pageviews"], "unique_visitors": counts["unique_visitors"],
+        }
+    assert rows[-1] == {
+        "path": "/new", "pageviews": 1, "unique_visitors": 1,
+        "previous": {"pageviews": 0, "unique_visitors": 0},
+    }
+
+
+@pytest.mark.asyncio
+async def test_breakdown_pages_walk_merged_ranking(db):
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    # Aggregated yesterday plus raw today: /a 4, /b 3, /c 3, /d 2, /e 1
+    for path, old, new in [("/a", 3, 1), ("/b", 1, 2), ("/c", 3, 0), ("/d", 0, 2), ("/e", 1, 0)]:
+        for i in range(old):
+            await _add_event(db, site, yesterday, f"{path}-y{i}", path=path)
+        for i in range(new):
+            await _add_event(db, site, today, f"{path}-t{i}", path=path)
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    pages, after = [], None
+    while True:
+        page = await AnalyticsService.get_breakdown_page(
+            db, site.id, "path", yesterday, today, limit=2, after=after
+        )
+        pages.append([(row["path"], row["pageviews"]) for row in page["rows"]])
+        after = page["next"]
+        if after is None:
+            break
+
+    assert pages == [[("/a", 4), ("/b", 3)], [("/c", 3), ("/d", 2)], [("/e", 1)]]
+    first = await AnalyticsService.get_breakdown_page(db, site.id, "path", yesterday, today, 2)
+    assert first["rows"][0] == {"path": "/a", "pageviews": 4, "unique_visitors": 4}
+
+
+@pytest.mark.asyncio
+async def test_breakdown_pages_seek_a_materialized_ranking(db):
+    site = await _seed_site(db)
+    yesterday = date.today() - timedelta(days=1)
+    for i in range(3):
+        await _add_event(db, site, yesterday, f"a{i}", path="/a")
+    await _add_event(db, site, yesterday, "b0", path="/b")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+
+    async def ranking():
+        result = await db.execute(
+            select(BreakdownRanking.value, BreakdownRanking.pageviews)
+            .where(BreakdownRanking.dimension == "path")
+            .order_by(BreakdownRanking.pageviews.desc())
+        )
+        return result.all()
+
+    plan = await QueryPlanner.plan(db, site.id, yesterday, yesterday)
+    page = await QueryPlanner.breakdown_page(db, plan, "path", 1)
+    assert [(value, row["pageviews"]) for value, row in page] == [("/a", 3)]
+    assert await ranking() == [("/a", 3), ("/b", 1)]
+    page = await QueryPlanner.breakdown_page(db, plan, "path", 1, after=(3, "/a"))
+    assert [value for value, _ in page] == ["/b"]
+
+    # Re-aggregating the day changes its totals, so the ranking is rebuilt
+    for i in range(1, 4):
+        await _add_event(db, site, yesterday, f"b{i}", path="/b")
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+    page = await QueryPlanner.breakdown_page(db, plan, "path", 1)
+    assert [value for value, _ in page] == ["/b"]
+    assert await ranking() == [("/b", 4), ("/a", 3)]
+
+    assert await QueryPlanner.purge_rankings(db) == 1
+    assert await ranking() == []
+
+
+@pytest.mark.asyncio
+async def test_breakdown_ranking_is_built_off_the_request_session(db):
+    site = await _seed_site(db)
+    yesterday = date.today() - timedelta(days=1)
+    for i, path in enumerate(["/a", "/a", "/b"]):
+        await _add_event(db, site, yesterday, f"v{i}", path=path)
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+    plan = await QueryPlanner.plan(db, site.id, yesterday, yesterday)
+
+    writes = []
+    event.listen(
+        db.sync_session, "do_orm_execute",
+        lambda state: writes.append(state) if not state.is_select else None,
+    )
+    started = ranking_flights.started
+    pages = await asyncio.gather(
+        *(QueryPlanner.breakdown_page(db, plan, "path", 1) for _ in range(3))
+    )
+    assert [[value for value, _ in page] for page in pages] == [["/a"]] * 3
+    # Concurrent first pages share one build, and the request session only reads
+    assert ranking_flights.started == started + 1
+    assert writes == []
+
+    build = (await db.execute(select(BreakdownRankingBuild))).scalar_one()
+    assert (build.dimension, build.coverage, build.pageviews) == (
+        "path", plan.coverage(), 3
+    )
+
+
+@pytest.mark.asyncio
+async def test_breakdown_page_merges_many_raw_values(db, monkeypatch):
+    # Tiny IN lists, so raw values span several of them
+    monkeypatch.setattr(planner, "_IN_CHUNK", 2)
+    site = await _seed_site(db)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    for rank, path in enumerate(["/a", "/b", "/c", "/d", "/e", "/f"]):
+        for i in range(6 - rank):
+            await _add_event(db, site, yesterday, f"{path}{i}", path=path)
+    await db.commit()
+    await AggregationService.aggregate_day(db, yesterday)
+    # Today's visits to the top ranked values leave a ranked page with none of theirs
+    for path in ["/a", "/b", "/c", "/x"]:
+        await _add_event(db, site, today, f"today{path}", path=path)
+    await db.commit()
+
+    plan = await QueryPlanner.plan(db, site.id, yesterday, today)
+    page = await QueryPlanner.breakdown_page(db, plan, "path", 2, after=(5, "/c"))
+    assert [(value, row["pageviews"]) for value, row in page] == [("/d", 3), ("/e", 2)]
+    page = await QueryPlanner.breakdown_page(db, plan, "path", 3, after=(2, "/e"))
+    assert [(value, row["pageviews"]) for value, row in page] == [("/f", 1), ("/x", 1)]
+
+
+@pytest.mark.asyncio
+async def test_breakdown_page_rejects_bad_token(db):
+    site = await _seed_site(db)
+    today = date.today()
+    with pytest.raises(ValueError):
+        await AnalyticsService.get_breakdown_page(
+            db, site.id, "path", today, today, after="not-a-token"
+        )
@@ -0,0 +1,161 @@
+import pytest
+
+from app.config import settings
+from app.hll import HyperLogLog
+from app.realtime import RealtimeStore, SpaceSaving
+
+NOW = 29_000_000  # an arbitrary epoch minute
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(capacity=5)
+    for _ in range(50):
+        sketch.offer("/")
+    for _ in range(20):
+        sketch.offer("/pricing")
+    for i in range(30):
+        sketch.offer(f"/blog/{i}")
+
+    top = dict(sketch.top(2))
+    assert top["/"] == 50
+    # Counts are overestimates bounded by the recorded error
+    assert 20 <= top["/pricing"] <= 20 + sketch.counters["/pricing"][1]
+    assert len(sketch.counters) == 5
+
+
+def test_space_saving_merge_adds_counts():
+    a, b = SpaceSaving(2), SpaceSaving(2)
+    a.offer("/a", 3)
+    a.offer("/z", 1)
+    b.offer("/a", 2)
+    b.offer("/b", 4)
+
+    assert a.merge(b).top(3) == [("/a", 5), ("/b", 4)]
+
+
+def test_summary_covers_requested_minutes():
+    store = RealtimeStore(window_minutes=30, top_capacity=10)
+    store.record("s", "v1", "/", minute=NOW - 40)  # outside the window
+    store.record("s", "v1", "/", minute=NOW - 20)
+    store.record("s", "v2", "/about", minute=NOW - 2)
+    store.record("s", "v2", "/", minute=NOW)
+    store.record("other", "v9", "/", minute=NOW)
+
+    summary = store.summary("s", 30, minute=NOW)
+    assert summary["pageviews"] == 3
+    assert summary["visitors"] == 2
+    assert summary["top_paths"][0] == {"path": "/", "pageviews": 2}
+    assert len(summary["per_minute"]) == 30
+    assert summary["per_minute"][-1] == {"minute": NOW * 60, "pageviews": 1}
+
+    recent = store.summary("s", 5, minute=NOW)
+    assert recent["pageviews"] == 2
+    assert store.summary("missing", minute=NOW)["pageviews"] == 0
+
+
+def test_ring_buffer_reuses_expired_slots():
+    store = RealtimeStore(window_minutes=5, top_capacity=10)
+    store.record("s", "v1", "/old", minute=NOW - 5)
+    store.record("s", "v2", "/new", minute=NOW)  # same slot, one lap later
+
+    summary = store.summary("s", 5, minute=NOW)
+    assert summary["pageviews"] == 1
+    assert summary["top_paths"] == [{"path": "/new", "pageviews": 1}]
+
+
+def test_record_prunes_idle_sites_each_minute():
+    store = RealtimeStore(window_minutes=5, top_capacity=10)
+    store.record("quiet", "v1", "/", minute=NOW - 5)
+    store.record("busy", "v1", "/", minute=NOW - 1)
+    assert set(store.sites) == {"quiet", "busy"}
+
+    store.record("busy", "v2", "/", minute=NOW)
+    assert set(store.sites) == {"busy"}
+
+
+def test_buckets_stay_sparse_until_they_outgrow_the_dense_sketch():
+    store = RealtimeStore(window_minutes=5, top_capacity=10)
+    store.record("s", "v1", "/", minute=NOW)
+    bucket = store.sites["s"].bucket(NOW)
+    assert isinstance(bucket.visitors, dict) and len(bucket.visitors) == 1
+
+    hashes = [f"visitor-{i}" for i in range(200)]
+    for visitor in hashes:
+        store.record("s", visitor, "/", minute=NOW)
+    assert isinstance(bucket.visitors, HyperLogLog)
+    expected = HyperLogLog.from_hashes(["v1", *hashes])
+    assert store.summary("s", 5, minute=NOW)["visitors"] == expected.cardinality()
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "realtime.json")
+    store = RealtimeStore(window_minutes=30, top_capacity=10)
+    for i in range(5):
+        store.record("s", f"v{i}", "/docs")
+    store.record("idle", "v1", "/", minute=NOW - 1000)
+
+    assert store.snapshot(path) == 1
+
+    restored = RealtimeStore(window_minutes=30, top_capacity=10)
+    assert restored.restore(path) == 1
+    summary = restored.summary("s")
+    assert summary["pageviews"] == 5
+    assert summary["visitors"] == 5
+    assert summary["top_paths"] == [{"path": "/docs", "pageviews": 5}]
+    assert "idle" not in restored.sites
+
+
+def test_each_process_claims_its_own_snapshot_file(tmp_path, monkeypatch):
+    base = str(tmp_path / "realtime.json")
+    monkeypatch.setattr(settings, "realtime_snapshot_path", base)
+    first = RealtimeStore(window_minutes=30, top_capacity=10)
+    second = RealtimeStore(window_minutes=30, top_capacity=10)
+    first.restore()
+    second.restore()
+    assert (first._slot, second._slot) == (base, f"{base}.1")
+
+    first.record("a", "v1", "/")
+    second.record("b", "v1", "/")
+    assert first.snapshot() == 1
+    assert second.snapshot() == 1
+
+    # A restarted worker picks up the first free file, not both workers' counters
+    restarted = RealtimeStore(window_minutes=30, top_capacity=10)
+    assert restarted.restore() == 1
+    assert set(restarted.sites) == {"a"}
+    restarted.release_slot()
+
+
+def test_restore_ignores_missing_or_corrupt_snapshot(tmp_path):
+    store = RealtimeStore()
+    assert store.restore(str(tmp_path / "missing.json")) == 0
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_text("{not json")
+    assert store.restore(str(corrupt)) == 0
+
+
+@pytest.mark.asyncio
+async def test_ingest_updates_realtime_endpoint(auth_client):
+    resp = await auth_client.post(
+        "/api/v1/sites", json={"name": "Realtime", "domain": "realtime.com"}
+    )
+    site_id = resp.json()["id"]
+    event = {
+        "s": site_id, "u": "https://realtime.com/live", "p": "/live", "r": "",
+        "sw": 0, "us": "", "um": "", "uc": "", "ut": "", "ux": "",
+    }
+    for _ in range(3):
+        assert (await auth_client.post("/api/v1/event", json=event)).status_code == 202
+
+    resp = await auth_client.get(f"/api/v1/sites/{site_id}/realtime?minutes=30")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["pageviews"] == 3
+    assert data["visitors"] == 1
+    assert data["top_paths"] == [{"path": "/live", "pageviews": 3}]
+
+
+@pytest.mark.asyncio
+async def test_realtime_endpoint_requires_owner(auth_client):
+    resp = await auth_client.get("/api/v1/sites/nonexistent/realtime")
+    assert resp.status_code == 404
@@ -0,0 +1,177 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.hll import HyperLogLog
+from app.models.stats import (
+    DailyPageStats,
+    DailySiteStats,
+    DailyUTMStats,
+    RollupStats,
+)
+from app.services.auth import AuthService
+from app.services.rollup import RollupService
+from app.services.site import SiteService
+
+
+async def _seed_daily(db, start: date, end: date):
+    """Create a site with one day of summary rows per date in the range."""
+    user = await AuthService.create_user(db, "Test", "rollup@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Rollup", "rollup.com")
+    day = start
+    while day <= end:
+        db.add(DailySiteStats(site_id=site.id, date=day, pageviews=10, unique_visitors=4))
+        db.add(DailyPageStats(site_id=site.id, date=day, path="/", pageviews=7, unique_visitors=3))
+        db.add(
+            DailyPageStats(site_id=site.id, date=day, path="/about", pageviews=3, unique_visitors=1)
+        )
+        db.add(
+            DailyUTMStats(
+                site_id=site.id, date=day, utm_source="news", utm_medium="email",
+                utm_campaign="", pageviews=2, unique_visitors=1,
+            )
+        )
+        day += timedelta(days=1)
+    await db.commit()
+    return site
+
+
+def test_plan_prefers_coarsest_available_tier():
+    available = {("month", date(2024, 2, 1)), ("week", date(2024, 3, 4))}
+    segments = RollupService.plan(date(2024, 1, 30), date(2024, 3, 12), available)
+    assert segments == [
+        ("day", date(2024, 1, 30), date(2024, 1, 31)),
+        ("month", date(2024, 2, 1), date(2024, 2, 29)),
+        ("day", date(2024, 3, 1), date(2024, 3, 3)),
+        ("week", date(2024, 3, 4), date(2024, 3, 10)),
+        ("day", date(2024, 3, 11), date(2024, 3, 12)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cascade_builds_complete_periods(db):
+    site = await _seed_daily(db, date(2023, 12, 1), date(2024, 1, 10))
+    stats = await RollupService.cascade(db, date(2023, 12, 1), date(2024, 1, 10))
+    assert stats["month"] == 2  # December 2023 and January 2024
+    assert stats["year"] == 2  # Both years, summed from their month rollups
+    assert stats["week"] > 0
+
+    # Neither year has all 12 months of history, so neither gets a year row
+    years = await db.execute(
+        select(RollupStats).where(
+            RollupStats.site_id == site.id, RollupStats.granularity == "year"
+        )
+    )
+    assert years.scalars().all() == []
+    totals = await RollupService.get_totals(db, site.id, date(2023, 1, 1), date(2023, 12, 31))
+    assert totals["pageviews"] == 31 * 10
+
+    # Re-running replaces rows instead of duplicating them
+    before = (await db.execute(select(func.count()).select_from(RollupStats))).scalar()
+    await RollupService.cascade(db, date(2023, 12, 1), date(2024, 1, 10))
+    after = (await db.execute(select(func.count()).select_from(RollupStats))).scalar()
+    assert before == after
+
+
+@pytest.mark.asyncio
+async def test_year_rollup_builds_missing_months_from_daily_history(db):
+    site = await _seed_daily(db, date(2025, 1, 1), date(2025, 12, 31))
+    # Only the last day is cascaded: every month but December has no rollup yet
+    stats = await RollupService.cascade(db, date(2025, 12, 31), date(2025, 12, 31))
+    assert stats["year"] == 1
+
+    year = (
+        await db.execute(
+            select(RollupStats).where(
+                RollupStats.site_id == site.id,
+                RollupStats.granularity == "year",
+                RollupStats.dimension == "site",
+            )
+        )
+    ).scalar_one()
+    assert year.pageviews == 365 * 10
+    totals = await RollupService.get_totals(db, site.id, date(2025, 1, 1), date(2025, 12, 31))
+    assert totals["pageviews"] == 365 * 10
+
+
+@pytest.mark.asyncio
+async def test_cascade_skips_incomplete_periods(db):
+    today = date.today()
+    await _seed_daily(db, today, today)
+    stats = await RollupService.cascade(db, today, today)
+    assert stats == {"week": 0, "month": 0, "year": 0, "rows": 0}
+
+
+@pytest.mark.asyncio
+async def test_reads_match_daily_tables(db):
+    start, end = date(2024, 1, 20), date(2024, 3, 15)
+    site = await _seed_daily(db, start, end)
+    await RollupService.cascade(db, start, end)
+    days = (end - start).days + 1
+
+    totals = await RollupService.get_totals(db, site.id, start, end)
+    assert totals == {"pageviews": 10 * days, "unique_visitors": 4 * days}
+
+    pages = await RollupService.get_breakdown(db, site.id, "path", start, end)
+    assert pages == [
+        {"path": "/", "pageviews": 7 * days, "unique_visitors": 3 * days},
+        {"path": "/about", "pageviews": 3 * days, "unique_visitors": days},
+    ]
+
+    utms = await RollupService.get_breakdown(db, site.id, "utm", start, end)
+    assert utms == [
+        {
+            "utm_source": "news", "utm_medium": "email", "utm_campaign": None,
+            "pageviews": 2 * days, "unique_visitors": days,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reads_without_rollups_use_daily_rows(db):
+    start, end = date(2024, 1, 1), date(2024, 1, 31)
+    site = await _seed_daily(db, start, end)
+    totals = await RollupService.get_totals(db, site.id, start, end)
+    assert totals["pageviews"] == 310
+
+
+@pytest.mark.asyncio
+async def test_weekly_identity_window_merges_visitor_sketches(db):
+    """With a weekly window the same visitor hash on several days counts once."""
+    user = await AuthService.create_user(db, "Test", "hll@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Weekly", "weekly.com")
+    await SiteService.update_site(db, site, identity_window="week")
+    monday = date(2024, 3, 4)
+    for offset in range(7):
+        # 20 returning visitors every day, plus 5 new ones each day
+        hashes = [f"r{i}" for i in range(20)] + [f"d{offset}-{i}" for i in range(5)]
+        sketch = HyperLogLog.from_hashes(hashes).to_bytes()
+        db.add(
+            DailySiteStats(
+                site_id=site.id, date=monday + timedelta(days=offset),
+                pageviews=25, unique_visitors=25, visitors_hll=sketch,
+            )
+        )
+        db.add(
+            DailyPageStats(
+                site_id=site.id, date=monday + timedelta(days=offset), path="/",
+                pageviews=25, unique_visitors=25, visitors_hll=sketch,
+            )
+        )
+    await db.commit()
+
+    # Two days straight from the daily rows
+    totals = await RollupService.get_totals(db, site.id, monday, monday + timedelta(days=1))
+    assert totals["pageviews"] == 50
+    assert abs(totals["unique_visitors"] - 30) <= 1
+
+    # The full week from its rollup
+    await RollupService.cascade(db, monday, monday + timedelta(days=6))
+    totals = await RollupService.get_totals(db, site.id, monday, monday + timedelta(days=6))
+    assert totals["pageviews"] == 175
+    assert abs(totals["unique_visitors"] - 55) <= 2
+    pages = await RollupService.get_breakdown(
+        db, site.id, "path", monday, monday + timedelta(days=6)
+    )
+    assert pages[0]["unique_visitors"] == totals["unique_visitors"]
@@ -0,0 +1,192 @@
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.models.event import PageviewEvent
+from app.models.stats import DailySegmentIndex
+from app.segments import (
+    DayIndex,
+    SegmentFilter,
+    bitmap_from_positions,
+    bitmap_positions,
+    decode_bitmap,
+    encode_bitmap,
+)
+from app.services.aggregation import AggregationService
+from app.services.auth import AuthService
+from app.services.segments import SegmentService
+from app.services.site import SiteService
+
+EVENTS = [
+    # visitor, path, referrer, country, device, browser
+    ("a", "/", "google.com", "DE", "mobile", "Chrome"),
+    ("a", "/pricing", None, "DE", "mobile", "Chrome"),
+    ("b", "/", "google.com", "DE", "desktop", "Firefox"),
+    ("c", "/docs", "twitter.com", "US", "mobile", "Safari"),
+    ("d", "/", "google.com", "FR", "mobile", "Chrome"),
+]
+
+
+def _row(visitor, path, referrer, country, device, browser):
+    return SimpleNamespace(country_code=country, device_type=device, browser=browser, os=None)
+
+
+async def _seed(db, days: list[date]):
+    user = await AuthService.create_user(db, "Test", "segments@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Segments", "segments.com")
+    for day in days:
+        for visitor, path, referrer, country, device, browser in EVENTS:
+            db.add(
+                PageviewEvent(
+                    site_id=site.id, visitor_hash=f"{day}-{visitor}", path=path,
+                    url=f"https://segments.com{path}", referrer_domain=referrer,
+                    country_code=country, device_type=device, browser=browser,
+                    timestamp=datetime.combine(day, time(12)),
+                )
+            )
+    await db.commit()
+    return site
+
+
+def test_bitmap_helpers_round_trip():
+    bits = bitmap_from_positions([0, 3, 64, 1000])
+    assert list(bitmap_positions(bits)) == [0, 3, 64, 1000]
+    assert decode_bitmap(encode_bitmap(bits)) == bits
+    assert list(bitmap_positions(0)) == []
+
+
+def test_parse_filter_groups_and_values():
+    segment = SegmentFilter.parse("country_code==DE|FR;device_type!=desktop,path==/docs")
+    assert len(segment.groups) == 2
+    first = segment.groups[0]
+    assert first[0].values == {"DE", "FR"} and not first[0].negate
+    assert first[1].negate
+    assert str(SegmentFilter.parse(str(segment))) == str(segment)
+
+    for bad in ["", "colour==red", "country_code", "country_code=="]:
+        with pytest.raises(ValueError):
+            SegmentFilter.parse(bad)
+
+
+def test_day_index_matches_with_bitmaps():
+    index = DayIndex.from_bytes(DayIndex.build(_row(*e) for e in EVENTS).to_bytes())
+    assert index.size == 5
+    # Only the low-cardinality fields are indexed, and NULLs not at all
+    assert set(index.bitmaps["country_code"]) == {"DE", "US", "FR"}
+    assert index.bitmaps["os"] == {}
+
+    def positions(text):
+        return list(bitmap_positions(index.match(SegmentFilter.parse(text).groups[0])))
+
+    assert positions("country_code==DE;device_type==mobile") == [0, 1]
+    assert positions("country_code==US|FR") == [3, 4]
+    assert positions("browser!=Chrome") == [2, 3]
+    assert positions("os!=Linux") == [0, 1, 2, 3, 4]
+    assert positions("country_code==JP") == []
+
+
+@pytest.mark.asyncio
+async def test_aggregation_builds_segment_index(db):
+    yesterday = date.today() - timedelta(days=1)
+    site = await _seed(db, [yesterday])
+    stats = await AggregationService.aggregate_day(db, yesterday)
+    assert stats["segment_events"] == 5
+
+    row = (
+        await db.execute(select(DailySegmentIndex).where(DailySegmentIndex.site_id == site.id))
+    ).scalar_one()
+    assert row.events == 5
+    assert DayIndex.from_bytes(row.data).size == 5
+
+
+@pytest.mark.asyncio
+async def test_indexed_and_raw_days_give_the_same_answer(db):
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    site = await _seed(db, [yesterday, today])
+    await AggregationService.aggregate_day(db, yesterday)
+    segment = SegmentFilter.parse("country_code==DE;device_type==mobile,country_code==FR")
+
+    data = await SegmentService.dashboard(db, site.id, yesterday, today, segment)
+    assert data["sources"]["indexed"] == [[yesterday.isoformat(), yesterday.isoformat()]]
+    assert data["sources"]["raw"] == [[today.isoformat(), today.isoformat()]]
+    # Per day: a on / and /pricing, d on /
+    assert data["summary"] == {"pageviews": 6, "unique_visitors": 4}
+    assert data["bounce_rate"] == 50.0
+    assert [d["pageviews"] for d in data["visitors_over_time"]] == [3, 3]
+    assert data["breakdowns"]["path"][0] == {"path": "/", "pageviews": 4, "unique_visitors": 4}
+    assert {c["country_code"] for c in data["breakdowns"]["country_code"]} == {"DE", "FR"}
+
+
+@pytest.mark.asyncio
+async def test_indexed_days_match_other_fields_in_sql(db):
+    yesterday = date.today() - timedelta(days=1)
+    site = await _seed(db, [yesterday])
+    await AggregationService.aggregate_day(db, yesterday)
+    segment = SegmentFilter.parse(
+        "device_type==mobile;referrer_domain==google.com,path==/docs;country_code!=DE"
+    )
+
+    data = await SegmentService.dashboard(db, site.id, yesterday, yesterday, segment)
+    assert data["sources"]["raw"] == []
+    # a and d on / (mobile from google), c on /docs
+    assert data["summary"] == {"pageviews": 3, "unique_visitors": 3}
+    assert data["breakdowns"]["path"] == [
+        {"path": "/", "pageviews": 2, "unique_visitors": 2},
+        {"path": "/docs", "pageviews": 1, "unique_visitors": 1},
+    ]
+    assert [b["browser"] for b in data["breakdowns"]["browser"]] == ["Chrome", "Safari"]
+
+
+@pytest.mark.asyncio
+async def test_day_with_events_added_after_indexing_is_read_raw(db):
+    yesterday = date.today() - timedelta(days=1)
+    site = await _seed(db, [yesterday])
+    await AggregationService.aggregate_day(db, yesterday)
+    # An early event shifts every position the index was built with
+    db.add(
+        PageviewEvent(
+            site_id=site.id, visitor_hash="late", path="/late", url="https://segments.com/late",
+            country_code="DE", device_type="mobile", browser="Chrome",
+            timestamp=datetime.combine(yesterday, time(1)),
+        )
+    )
+    await db.commit()
+
+    segment = SegmentFilter.parse("country_code==DE;device_type==mobile")
+    data = await SegmentService.dashboard(db, site.id, yesterday, yesterday, segment)
+    assert data["sources"] == {
+        "indexed": [], "raw": [[yesterday.isoformat(), yesterday.isoformat()]]
+    }
+    assert {p["path"] for p in data["breakdowns"]["path"]} == {"/", "/pricing", "/late"}
+
+
+@pytest.mark.asyncio
+async def test_filtered_dashboard_api(auth_client, client):
+    resp = await auth_client.post(
+        "/api/v1/sites", json={"name": "Filtered", "domain": "filtered.com"}
+    )
+    site_id = resp.json()["id"]
+    event = {
+        "s": site_id, "u": "https://filtered.com/", "p": "/", "r": "https://google.com/",
+        "sw": 0, "us": "", "um": "", "uc": "", "ut": "", "ux": "",
+    }
+    await client.post("/api/v1/event", json=event)
+    await client.post("/api/v1/event", json={**event, "p": "/other", "r": ""})
+
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/analytics",
+        params={"period": "today", "filters": "referrer_domain==google.com"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["filters"] == "referrer_domain==google.com"
+    assert data["summary"]["pageviews"] == 1
+    assert data["top_pages"] == [{"path": "/", "pageviews": 1, "unique_visitors": 1}]
+
+    resp = await auth_client.get(
+        f"/api/v1/sites/{site_id}/analytics", params={"filters": "colour==red"}
+    )
+    assert resp.status_code == 400
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.services.analytics import AnalyticsService, dashboard_flights
+from app.services.auth import AuthService
+from app.services.site import SiteService, site_flights
+from app.singleflight import SingleFlight
+from tests.conftest import test_session_factory as session_factory
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    runs = 0
+
+    async def compute():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.02)
+        return runs
+
+    results = await asyncio.gather(*(flights.do("key", compute) for _ in range(10)))
+    assert results == [1] * 10
+    assert flights.stats() == {"started": 1, "coalesced": 9}
+    assert flights.in_flight() == 0
+
+    # Once finished, the next call runs again
+    assert await flights.do("key", compute) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    flights = SingleFlight()
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        *(flights.do("key", broken) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flights.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.create_task(flights.do("key", compute))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.do("key", compute))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "done"
+
+
+@pytest.mark.asyncio
+async def test_get_site_lookups_are_coalesced(db):
+    user = await AuthService.create_user(db, "Test", "flight@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Flight", "flight.com")
+    await db.commit()
+    before = site_flights.stats()
+
+    sites = await asyncio.gather(*(SiteService.get_site(db, site.id) for _ in range(5)))
+    assert {s.domain for s in sites} == {"flight.com"}
+    assert site_flights.stats()["started"] == before["started"] + 1
+    assert await SiteService.get_site(db, "missing") is None
+
+    # The returned instance belongs to the caller's session and can be updated
+    updated = await SiteService.update_site(db, sites[0], name="Renamed")
+    assert updated.name == "Renamed"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_site_lookup_survives_cancelled_first_caller(db):
+    user = await AuthService.create_user(db, "Test", "cancel@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Cancel", "cancel.com")
+    await db.commit()
+
+    async with session_factory() as first_session:
+        executed = []
+        event.listen(
+            first_session.sync_session, "do_orm_execute", lambda state: executed.append(state)
+        )
+        first = asyncio.create_task(SiteService.get_site(first_session, site.id))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(SiteService.get_site(db, site.id))
+        await asyncio.sleep(0)
+        # The first request goes away and its session is closed mid-lookup
+        first.cancel()
+    found = await follower
+    assert found.domain == "cancel.com"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    # The shared query never ran on the cancelled request's session
+    assert executed == []
+
+
+@pytest.mark.asyncio
+async def test_dashboard_cache_misses_are_coalesced(db):
+    user = await AuthService.create_user(db, "Test", "burst@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Burst", "burst.com")
+    await db.commit()
+    before = dashboard_flights.stats()
+
+    results = await asyncio.gather(
+        *(AnalyticsService.get_cached_dashboard(db, site.id, "30d") for _ in range(5))
+    )
+    assert all(r["summary"] == results[0]["summary"] for r in results)
+    assert dashboard_flights.stats()["started"] == before["started"] + 1
+
+
+@pytest.mark.asyncio
+async def test_shared_dashboard_computation_uses_its_own_session(db, monkeypatch):
+    user = await AuthService.create_user(db, "Test", "own@test.com", "pass1234")
+    site = await SiteService.create_site(db, user.id, "Own", "own.com")
+    await db.commit()
+    sessions = []
+    full_dashboard = AnalyticsService.get_full_dashboard
+
+    async def spy(session, *args):
+        sessions.append(session)
+        return await full_dashboard(session, *args)
+
+    monkeypatch.setattr(AnalyticsService, "get_full_dashboard", spy)
+    first = asyncio.create_task(AnalyticsService.get_cached_dashboard(db, site.id, "7d"))
+    await asyncio.sleep(0)
+    # The first caller goes away (and its session is closed) before the result is in
+    first.cancel()
+    await db.close()
+    result = await AnalyticsService.get_cached_dashboard(db, site.id, "7d")
+    assert result["summary"]["pageviews"] == 0
+    assert len(sessions) == 1 and sessions[0] is not db
@@ -159,6 +159,26 @@ async def test_update_site_partial(auth_client):
     assert resp.json()["public"] is True
 
 
+@pytest.mark.asyncio
+async def test_update_site_identity_window(auth_client):
+    create_resp = await auth_client.post(
+        "/api/v1/sites", json={"name": "My Site", "domain": "site.com"}
+    )
+    site_id = create_resp.json()["id"]
+    assert create_resp.json()["identity_window"] == "day"
+
+    resp = await auth_client.patch(
+        f"/api/v1/sites/{site_id}", json={"identity_window": "week"}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["identity_window"] == "week"
+
+    resp = await auth_client.patch(
+        f"/api/v1/sites/{site_id}", json={"identity_window": "year"}
+    )
+    assert resp.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_update_site_not_found(auth_client):
     resp = await auth_client.patch(
@@ -201,6 +221,27 @@ async def test_sites_page(auth_client):
     assert "Your Sites" in resp.text
 
 
+@pytest.mark.asyncio
+async def test_sites_overview(auth_client, client):
+    resp = await auth_client.post("/api/v1/sites", json={"name": "Busy", "domain": "busy.com"})
+    site_id = resp.json()["id"]
+    event = {
+        "s": site_id, "u": "https://busy.com/", "p": "/", "r": "", "sw": 0,
+        "us": "", "um": "", "uc": "", "ut": "", "ux": "",
+    }
+    await client.post("/api/v1/event", json=event)
+
+    resp = await auth_client.get("/api/v1/sites/overview")
+    assert resp.status_code == 200
+    (entry,) = resp.json()["sites"]
+    assert entry["id"] == site_id
+    assert entry["today"] == {"pageviews": 1, "unique_visitors": 1}
+    assert entry["sparkline"][-1] == 1
+
+    page = await auth_client.get("/sites")
+    assert "polyline" in page.text
+
+
 @pytest.mark.asyncio
 async def test_sites_page_unauthenticated(client):
     resp = await client.get("/sites", follow_redirects=False)
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from app.worker import TimeBudget, run_isolated
+
+
+@pytest.mark.asyncio
+async def test_run_isolated_uses_worker_thread_and_own_session():
+    caller_loop = asyncio.get_running_loop()
+
+    async def job(db, value):
+        result = await db.execute(text("SELECT :v"), {"v": value})
+        return (
+            threading.current_thread().name,
+            asyncio.get_running_loop() is caller_loop,
+            result.scalar_one(),
+        )
+
+    name, same_loop, value = await run_isolated(
+        job, 42, database_url="sqlite+aiosqlite:///:memory:"
+    )
+    assert name.startswith("pagepulse-worker")
+    assert same_loop is False
+    assert value == 42
+
+
+@pytest.mark.asyncio
+async def test_run_isolated_propagates_errors():
+    async def job(db):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await run_isolated(job, database_url="sqlite+aiosqlite:///:memory:")
+
+
+@pytest.mark.asyncio
+async def test_time_budget_checkpoint():
+    assert await TimeBudget(60).checkpoint() is True
+    assert await TimeBudget(0).checkpoint() is False